@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Static read API: precomputed, paginated views of the catalog under ``api/``.
+
+Clients used to sort and filter the whole index on the device. ``build``
+writes the orderings they need instead:
+
+  top-liked            every recipe, most likes first
+  newest               the ``FEED_LIMIT`` latest recipes by ``created_at``
+  recently-voted       the ``FEED_LIMIT`` recipes with the latest ``last_vote_at``
+  category/<category>  one per category (same slug as the index shards), most likes first
+
+Each view is split into pages of ``PAGE_SIZE`` recipes written as
+``api/<view>/<page>.<hash>.json``: the name carries the first characters of
+the content's SHA-256, so a file never changes once published and a CDN or
+raw-git cache can keep it forever. ``api/manifest.json`` lists, per view,
+the number of matching recipes and the pages with their file and full hash
+(usable as an ETag); it is the only file clients revalidate.
+
+After an intake event ``update_for_recipes`` splices the changed recipes
+into the views that held or now hold them, from their entries before and
+after the change. Each page's manifest entry carries the sort keys of its
+first and last recipe, so a recipe's old and new page are found without
+reading the catalog or other pages. Only the pages between those two
+positions are read and re-encoded, and unchanged pages keep their file.
+
+Pages that drop out of the manifest are listed under ``retired`` with the
+time they left. The new manifest is written first, and a retired page is
+deleted only after ``RETIRED_GRACE`` seconds and a later build. A client
+holding the previous manifest can still fetch every page it lists.
+
+Usage:
+  python api_build.py build
+  python api_build.py show [top-liked] [--page 1]
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import metrics
+from catalog import ROOT, RecipeCatalog, shard_key
+from storage import atomic_write_bytes, atomic_write_json, read_json
+
+API_DIRNAME = 'api'
+API_DIR = ROOT / API_DIRNAME
+MANIFEST_FILE = API_DIR / 'manifest.json'
+API_VERSION = 1
+PAGE_SIZE = 100
+# Every share or vote moves a recipe to the top of newest/recently-voted and
+# shifts all their pages by one, so those views are capped
+FEED_LIMIT = 1000
+# Seconds a page stays on disk after it leaves the manifest
+RETIRED_GRACE = 3600
+
+# Index fields published in the views
+ITEM_KEYS = ('id', 'name', 'author', 'likes', 'category', 'path', 'created_at', 'last_vote_at')
+
+
+def _by_likes(entry: dict) -> tuple:
+    return -int(entry.get('likes') or 0), entry.get('id') or ''
+
+
+# view -> (sort key, reverse, limit); category views use 'top-liked'
+ORDERS = {
+    'top-liked': (_by_likes, False, None),
+    'newest': (lambda e: (e.get('created_at') or '', e.get('id') or ''), True, FEED_LIMIT),
+    'recently-voted': (lambda e: (e.get('last_vote_at') or '', e.get('id') or ''), True, FEED_LIMIT),
+}
+
+
+def view_members(entries: List[dict]) -> Dict[str, List[dict]]:
+    """Unsorted recipes of every view."""
+    views = {
+        'top-liked': entries,
+        'newest': entries,
+        'recently-voted': [e for e in entries if e.get('last_vote_at')],
+    }
+    for entry in entries:
+        views.setdefault(f"category/{shard_key(entry.get('category'))}", []).append(entry)
+    return views
+
+
+def _item(entry: dict) -> dict:
+    return {key: entry[key] for key in ITEM_KEYS if key in entry}
+
+
+def _ids_digest(entries: List[dict]) -> str:
+    return hashlib.sha256('\n'.join(e.get('id') or '' for e in entries).encode('utf-8')).hexdigest()[:16]
+
+
+def load_manifest() -> Optional[dict]:
+    data = read_json(MANIFEST_FILE, None)
+    if data is None or data.get('version') != API_VERSION or data.get('page_size') != PAGE_SIZE:
+        return None
+    return data
+
+
+def _views_of(entry: Optional[dict]) -> List[str]:
+    """Names of the views ``entry`` belongs to (as in ``view_members``)."""
+    if entry is None:
+        return []
+    names = ['top-liked', 'newest', f"category/{shard_key(entry.get('category'))}"]
+    if entry.get('last_vote_at'):
+        names.append('recently-voted')
+    return names
+
+
+def _write_page(name: str, number: int, chunk: List[dict], key) -> dict:
+    """Write one page (unless a file with the same content exists) and return its manifest entry."""
+    encoded = json.dumps({'view': name, 'page': number, 'recipes': [_item(e) for e in chunk]},
+                         ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha256(encoded).hexdigest()
+    path = f"{name}/{number}.{etag[:12]}.json"
+    if not (API_DIR / path).exists():
+        atomic_write_bytes(API_DIR / path, encoded)
+        metrics.count('api.pages_written')
+    # Sort keys of the first and last recipe, to find a recipe's page without reading pages
+    return {'file': path, 'etag': etag, 'count': len(chunk), 'ids': _ids_digest(chunk),
+            'first': list(key(chunk[0])), 'last': list(key(chunk[-1]))}
+
+
+def _build_view(name: str, members: List[dict], previous: Optional[dict],
+                changed: Optional[Set[str]]) -> dict:
+    key, reverse, limit = ORDERS.get(name, ORDERS['top-liked'])
+    total = len(members)
+    if limit is None:
+        members = sorted(members, key=key, reverse=reverse)
+    else:
+        members = (heapq.nlargest if reverse else heapq.nsmallest)(limit, members, key=key)
+    old_pages = previous['pages'] if previous else []
+    pages = []
+    for number, start in enumerate(range(0, len(members), PAGE_SIZE), 1):
+        chunk = members[start:start + PAGE_SIZE]
+        old = old_pages[number - 1] if number <= len(old_pages) else None
+        if (changed is not None and old is not None and old['ids'] == _ids_digest(chunk)
+                and 'last' in old and not any(e.get('id') in changed for e in chunk)):
+            pages.append(old)
+            continue
+        pages.append(_write_page(name, number, chunk, key))
+    view = {'total': total, 'pages': pages}
+    if name.startswith('category/') and members:
+        view['category'] = (members[0].get('category') or '').strip()
+    return view
+
+
+def _splice_view(name: str, previous: Optional[dict], removed: List[dict],
+                 added: List[dict]) -> Optional[dict]:
+    """``previous`` with the ``removed`` entries taken out and the ``added`` ones put in.
+
+    Only the pages from the first to the last affected position are read
+    and re-encoded, through the last page when the number of recipes on
+    them changes. Returns None when the view cannot be spliced (pages
+    without boundary keys, or a capped view that would come up short).
+    """
+    key, reverse, limit = ORDERS.get(name, ORDERS['top-liked'])
+    pages = previous['pages'] if previous else []
+    if any('last' not in page for page in pages) or (previous is None and removed):
+        return None
+    lasts = [tuple(page['last']) for page in pages]
+
+    def page_of(entry: dict) -> Optional[int]:
+        k = key(entry)
+        for i, last in enumerate(lasts):
+            if (k >= last) if reverse else (k <= last):
+                return i
+        return None  # after the last page
+
+    removed_at = [i for i in map(page_of, removed) if i is not None]
+    added_at = [len(pages) - 1 if i is None else i for i in map(page_of, added)]
+    total = (previous['total'] if previous else 0) - len(removed) + len(added)
+    touched = removed_at + added_at
+    if not touched:
+        return {**previous, 'total': total}
+    lo, hi = max(0, min(touched)), max(touched)
+    if len(added) != len(removed_at):
+        hi = len(pages) - 1  # every later page shifts
+
+    span = pages[lo:hi + 1]
+    items = [item for page in span for item in read_json(API_DIR / page['file'], {}).get('recipes', [])]
+    changed = {e.get('id') for e in removed} | {e.get('id') for e in added}
+    items = [item for item in items if item.get('id') not in changed] + [_item(e) for e in added]
+    items.sort(key=key, reverse=reverse)
+    size = sum(page['count'] for page in span)
+    if hi == len(pages) - 1:
+        size = min(total, limit or total) - lo * PAGE_SIZE
+    if len(items) < size:
+        return None
+    items = items[:size]
+
+    spliced = [_write_page(name, lo + n + 1, items[start:start + PAGE_SIZE], key)
+               for n, start in enumerate(range(0, len(items), PAGE_SIZE))]
+    view = {'total': total, 'pages': pages[:lo] + spliced + pages[hi + 1:]}
+    if name.startswith('category/') and view['pages']:
+        first = items[0] if lo == 0 else previous
+        view['category'] = (first.get('category') or '').strip()
+    return view
+
+
+def _retire(old: dict, candidates: Set[str], referenced: Set[str],
+            now: datetime) -> Tuple[Dict[str, str], List[str]]:
+    """(pages to list as retired, retired pages past the grace period to delete)."""
+    previous = old.get('retired', {})
+    retired = {path: previous.get(path, now.isoformat()) for path in candidates - referenced}
+    expired = [path for path in retired if path in previous
+               and (now - datetime.fromisoformat(retired[path])).total_seconds() >= RETIRED_GRACE]
+    for path in expired:
+        del retired[path]
+    return retired, expired
+
+
+def _publish(old: dict, views: Dict[str, dict], candidates: Set[str]) -> dict:
+    """Write the manifest for ``views``, then delete expired retired pages."""
+    now = datetime.now(timezone.utc)
+    referenced = {page['file'] for view in views.values() for page in view['pages']}
+    retired, expired = _retire(old, candidates, referenced, now)
+
+    if views == old['views'] and retired == old.get('retired', {}) and MANIFEST_FILE.exists():
+        return old
+    manifest = {
+        'version': API_VERSION,
+        'page_size': PAGE_SIZE,
+        'built_at': now.isoformat(),
+        'views': views,
+        'retired': retired,
+    }
+    atomic_write_json(MANIFEST_FILE, manifest)
+    # Only once no published manifest lists them any more
+    for path in expired:
+        (API_DIR / path).unlink(missing_ok=True)
+    return manifest
+
+
+def _published_files(manifest: dict) -> Set[str]:
+    return {page['file'] for view in manifest['views'].values() for page in view['pages']} | set(manifest.get('retired', {}))
+
+
+def build_api(catalog: Optional[RecipeCatalog] = None, changed: Optional[Iterable[str]] = None) -> dict:
+    """Write the views and return the manifest.
+
+    With ``changed`` (recipe ids touched since the last build) views that
+    do not contain them and kept their size are reused as they are;
+    without it every page is recomputed, although files whose content did
+    not change are still not rewritten. Either way the whole catalog is
+    read; ``update_views`` avoids that when the previous entries are known.
+    """
+    catalog = catalog if catalog is not None else RecipeCatalog.load()
+    old = load_manifest() or {'views': {}}
+    changed = set(changed) if changed is not None else None
+    views = {}
+    with metrics.span('api.build'):
+        for name, members in view_members(list(catalog)).items():
+            previous = old['views'].get(name)
+            if (changed is not None and previous is not None and previous['total'] == len(members)
+                    and not any(e.get('id') in changed for e in members)):
+                views[name] = previous
+                continue
+            views[name] = _build_view(name, members, previous, changed)
+
+    if changed is None:
+        candidates = {str(p.relative_to(API_DIR)) for p in API_DIR.glob('**/*.json')} - {MANIFEST_FILE.name}
+    else:
+        candidates = _published_files(old)
+    return _publish(old, views, candidates)
+
+
+def update_views(catalog: RecipeCatalog, before: Dict[str, Optional[dict]]) -> dict:
+    """Move changed recipes within the views that held or now hold them.
+
+    ``before`` maps each changed recipe id to its entry before the change
+    (None for a new recipe). Only those recipes are looked up in the
+    catalog, so a sharded catalog reads just their shards, and only the
+    pages between their old and new positions are read. Falls back to a
+    full ``build_api`` when a view cannot be spliced.
+    """
+    old = load_manifest()
+    if old is None:
+        return build_api(catalog)
+    removed: Dict[str, List[dict]] = {}
+    added: Dict[str, List[dict]] = {}
+    for rid, previous in before.items():
+        for name in _views_of(previous):
+            removed.setdefault(name, []).append(previous)
+        entry = catalog.get(rid)
+        for name in _views_of(entry):
+            added.setdefault(name, []).append(entry)
+
+    views = dict(old['views'])
+    with metrics.span('api.update'):
+        for name in sorted(removed.keys() | added.keys()):
+            view = _splice_view(name, views.get(name), removed.get(name, []), added.get(name, []))
+            if view is None:
+                return build_api(catalog)
+            if view['total'] or not name.startswith('category/'):
+                views[name] = view
+            else:
+                views.pop(name, None)
+    return _publish(old, views, _published_files(old))
+
+
+def update_for_recipes(rids: List[str], catalog: Optional[RecipeCatalog] = None,
+                       before: Optional[Dict[str, Optional[dict]]] = None) -> None:
+    """Refresh the views holding ``rids`` after they were added or voted, if ``api/`` exists.
+
+    With ``before`` (``RecipeCatalog.before``) the views are spliced by
+    ``update_views``; without it the catalog is scanned.
+    """
+    if not rids or not MANIFEST_FILE.exists():
+        return
+    catalog = catalog if catalog is not None else RecipeCatalog.load()
+    if before is not None and all(rid in before for rid in rids):
+        update_views(catalog, {rid: before[rid] for rid in dict.fromkeys(rids)})
+    else:
+        build_api(catalog, changed=rids)
+
+
+def top_liked(recipes: Iterable[dict], k: int = 10) -> List[dict]:
+    """The ``k`` recipes with the most likes.
+
+    Read from the first page of the top-liked view, which is kept sorted on
+    every vote; without it ``recipes`` is scanned.
+    """
+    manifest = load_manifest()
+    view = manifest and manifest['views'].get('top-liked')
+    if view and view['pages'] and k <= PAGE_SIZE:
+        page = read_json(API_DIR / view['pages'][0]['file'], {})
+        return page.get('recipes', [])[:k]
+    return heapq.nsmallest(k, recipes, key=_by_likes)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Static read API for MealPrep clients')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build', help='Regenerate every view under api/')
+    s = sub.add_parser('show', help='List the views, or the recipes on one page of a view')
+    s.add_argument('view', nargs='?')
+    s.add_argument('--page', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        manifest = build_api()
+        pages = sum(len(view['pages']) for view in manifest['views'].values())
+        print(f"Built {len(manifest['views'])} views ({pages} pages) in {API_DIRNAME}/")
+        return 0
+
+    manifest = load_manifest()
+    if manifest is None:
+        print("API manifest not found; run: python api_build.py build", file=sys.stderr)
+        return 1
+    if args.view is None:
+        for name, view in manifest['views'].items():
+            print(f"{name:<32} {view['total']:>6} recetas, {len(view['pages'])} páginas")
+        return 0
+    view = manifest['views'].get(args.view)
+    if view is None or not 1 <= args.page <= len(view['pages']):
+        print(f"⚠️  Vista o página no encontrada: {args.view} {args.page}")
+        return 1
+    page = read_json(API_DIR / view['pages'][args.page - 1]['file'], {})
+    for i, recipe in enumerate(page.get('recipes', []), (args.page - 1) * PAGE_SIZE + 1):
+        print(f"{i:4d}. {recipe.get('name', recipe.get('id'))} ({recipe.get('likes', 0)} likes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Synthetic-load benchmark for intake, the vote tracker and vote statistics.
+
+For every size a dataset is generated in a temp directory (recipes with
+Spanish names and ingredient lists, ``recipes_index.json`` and a vote
+tracker with N build_ids). Each operation then runs in a fresh process with
+``MEALPREP_ROOT`` pointing at that directory, so timings include the imports
+and data loads a real intake run pays, and peak RSS is per operation.
+
+Every operation except cleanup (whose second run has nothing left to do)
+is repeated and the best time kept. Results are written as JSON. The first
+run stores them as the baseline; later runs are compared against it and
+regressions make the exit code 1.
+
+Usage:
+  python benchmark.py [--sizes 1000,10000,100000] [--recipes 500] [--votes-per-build 3]
+                      [--backend json|sqlite] [--output FILE] [--baseline FILE]
+                      [--repeat 3] [--tolerance 0.25] [--save-baseline]
+
+Sizes up to 1000000 build_ids work but need a few GB of RAM and disk.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from storage import atomic_write_json, repo_root
+
+BENCH_DIR = repo_root() / '.benchmarks'
+OPERATIONS = ['share', 'vote', 'duplicate_vote', 'stats', 'cleanup']
+
+DISHES = ['Guiso', 'Tortilla', 'Ensalada', 'Sopa', 'Tarta', 'Empanadas', 'Milanesa', 'Arroz',
+          'Budín', 'Pastel', 'Croquetas', 'Risotto', 'Salteado', 'Estofado', 'Crema', 'Canelones']
+MAINS = ['lentejas', 'papas', 'pollo', 'calabaza', 'espinaca', 'garbanzos', 'atún', 'merluza',
+         'zapallitos', 'choclo', 'berenjena', 'hongos', 'cerdo', 'carne', 'banana', 'manzana',
+         'queso', 'verduras', 'porotos', 'quinoa']
+STYLES = ['', 'casero', 'de la abuela', 'al horno', 'criollo', 'light', 'express', 'a la provenzal']
+CATEGORIES = ['Postres', 'Carnes', 'Vegano', 'Sopas', 'Pescados', 'Ensaladas', 'Arroces', 'Pastas']
+INGREDIENTS = [
+    ('Cebolla', 'unidad', 'Verduras'), ('Ajo', 'diente', 'Verduras'), ('Zanahoria', 'unidad', 'Verduras'),
+    ('Morrón', 'unidad', 'Verduras'), ('Tomate', 'unidad', 'Verduras'), ('Papa', 'unidad', 'Verduras'),
+    ('Arroz', 'g', 'Cereales'), ('Harina', 'g', 'Cereales'), ('Fideos', 'g', 'Cereales'),
+    ('Leche', 'ml', 'Lácteos'), ('Queso rallado', 'g', 'Lácteos'), ('Manteca', 'g', 'Lácteos'),
+    ('Huevo', 'unidad', 'Huevos'), ('Pollo', 'g', 'Carnes'), ('Carne picada', 'g', 'Carnes'),
+    ('Aceite de oliva', 'ml', 'Almacén'), ('Sal', 'g', 'Almacén'), ('Azúcar', 'g', 'Almacén'),
+    ('Lentejas', 'g', 'Legumbres'), ('Garbanzos', 'g', 'Legumbres'), ('Pimentón', 'g', 'Especias'),
+    ('Comino', 'g', 'Especias'), ('Orégano', 'g', 'Especias'), ('Caldo de verduras', 'ml', 'Almacén'),
+]
+
+
+def recipe_name(rng: random.Random, n: int) -> str:
+    name = f"{rng.choice(DISHES)} de {rng.choice(MAINS)}"
+    style = rng.choice(STYLES)
+    return f"{name} {style} {n}" if style else f"{name} {n}"
+
+
+def recipe_details(rng: random.Random, category: str) -> dict:
+    ingredients = []
+    for name, unit, ing_category in rng.sample(INGREDIENTS, rng.randint(3, 9)):
+        quantity = rng.randint(1, 4) if unit in ('unidad', 'diente') else rng.randint(1, 20) * 25
+        ingredients.append({'name': name, 'unit': unit, 'quantity': float(quantity),
+                            'category': ing_category, 'notes': ''})
+    return {'ingredients': ingredients, 'notes': '', 'servings': rng.randint(1, 6), 'category': category}
+
+
+def _write_tracker(path: Path, records) -> None:
+    # Streamed in the json.dumps(indent=2) layout so 1M build_ids fit in memory
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{')
+        first = True
+        for build_id, record in records:
+            body = json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+            f.write(('\n' if first else ',\n') + f'  {json.dumps(build_id)}: {body}')
+            first = False
+        f.write('\n}' if not first else '}')
+
+
+def generate_dataset(root: Path, num_recipes: int, num_builds: int,
+                     votes_per_build: int, seed: int = 11) -> str:
+    """Write a synthetic repo under ``root``.
+
+    Returns ``build_id:recipe_id`` of an existing vote, for duplicate checks.
+    """
+    rng = random.Random(seed)
+    from intake import normalize_id  # resolved against the real ROOT; pure function
+
+    recipes = []
+    for n in range(num_recipes):
+        name = recipe_name(rng, n)
+        rid = normalize_id(name)
+        category = rng.choice(CATEGORIES)
+        recipes.append({'id': rid, 'name': name, 'author': 'Bench', 'likes': 0,
+                        'category': category, 'path': f'recipes/{rid}.json'})
+        atomic_write_json(root / 'recipes' / f'{rid}.json', recipe_details(rng, category))
+
+    now = datetime.now(timezone.utc)
+    ids = [r['id'] for r in recipes]
+    likes = dict.fromkeys(ids, 0)
+    first_vote = []
+
+    def records():
+        for b in range(num_builds):
+            first = now - timedelta(seconds=rng.randint(0, 180 * 24 * 3600))
+            last = min(now, first + timedelta(seconds=rng.randint(0, 30 * 24 * 3600)))
+            voted = rng.sample(ids, min(votes_per_build, len(ids)))
+            for rid in voted:
+                likes[rid] += 1
+            first_vote.extend(voted[:1 - len(first_vote)])
+            yield f'{b:016x}', {'first_vote_at': first.isoformat(), 'voted_recipes': voted,
+                                'total_votes': len(voted), 'last_vote_at': last.isoformat()}
+
+    data_dir = root / '.github' / 'data'
+    _write_tracker(data_dir / 'vote_tracker.json', records())
+    atomic_write_json(data_dir / 'vote_config.json',
+                      {'version': '1.0', 'settings': {'cleanup_days_threshold': 90}})
+    for recipe in recipes:
+        recipe['likes'] = likes[recipe['id']]
+    atomic_write_json(root / 'recipes_index.json', {'recipes': recipes})
+    return f'{0:016x}:{first_vote[0]}'
+
+
+# --- worker side (runs with MEALPREP_ROOT set) ---
+
+def _worker_warmup(arg: str) -> dict:
+    """Build snapshots and sidecars so timed runs measure steady state."""
+    from catalog import RecipeCatalog
+    from vote_tracker import SqliteVoteStore, VoteStore, vote_backend_name
+    RecipeCatalog.load()
+    if vote_backend_name() == 'sqlite':
+        with VoteStore(readonly=True) as source:
+            data = source.export_data()
+        with SqliteVoteStore() as target:
+            target.import_data(data)
+    from vote_tracker import open_vote_store
+    with open_vote_store() as store:
+        store.rebuild_aggregates()
+        store.cleanup(days_threshold=100000)
+    return {}
+
+
+def _worker_share(arg: str) -> dict:
+    import intake
+    rng = random.Random(time.time_ns())
+    name = f"Receta de prueba {rng.getrandbits(40):x}"
+    ok, msg = intake.handle_share({'name': name, 'category': 'Postres', 'author': 'Bench',
+                                   **recipe_details(rng, 'Postres')})
+    return {'ok': ok}
+
+
+def _worker_vote(arg: str) -> dict:
+    """``arg`` is ``build_id:recipe_id``."""
+    import intake
+    build_id, rid = arg.split(':', 1)
+    ok, msg = intake.handle_vote({'id': rid, 'build_id': build_id})
+    return {'ok': ok}
+
+
+def _worker_duplicate_vote(arg: str) -> dict:
+    return {'ok': not _worker_vote(arg)['ok']}
+
+
+def _worker_stats(arg: str) -> dict:
+    import vote_stats
+    with contextlib.redirect_stdout(io.StringIO()):
+        vote_stats.show_vote_statistics()
+    return {'ok': True}
+
+
+def _worker_cleanup(arg: str) -> dict:
+    from vote_tracker import cleanup_old_votes
+    return {'ok': True, 'removed': cleanup_old_votes()}
+
+
+WORKERS = {
+    'warmup': _worker_warmup,
+    'share': _worker_share,
+    'vote': _worker_vote,
+    'duplicate_vote': _worker_duplicate_vote,
+    'stats': _worker_stats,
+    'cleanup': _worker_cleanup,
+}
+
+
+def run_worker(op: str, arg: str) -> None:
+    t0 = time.perf_counter()
+    result = WORKERS[op](arg)
+    result['seconds'] = time.perf_counter() - t0
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(result))
+
+
+# --- driver side ---
+
+def run_op(root: Path, op: str, backend: str, arg: str = '') -> dict:
+    env = dict(os.environ, MEALPREP_ROOT=str(root), MEALPREP_VOTE_BACKEND=backend)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, str(Path(__file__).resolve()), '--worker', op,
+                           '--worker-arg', arg], env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{op} failed:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = wall
+    return result
+
+
+def run_benchmark(sizes: List[int], num_recipes: int, votes_per_build: int,
+                  backend: str, repeat: int = 3) -> List[dict]:
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix='mealprep-bench-') as tmp:
+            root = Path(tmp)
+            t0 = time.perf_counter()
+            existing_vote = generate_dataset(root, num_recipes, size, votes_per_build)
+            recipe_id = existing_vote.split(':', 1)[1]
+            print(f"📦 {size} build_ids generated in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+            run_op(root, 'warmup', backend)
+            for op in OPERATIONS:
+                runs = []
+                for i in range(1 if op == 'cleanup' else repeat):
+                    arg = {'vote': f'bench-voter-{i}:{recipe_id}',
+                           'duplicate_vote': existing_vote}.get(op, '')
+                    runs.append(run_op(root, op, backend, arg))
+                if not all(run['ok'] for run in runs):
+                    raise RuntimeError(f"{op} did not behave as expected at {size} build_ids")
+                r = min(runs, key=lambda run: run['seconds'])
+                results.append({'backend': backend, 'size': size, 'op': op, **r})
+                print(f"   {op:<15} {r['seconds']:8.3f}s  (process {r['process_seconds']:.3f}s,"
+                      f" {r['peak_rss_kb'] / 1024:.0f} MB)", file=sys.stderr)
+    return results
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """Operations slower than the baseline by more than ``tolerance``."""
+    previous = {(r['backend'], r['size'], r['op']): r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        base = previous.get((r['backend'], r['size'], r['op']))
+        if base is None:
+            continue
+        # Ignore sub-20ms noise on tiny datasets
+        if r['seconds'] > base['seconds'] * (1 + tolerance) and r['seconds'] - base['seconds'] > 0.02:
+            regressions.append(f"{r['op']} @ {r['size']} ({r['backend']}): "
+                               f"{base['seconds']:.3f}s -> {r['seconds']:.3f}s")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark intake, tracker and stats on synthetic data')
+    parser.add_argument('--worker', choices=sorted(WORKERS), help=argparse.SUPPRESS)
+    parser.add_argument('--worker-arg', default='', help=argparse.SUPPRESS)
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated build_id counts')
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--votes-per-build', type=int, default=3)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--output', type=Path, default=BENCH_DIR / 'latest.json')
+    parser.add_argument('--baseline', type=Path, default=BENCH_DIR / 'baseline.json')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per operation (best is kept)')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Overwrite the baseline with this run')
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker, args.worker_arg)
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    results = run_benchmark(sizes, args.recipes, args.votes_per_build, args.backend, args.repeat)
+    report: Dict[str, any] = {
+        'version': 1,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'sizes': sizes, 'recipes': args.recipes,
+                   'votes_per_build': args.votes_per_build, 'backend': args.backend,
+                   'repeat': args.repeat},
+        'results': results,
+    }
+    atomic_write_json(args.output, report)
+    print(f"📝 Results written to {args.output}")
+
+    if args.save_baseline or not args.baseline.exists():
+        atomic_write_json(args.baseline, report)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text(encoding='utf-8')), args.tolerance)
+    if not regressions:
+        print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        return 0
+    print(f"⚠️  Regressions against {args.baseline}:")
+    for line in regressions:
+        print(f"   • {line}")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Compact binary snapshots of ``recipes_index.json`` and ``vote_tracker.json``.
+
+A snapshot lives next to its JSON source as ``<name>.snap`` and holds an
+interned string table plus fixed-width int32 records, read through
+``mmap``. The header stores the SHA-256 of the JSON bytes it was built
+from; a snapshot whose hash does not match the current source is ignored
+and rebuilt. JSON stays the source of truth (snapshots are not committed)
+and any snapshot problem silently falls back to parsing JSON.
+
+Layout (little-endian)::
+
+    magic 8s | version I | kind I | source sha256 32s
+    n_strings I | strings_len I | n_records I | n_items I
+    strings (UTF-8, NUL separated) | records (int32 * width * n_records)
+    items (int32 * n_items)
+
+Entries that do not fit the fixed record shape (unknown key order, non
+string values, ...) are stored as raw JSON strings, so loading always
+reproduces the source exactly.
+"""
+
+import gc
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Optional
+
+import metrics
+from storage import StorageError, atomic_write_bytes, atomic_write_json
+
+MAGIC = b'MPSNAP01'
+VERSION = 1
+HEADER = struct.Struct('<8sII32sIIII')
+
+KIND_INDEX = 1
+KIND_TRACKER = 2
+
+# Canonical key order of index entries, as written by handle_share/handle_vote
+INDEX_KEYS = ('id', 'name', 'author', 'likes', 'category', 'path',
+              'created_at', 'updated_at', 'last_vote_at')
+TRACKER_KEYS = ('first_vote_at', 'voted_recipes', 'total_votes', 'last_vote_at')
+
+ABSENT = -1
+RAW = -2  # record's extras slot holds the whole entry as JSON
+
+# Set MEALPREP_SNAPSHOT=0 to always parse JSON
+ENABLED = os.environ.get('MEALPREP_SNAPSHOT', '1') != '0'
+
+
+def snapshot_path(source: Path) -> Path:
+    return source.with_name(source.name + '.snap')
+
+
+class _Strings:
+    def __init__(self) -> None:
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value: str) -> int:
+        i = self.ids.get(value)
+        if i is None:
+            if '\0' in value:
+                raise ValueError('NUL in string')
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+def _split_known(entry: dict, keys: tuple):
+    """Return (present known keys, extras) if the entry fits the record shape."""
+    known = [k for k in entry if k in keys]
+    if known != [k for k in keys if k in entry]:
+        return None
+    order = list(entry)
+    if order[:len(known)] != known:
+        return None
+    return known, {k: entry[k] for k in order[len(known):]}
+
+
+def _encode_index(data: dict, strings: _Strings):
+    if list(data) != ['recipes'] or not isinstance(data['recipes'], list):
+        raise ValueError('unsupported index layout')
+    width = len(INDEX_KEYS) + 1
+    records = array('i')
+    for entry in data['recipes']:
+        row = [ABSENT] * width
+        split = _split_known(entry, INDEX_KEYS) if isinstance(entry, dict) else None
+        if split is not None:
+            for k in split[0]:
+                v = entry[k]
+                if k == 'likes':
+                    if type(v) is not int or not 0 <= v < 2 ** 31:
+                        split = None
+                        break
+                    row[INDEX_KEYS.index(k)] = v
+                elif isinstance(v, str):
+                    row[INDEX_KEYS.index(k)] = strings.intern(v)
+                else:
+                    split = None
+                    break
+        if split is None:
+            row = [ABSENT] * width
+            row[-1] = strings.intern(json.dumps(entry, ensure_ascii=False))
+            row[0] = RAW
+        elif split[1]:
+            row[-1] = strings.intern(json.dumps(split[1], ensure_ascii=False))
+        records.extend(row)
+    return width, records, array('i')
+
+
+def _decode_index(values: list, records: array, items: array) -> dict:
+    width = len(INDEX_KEYS) + 1
+    likes_pos = INDEX_KEYS.index('likes')
+    recipes = []
+    columns = [records[i::width] for i in range(width)]
+    for row in zip(*columns):
+        if row[0] == RAW:
+            recipes.append(json.loads(values[row[-1]]))
+            continue
+        entry = {}
+        for pos, k in enumerate(INDEX_KEYS):
+            v = row[pos]
+            if v != ABSENT:
+                entry[k] = v if pos == likes_pos else values[v]
+        if row[-1] != ABSENT:
+            entry.update(json.loads(values[row[-1]]))
+        recipes.append(entry)
+    return {'recipes': recipes}
+
+
+def _encode_tracker(data: dict, strings: _Strings):
+    # build_id, first_vote_at, last_vote_at, total_votes, items offset, items count, extras
+    width = 7
+    records = array('i')
+    items = array('i')
+    for build_id, record in data.items():
+        row = [strings.intern(build_id), ABSENT, ABSENT, ABSENT, 0, ABSENT, ABSENT]
+        split = _split_known(record, TRACKER_KEYS) if isinstance(record, dict) else None
+        if split is not None and split[0][:3] != ['first_vote_at', 'voted_recipes', 'total_votes']:
+            split = None
+        if split is not None:
+            first, last = record['first_vote_at'], record.get('last_vote_at')
+            voted, total = record['voted_recipes'], record['total_votes']
+            if not (isinstance(first, str) and isinstance(voted, list)
+                    and all(isinstance(r, str) for r in voted)
+                    and type(total) is int and 0 <= total < 2 ** 31
+                    and ('last_vote_at' in record) == isinstance(last, str)):
+                split = None
+        if split is not None:
+            row[1] = strings.intern(first)
+            row[2] = strings.intern(last) if last is not None else ABSENT
+            row[3] = total
+            row[4] = len(items)
+            row[5] = len(voted)
+            items.extend(strings.intern(r) for r in voted)
+            if split[1]:
+                row[6] = strings.intern(json.dumps(split[1], ensure_ascii=False))
+        if split is None:
+            row[1:] = [RAW, ABSENT, ABSENT, 0, ABSENT, strings.intern(json.dumps(record, ensure_ascii=False))]
+        records.extend(row)
+    return width, records, items
+
+
+def _decode_tracker(values: list, records: array, items: array) -> dict:
+    data = {}
+    voted_names = [values[i] for i in items]
+    columns = [records[i::7] for i in range(7)]
+    for bid, first, last, total, offset, count, extras in zip(*columns):
+        if first == RAW:
+            data[values[bid]] = json.loads(values[extras])
+            continue
+        record = {
+            'first_vote_at': values[first],
+            'voted_recipes': voted_names[offset:offset + count],
+            'total_votes': total,
+        }
+        if last != ABSENT:
+            record['last_vote_at'] = values[last]
+        if extras != ABSENT:
+            record.update(json.loads(values[extras]))
+        data[values[bid]] = record
+    return data
+
+
+_CODECS = {
+    KIND_INDEX: (_encode_index, _decode_index),
+    KIND_TRACKER: (_encode_tracker, _decode_tracker),
+}
+
+
+def write_snapshot(source: Path, kind: int, data, source_bytes: bytes) -> bool:
+    """Build the snapshot for ``data`` whose JSON form is ``source_bytes``.
+
+    Returns False (and writes nothing) if the data cannot be encoded.
+    """
+    if not ENABLED:
+        return False
+    strings = _Strings()
+    try:
+        width, records, items = _CODECS[kind][0](data, strings)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    blob = '\0'.join(strings.values).encode('utf-8')
+    header = HEADER.pack(MAGIC, VERSION, kind, hashlib.sha256(source_bytes).digest(),
+                         len(strings.values), len(blob), len(records) // width, len(items))
+    atomic_write_bytes(snapshot_path(source), header + blob + records.tobytes() + items.tobytes())
+    return True
+
+
+def read_snapshot(source: Path, kind: int, source_bytes: bytes):
+    """Decode the snapshot of ``source`` if it matches ``source_bytes``.
+
+    Returns None when the snapshot is missing, stale or unreadable.
+    """
+    if not ENABLED:
+        return None
+    path = snapshot_path(source)
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, file_kind, digest, n_strings, strings_len, n_records, n_items = \
+                HEADER.unpack_from(mm, 0)
+            if (magic != MAGIC or version != VERSION or file_kind != kind
+                    or digest != hashlib.sha256(source_bytes).digest()):
+                return None
+            pos = HEADER.size
+            values = mm[pos:pos + strings_len].decode('utf-8').split('\0') if n_strings else []
+            pos += strings_len
+            width = len(INDEX_KEYS) + 1 if kind == KIND_INDEX else 7
+            records = array('i')
+            records.frombytes(mm[pos:pos + 4 * width * n_records])
+            pos += 4 * width * n_records
+            items = array('i')
+            items.frombytes(mm[pos:pos + 4 * n_items])
+    except (OSError, ValueError, struct.error):
+        return None
+    # Building many small containers; cyclic GC passes only slow this down
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _CODECS[kind][1](values, records, items)
+    except (IndexError, ValueError):
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def save_snapshot_quietly(source: Path, kind: int, data, source_bytes: bytes) -> None:
+    """Refresh the snapshot after the JSON source was written; never raises."""
+    try:
+        write_snapshot(source, kind, data, source_bytes)
+    except OSError:
+        pass
+
+
+def load_json_with_snapshot(source: Path, kind: int) -> Optional[object]:
+    """Load ``source`` preferring a valid snapshot; rebuild it when stale.
+
+    Returns None if ``source`` does not exist. Raises ``ValueError`` for
+    corrupt JSON, like ``json.loads``.
+    """
+    try:
+        source_bytes = source.read_bytes()
+    except FileNotFoundError:
+        return None
+    metrics.count('bytes_read', len(source_bytes))
+    with metrics.span('snapshot.read'):
+        data = read_snapshot(source, kind, source_bytes)
+    if data is not None:
+        return data
+    with metrics.span('json.decode'):
+        data = json.loads(source_bytes)
+    save_snapshot_quietly(source, kind, data, source_bytes)
+    return data
+
+
+def read_json(source: Path, default, kind: int):
+    """``storage.read_json`` served from a valid snapshot when possible."""
+    try:
+        data = load_json_with_snapshot(source, kind)
+    except ValueError as e:
+        raise StorageError(f"{source} is corrupt: {e}") from e
+    return default if data is None else data
+
+
+def write_json(source: Path, data, kind: int) -> None:
+    """``storage.atomic_write_json`` followed by a snapshot refresh."""
+    save_snapshot_quietly(source, kind, data, atomic_write_json(source, data))
@@ -0,0 +1,410 @@
+"""
+Recipe catalog backed by ``recipes_index.json``.
+
+The index is kept on disk as the same ordered list of entries; on load the
+catalog builds id and normalized-name dictionaries over it so duplicate
+checks, vote increments and upserts do not scan the whole list.
+
+The index can instead be split by ``category`` into ``recipes_index/``:
+one ``<category>.json`` shard per category plus ``manifest.json`` with each
+shard's file, recipe count, SHA-256 and last-modified time. Clients fetch
+the manifest and only the shards they show, and a vote rewrites one shard
+and the manifest instead of the whole catalog. The layout is picked by the
+presence of the manifest; ``python catalog.py shard`` switches to it and
+``python catalog.py merge`` goes back to the single file.
+
+Usage:
+  python catalog.py status
+  python catalog.py shard
+  python catalog.py merge
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import binary_snapshot
+import metrics
+from storage import StorageError, atomic_write_bytes, atomic_write_json, file_lock, read_json, repo_root
+
+ROOT = repo_root()
+INDEX = ROOT / 'recipes_index.json'
+SHARD_DIRNAME = 'recipes_index'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+UNCATEGORIZED = 'sin-categoria'
+
+
+@lru_cache(maxsize=1024)
+def shard_key(category: Optional[str]) -> str:
+    """Shard file stem for a category: "Platos principales" -> "platos-principales"."""
+    text = unicodedata.normalize('NFKD', (category or '').strip().lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', '-', text).strip('-') or UNCATEGORIZED
+
+
+def load_manifest(root: Path = ROOT) -> Optional[dict]:
+    """The shard manifest, or None when the index is a single file."""
+    return read_json(root / SHARD_DIRNAME / MANIFEST_NAME, None)
+
+
+def read_shard(manifest: dict, key: str, root: Path = ROOT) -> List[dict]:
+    """Entries of one shard (empty if the manifest does not list it)."""
+    info = manifest['shards'].get(key)
+    if info is None:
+        return []
+    metrics.count('index.shards_read')
+    shard = read_json(root / SHARD_DIRNAME / info['file'], None)
+    if shard is None:
+        raise StorageError(f"Missing index shard: {info['file']}")
+    return shard.get('recipes') or []
+
+
+def write_shards(manifest: dict, entries: Iterable[dict], keys: Optional[Set[str]] = None,
+                 root: Path = ROOT) -> List[str]:
+    """Write the shards of ``keys`` (default: all) holding ``entries``.
+
+    ``entries`` must contain every recipe of those shards; a listed shard
+    left without recipes is deleted. Shards whose encoded content hashes to
+    the manifest's SHA-256 are not rewritten, and the manifest is only
+    written when a shard changed. Returns the keys of the written shards.
+    """
+    groups: Dict[str, List[dict]] = {}
+    for entry in entries:
+        groups.setdefault(shard_key(entry.get('category')), []).append(entry)
+    shards = manifest.setdefault('shards', {})
+    keys = set(shards) | set(groups) if keys is None else set(keys) | set(groups)
+    directory = root / SHARD_DIRNAME
+    now = datetime.now(timezone.utc).isoformat()
+    written = []
+    # Existing shards keep their manifest position, new ones go last
+    for key in [k for k in shards if k in keys] + sorted(keys - set(shards)):
+        recipes = groups.get(key)
+        info = shards.get(key)
+        if not recipes:
+            if info is not None:
+                (directory / info['file']).unlink(missing_ok=True)
+                del shards[key]
+                written.append(key)
+            continue
+        category = info['category'] if info else (recipes[0].get('category') or '').strip()
+        encoded = json.dumps({'category': category, 'recipes': recipes},
+                             ensure_ascii=False, indent=2).encode('utf-8')
+        digest = hashlib.sha256(encoded).hexdigest()
+        if info is not None and info.get('sha256') == digest:
+            continue
+        atomic_write_bytes(directory / f'{key}.json', encoded)
+        shards[key] = {'category': category, 'file': f'{key}.json', 'count': len(recipes),
+                       'sha256': digest, 'updated_at': now}
+        written.append(key)
+    if written or not (directory / MANIFEST_NAME).exists():
+        manifest['version'] = MANIFEST_VERSION
+        manifest['total'] = sum(info['count'] for info in shards.values())
+        manifest['updated_at'] = now
+        atomic_write_json(directory / MANIFEST_NAME, manifest)
+    metrics.count('index.shards_written', len(written))
+    return written
+
+
+def load_index(categories: Optional[Iterable[str]] = None) -> dict:
+    """Load the recipes index. Raises ``StorageError`` if it is corrupt.
+
+    With a sharded index, ``categories`` limits the result to those
+    categories' shards.
+    """
+    with metrics.span('index.load'):
+        manifest = load_manifest()
+        if manifest is None:
+            idx = binary_snapshot.read_json(INDEX, None, binary_snapshot.KIND_INDEX) or {'recipes': []}
+        else:
+            keys = manifest['shards'] if categories is None else {shard_key(c) for c in categories}
+            idx = {'recipes': [e for key in keys for e in read_shard(manifest, key)]}
+    metrics.count('index.recipes', len(idx.get('recipes') or ()))
+    return idx
+
+
+def save_index(idx: dict) -> None:
+    """Save the whole index; with shards only the changed ones are rewritten."""
+    with metrics.span('index.save'):
+        manifest = load_manifest()
+        if manifest is None:
+            binary_snapshot.write_json(INDEX, idx, binary_snapshot.KIND_INDEX)
+        else:
+            write_shards(manifest, idx.get('recipes') or [])
+
+
+def index_lock():
+    """Advisory lock for read-modify-write cycles on the index.
+
+    When both are needed, take this before the vote tracker lock.
+    """
+    return file_lock(INDEX)
+
+
+def normalize_name(name: str) -> str:
+    """Key used to reject recipes whose names only differ in case/spacing."""
+    return (name or '').strip().lower()
+
+
+class RecipeCatalog:
+    """Hash-indexed view over the index dict.
+
+    Entries stay in ``data['recipes']`` in their original order and are
+    mutated in place, so ``save()`` writes the same format as before. When
+    the list holds several entries with the same id or name, the first one
+    wins, as with the previous linear scans.
+
+    ``changes`` lists the ``(op, id)`` mutations since load ('add' and
+    'update' from ``upsert``, 'likes' appended by the vote handler) for the
+    change feed. ``added`` holds the ``(entry, details)`` pairs of recipes
+    created since load, for the ingredient, nutrition and neighbors files.
+    ``before`` keeps a copy of each changed entry as it was before its first
+    change (None for new recipes), so the ``api/`` views can move it without
+    rescanning the catalog.
+    """
+
+    def __init__(self, data: Optional[dict] = None) -> None:
+        self.data = data if data is not None else {'recipes': []}
+        self.recipes = self.data.setdefault('recipes', [])
+        self._pos_by_id: Dict[str, int] = {}
+        self._pos_by_path: Dict[str, int] = {}
+        self._id_by_name: Dict[str, str] = {}
+        self.changes: List[Tuple[str, str]] = []
+        self.added: List[Tuple[dict, dict]] = []
+        self.before: Dict[str, Optional[dict]] = {}
+        for pos, entry in enumerate(self.recipes):
+            self._index_entry(pos, entry)
+
+    @classmethod
+    def load(cls) -> 'RecipeCatalog':
+        manifest = load_manifest()
+        if manifest is not None:
+            return ShardedCatalog(manifest)
+        return cls(load_index())
+
+    def save(self) -> None:
+        save_index(self.data)
+
+    def _index_entry(self, pos: int, entry: dict) -> None:
+        rid = (entry.get('id') or '').strip()
+        self._pos_by_id.setdefault(rid, pos)
+        if entry.get('path'):
+            self._pos_by_path.setdefault(entry['path'], pos)
+        name = normalize_name(entry.get('name'))
+        if name:
+            self._id_by_name.setdefault(name, rid)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.recipes)
+
+    def __contains__(self, rid: str) -> bool:
+        return rid in self._pos_by_id
+
+    def get(self, rid: str) -> Optional[dict]:
+        pos = self._pos_by_id.get(rid)
+        return self.recipes[pos] if pos is not None else None
+
+    def id_for_name(self, name: str) -> Optional[str]:
+        """Id of the recipe with this (case-insensitive) name, if any."""
+        key = normalize_name(name)
+        return self._id_by_name.get(key) if key else None
+
+    def upsert(self, entry: dict) -> None:
+        """Replace the entry with the same id or path, or append it."""
+        rid = entry.get('id')
+        candidates = [self._pos_by_id.get(rid)]
+        if rid:
+            candidates.append(self._pos_by_path.get(entry.get('path')))
+        candidates = [p for p in candidates if p is not None]
+
+        if not candidates:
+            self.recipes.append(entry)
+            self._index_entry(len(self.recipes) - 1, entry)
+            self.changes.append(('add', rid))
+            self.before.setdefault(rid, None)
+            return
+
+        pos = min(candidates)
+        old = self.recipes[pos]
+        self.before.setdefault(rid, dict(old))
+        # Preserve original creation timestamp if not provided
+        if not entry.get('created_at') and old.get('created_at'):
+            entry['created_at'] = old.get('created_at')
+        self.recipes[pos] = entry
+        self._unindex_changed_keys(pos, old, entry)
+        self._index_entry(pos, entry)
+        self.changes.append(('update', rid))
+
+    def remember(self, rid: str) -> None:
+        """Record ``rid``'s entry in ``before``; call before changing it in place."""
+        if rid not in self.before:
+            entry = self.get(rid)
+            self.before[rid] = dict(entry) if entry is not None else None
+
+    def _unindex_changed_keys(self, pos: int, old: dict, new: dict) -> None:
+        """Drop lookups that pointed at ``old`` for keys ``new`` no longer has."""
+        old_id = (old.get('id') or '').strip()
+        new_id = (new.get('id') or '').strip()
+        if old_id != new_id and self._pos_by_id.get(old_id) == pos:
+            del self._pos_by_id[old_id]
+            self._reindex_key(lambda e: (e.get('id') or '').strip() == old_id)
+        path = old.get('path')
+        if path and path != new.get('path') and self._pos_by_path.get(path) == pos:
+            del self._pos_by_path[path]
+            self._reindex_key(lambda e: e.get('path') == path)
+        name = normalize_name(old.get('name'))
+        if name and self._id_by_name.get(name) == old_id and (
+                name != normalize_name(new.get('name')) or old_id != new_id):
+            del self._id_by_name[name]
+            self._reindex_key(lambda e: normalize_name(e.get('name')) == name)
+
+    def _reindex_key(self, matches) -> None:
+        # Rare: a replaced entry changed a key; promote a later duplicate, if any
+        for pos, entry in enumerate(self.recipes):
+            if matches(entry):
+                self._index_entry(pos, entry)
+                return
+
+
+class ShardedCatalog(RecipeCatalog):
+    """Catalog over the category shards, loading them on demand.
+
+    ``get`` reads the recipe's category from ``recipes/<id>.json`` and loads
+    that shard, falling back to every shard when the recipe is not there.
+    Name lookups, iteration and upserts need the whole catalog and load all
+    shards. ``save`` rewrites only loaded shards whose content changed.
+    """
+
+    def __init__(self, manifest: dict, root: Path = ROOT) -> None:
+        super().__init__()
+        self.manifest = manifest
+        self.root = root
+        self._loaded: Set[str] = set()
+
+    def _load_shard(self, key: str) -> None:
+        if key in self._loaded:
+            return
+        self._loaded.add(key)
+        with metrics.span('index.load'):
+            for entry in read_shard(self.manifest, key, self.root):
+                self.recipes.append(entry)
+                self._index_entry(len(self.recipes) - 1, entry)
+
+    def _load_all(self) -> None:
+        for key in list(self.manifest['shards']):
+            self._load_shard(key)
+
+    def _category_hint(self, rid: str) -> Optional[str]:
+        if not re.fullmatch(r'[\w-]+', rid or ''):
+            return None
+        try:
+            details = read_json(self.root / 'recipes' / f'{rid}.json', None)
+        except StorageError:
+            return None
+        return details.get('category') if isinstance(details, dict) else None
+
+    def save(self) -> None:
+        with metrics.span('index.save'):
+            if any(shard_key(e.get('category')) not in self._loaded for e in self.recipes):
+                # An entry moved to a shard we never read; its other recipes are needed
+                self._load_all()
+            write_shards(self.manifest, self.recipes, self._loaded, self.root)
+
+    def __len__(self) -> int:
+        self._load_all()
+        return super().__len__()
+
+    def __iter__(self) -> Iterator[dict]:
+        self._load_all()
+        return super().__iter__()
+
+    def __contains__(self, rid: str) -> bool:
+        return self.get(rid) is not None
+
+    def get(self, rid: str) -> Optional[dict]:
+        if rid not in self._pos_by_id:
+            hint = self._category_hint(rid)
+            if hint is not None:
+                self._load_shard(shard_key(hint))
+            if rid not in self._pos_by_id:
+                self._load_all()
+        return super().get(rid)
+
+    def id_for_name(self, name: str) -> Optional[str]:
+        self._load_all()
+        return super().id_for_name(name)
+
+    def upsert(self, entry: dict) -> None:
+        self._load_all()
+        super().upsert(entry)
+
+
+def shard_index(root: Path = ROOT) -> dict:
+    """Split ``recipes_index.json`` into category shards and remove it."""
+    index = root / INDEX.name
+    idx = binary_snapshot.read_json(index, None, binary_snapshot.KIND_INDEX) or {'recipes': []}
+    manifest = {'version': MANIFEST_VERSION, 'shards': {}}
+    write_shards(manifest, idx.get('recipes') or [], root=root)
+    index.unlink(missing_ok=True)
+    Path(f'{index}.snap').unlink(missing_ok=True)
+    return manifest
+
+
+def merge_index(root: Path = ROOT) -> int:
+    """Join the shards back into ``recipes_index.json``; returns the recipe count."""
+    manifest = load_manifest(root)
+    if manifest is None:
+        raise StorageError("The index is not sharded")
+    recipes = [e for key in manifest['shards'] for e in read_shard(manifest, key, root)]
+    binary_snapshot.write_json(root / INDEX.name, {'recipes': recipes}, binary_snapshot.KIND_INDEX)
+    directory = root / SHARD_DIRNAME
+    for info in manifest['shards'].values():
+        (directory / info['file']).unlink(missing_ok=True)
+    (directory / MANIFEST_NAME).unlink()
+    return len(recipes)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Recipe index layout')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='Show the index layout and shards')
+    sub.add_parser('shard', help='Split recipes_index.json into per-category shards')
+    sub.add_parser('merge', help='Join the shards back into recipes_index.json')
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest()
+    if args.command == 'status':
+        if manifest is None:
+            print(f"Single file: {len(load_index()['recipes'])} recipes in {INDEX.name}")
+            return 0
+        print(f"Sharded: {manifest.get('total', 0)} recipes in {len(manifest['shards'])} shards")
+        for info in manifest['shards'].values():
+            print(f"  {info['file']:<32} {info['count']:>6}  {info['category'] or '—'}")
+        return 0
+    with index_lock():
+        if args.command == 'shard':
+            if manifest is not None:
+                print("The index is already sharded")
+                return 1
+            manifest = shard_index()
+            print(f"Split {manifest['total']} recipes into {len(manifest['shards'])} shards")
+        else:
+            if manifest is None:
+                print("The index is not sharded")
+                return 1
+            print(f"Merged {merge_index()} recipes into {INDEX.name}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Change feed for incremental client sync.
+
+Every catalog mutation saved by intake or the bulk import gets the next
+sequence number and is logged under ``feed/``:
+
+  {"seq": 42, "op": "add", "id": "omelette", "at": "...", "data": {<index entry>}}
+  {"seq": 43, "op": "likes", "id": "omelette", "at": "...", "data": {"likes": 4, "last_vote_at": "..."}}
+  {"seq": 44, "op": "update", "id": "omelette", "at": "...", "data": {<index entry>}}
+
+``add`` and ``update`` carry the whole index entry, ``likes`` only the vote
+fields to merge into it. Votes on the same recipe saved together (a batch)
+are logged once, with the final count.
+
+Changes are written as JSON lines in segments of ``SEGMENT_SIZE``
+(``changes.<first seq>.jsonl``); only the last segment is still growing.
+``feed/head.json`` holds the latest sequence number, the segments and the
+current checkpoint, and is the only file a client has to poll. Every
+``CHECKPOINT_EVERY`` changes the whole index is written to
+``checkpoint.<seq>.json`` and segments older than that many changes are
+deleted, so the feed stays bounded. A client that is further behind (or
+new) loads the checkpoint and then applies the changes after it.
+
+``read_since(seq)`` does the same resolution locally.
+
+Usage:
+  python change_feed.py checkpoint      # start the feed or force a checkpoint
+  python change_feed.py since 120
+  python change_feed.py status
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+import metrics
+from catalog import ROOT, RecipeCatalog, index_lock
+from storage import atomic_write_bytes, atomic_write_json, read_json
+
+FEED_DIRNAME = 'feed'
+FEED_DIR = ROOT / FEED_DIRNAME
+HEAD_FILE = FEED_DIR / 'head.json'
+FEED_VERSION = 1
+SEGMENT_SIZE = 100
+CHECKPOINT_EVERY = 1000
+
+Change = Tuple[str, str]  # (op, recipe id)
+
+
+def _encode(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def load_head() -> Optional[dict]:
+    """The feed head, or None when the feed has not been started."""
+    head = read_json(HEAD_FILE, None)
+    if head is None or head.get('version') != FEED_VERSION:
+        return None
+    return head
+
+
+def read_segment(segment: dict, head: dict) -> List[dict]:
+    """Changes of one segment, ignoring lines a crashed append left past the head."""
+    try:
+        lines = (FEED_DIR / segment['file']).read_bytes().splitlines()
+    except FileNotFoundError:
+        return []
+    changes = (json.loads(line) for line in lines if line.strip())
+    return [c for c in changes if c['seq'] <= head['seq']]
+
+
+def _compact(changes: Iterable[Change]) -> List[Change]:
+    # A later vote on the same recipe supersedes the earlier ones
+    changes = list(changes)
+    last_vote = {rid: i for i, (op, rid) in enumerate(changes) if op == 'likes'}
+    return [(op, rid) for i, (op, rid) in enumerate(changes) if op != 'likes' or last_vote[rid] == i]
+
+
+def _record(seq: int, op: str, entry: dict, now: str) -> dict:
+    if op == 'likes':
+        data = {key: entry[key] for key in ('likes', 'last_vote_at') if key in entry}
+    else:
+        data = dict(entry)
+    return {'seq': seq, 'op': op, 'id': entry.get('id'), 'at': now, 'data': data}
+
+
+def write_checkpoint(catalog: RecipeCatalog, head: dict) -> None:
+    """Snapshot the index at ``head['seq']`` and drop segments past the retention window."""
+    seq = head['seq']
+    path = f'checkpoint.{seq:08d}.json'
+    with metrics.span('feed.checkpoint'):
+        atomic_write_bytes(FEED_DIR / path, _encode({'seq': seq, 'recipes': list(catalog)}))
+    previous = head.get('checkpoint')
+    if previous and previous['file'] != path:
+        (FEED_DIR / previous['file']).unlink(missing_ok=True)
+    head['checkpoint'] = {'seq': seq, 'file': path}
+    # Keep about CHECKPOINT_EVERY changes for clients that are only a little behind
+    segments = head['segments']
+    while segments and seq - segments[0]['last'] >= CHECKPOINT_EVERY:
+        (FEED_DIR / segments.pop(0)['file']).unlink(missing_ok=True)
+
+
+def start_feed(catalog: Optional[RecipeCatalog] = None) -> dict:
+    """Create the feed at sequence 0, or checkpoint an existing one now."""
+    catalog = catalog if catalog is not None else RecipeCatalog.load()
+    head = load_head() or {'version': FEED_VERSION, 'seq': 0, 'segments': [], 'checkpoint': None}
+    write_checkpoint(catalog, head)
+    head['updated_at'] = datetime.now(timezone.utc).isoformat()
+    atomic_write_json(HEAD_FILE, head)
+    return head
+
+
+def append_changes(catalog: RecipeCatalog, changes: Iterable[Change]) -> Optional[int]:
+    """Log saved catalog mutations; returns the last sequence number.
+
+    No-op (None) until the feed has been started. Must run under the index
+    lock, after the catalog was saved, so sequence numbers follow the saves.
+    """
+    head = load_head()
+    changes = _compact(changes)
+    if head is None or not changes:
+        return None
+    now = datetime.now(timezone.utc).isoformat()
+    seq = head['seq']
+    records = []
+    for op, rid in changes:
+        entry = catalog.get(rid)
+        if entry is not None:
+            seq += 1
+            records.append(_record(seq, op, entry, now))
+    if not records:
+        return head['seq']
+    metrics.count('feed.changes', len(records))
+
+    with metrics.span('feed.append'):
+        segments = head['segments']
+        if segments and segments[-1]['count'] < SEGMENT_SIZE:
+            segment = segments[-1]
+            lines = read_segment(segment, head)
+        else:
+            segment, lines = None, []
+        while records:
+            if segment is None:
+                segment = {'file': f"changes.{records[0]['seq']:08d}.jsonl", 'first': records[0]['seq']}
+                segments.append(segment)
+            room = SEGMENT_SIZE - len(lines)
+            lines, records = lines + records[:room], records[room:]
+            # Rewritten whole (at most SEGMENT_SIZE lines) so a crash never leaves a torn line
+            atomic_write_bytes(FEED_DIR / segment['file'], b''.join(_encode(c) + b'\n' for c in lines))
+            segment.update(last=lines[-1]['seq'], count=len(lines))
+            segment, lines = None, []
+        head['seq'] = seq
+        checkpoint = head.get('checkpoint') or {'seq': 0}
+        if seq - checkpoint['seq'] >= CHECKPOINT_EVERY:
+            write_checkpoint(catalog, head)
+        head['updated_at'] = now
+        atomic_write_json(HEAD_FILE, head)
+    return seq
+
+
+def read_since(since: int) -> dict:
+    """Changes after ``since``: ``{'seq': latest, 'changes': [...]}``.
+
+    When ``since`` is older than the retained segments (or ahead of the
+    feed) the result also has ``'checkpoint'``: the index file to reload
+    before applying ``changes``, which then start right after it.
+    """
+    head = load_head()
+    if head is None:
+        raise FileNotFoundError(HEAD_FILE)
+    segments = head['segments']
+    oldest = segments[0]['first'] if segments else head['seq'] + 1
+    result = {'seq': head['seq']}
+    if since < oldest - 1 or since > head['seq']:
+        result['checkpoint'] = head['checkpoint']['file']
+        since = head['checkpoint']['seq']
+    changes = []
+    for segment in segments:
+        if segment['last'] > since:
+            changes.extend(c for c in read_segment(segment, head) if c['seq'] > since)
+    result['changes'] = changes
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Change feed for incremental client sync')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('checkpoint', help='Start the feed, or write a checkpoint of the index now')
+    sub.add_parser('status', help='Show the latest sequence number, checkpoint and segments')
+    s = sub.add_parser('since', help='Print the changes after a sequence number as JSON')
+    s.add_argument('seq', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'checkpoint':
+        with index_lock():
+            head = start_feed()
+        print(f"Checkpoint at seq {head['seq']}: {FEED_DIRNAME}/{head['checkpoint']['file']}")
+        return 0
+
+    if load_head() is None:
+        print("Change feed not started; run: python change_feed.py checkpoint", file=sys.stderr)
+        return 1
+    if args.command == 'since':
+        print(json.dumps(read_since(args.seq), ensure_ascii=False, indent=2))
+        return 0
+    head = load_head()
+    print(f"Seq {head['seq']}, checkpoint at {head['checkpoint']['seq']} ({head['checkpoint']['file']})")
+    for segment in head['segments']:
+        print(f"  {segment['file']:<28} {segment['first']:>8}-{segment['last']:<8} ({segment['count']} changes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
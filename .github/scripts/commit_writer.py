@@ -0,0 +1,164 @@
+"""
+Commit writer for intake: coalesces logical operations into commits and
+pushes them, replaying the operations when the push is rejected.
+
+Operations are the issue events themselves (``GH_EVENT`` JSON lines), not
+the files they produced. ``submit`` applies operations to the working tree
+and queues them; ``flush`` stages the data paths, makes a single commit
+for everything queued and pushes it. When the push is rejected as
+non-fast-forward (a concurrent run pushed first) the writer fetches the
+branch, moves onto it, resets only the data ``paths`` to the remote version
+and applies the queued operations again on top, so two votes on the same
+recipe never produce a JSON merge conflict and an accepted vote is never
+dropped. Other push failures (network, auth) are retried as they are.
+Attempts back off exponentially with jitter up to ``max_backoff`` seconds;
+after ``attempts`` failures ``PushError`` is raised instead of ignoring the
+failure.
+
+Commits only ever contain the data paths, and a replay leaves everything
+outside them untouched (uncommitted edits, staged changes and the content
+of local commits), so the writer can run in a developer checkout.
+
+A long-running caller flushes when ``due()``: ``max_batch`` queued
+operations or ``window`` seconds since the first one.
+
+Replaying relies on the committed files being the source of truth, as with
+the default JSON vote backend; an untracked SQLite tracker is not rolled
+back by the reset.
+"""
+
+import random
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import metrics
+from storage import repo_root
+
+BOT_NAME = 'mealprep-bot'
+BOT_EMAIL = 'bot@mealprep'
+
+
+class PushError(Exception):
+    """Raised when queued operations could not be pushed after every retry."""
+
+
+class CommitWriter:
+    """Queue of applied operations waiting to be committed and pushed."""
+
+    def __init__(self, apply: Callable[[List[str]], object], paths: Sequence[str],
+                 repo: Optional[Path] = None, remote: str = 'origin', branch: Optional[str] = None,
+                 max_batch: int = 50, window: float = 30.0, attempts: int = 5,
+                 backoff: float = 1.0, max_backoff: float = 30.0,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.apply = apply
+        self.paths = list(paths)
+        self.repo = repo or repo_root()
+        self.remote = remote
+        self.branch = branch
+        self.max_batch = max_batch
+        self.window = window
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.pending: List[str] = []
+        self._first_pending: Optional[float] = None
+
+    def _git(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        result = subprocess.run(['git', *args], cwd=self.repo, capture_output=True, text=True)
+        if check and result.returncode != 0:
+            raise PushError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+        return result
+
+    def record(self, ops: Iterable[str]) -> None:
+        """Queue operations that were already applied to the working tree."""
+        ops = list(ops)
+        if ops and not self.pending:
+            self._first_pending = time.monotonic()
+        self.pending.extend(ops)
+
+    def submit(self, ops: List[str]):
+        """Apply ``ops`` now and queue them for the next commit; returns ``apply``'s result."""
+        result = self.apply(ops)
+        self.record(ops)
+        return result
+
+    def due(self) -> bool:
+        if not self.pending:
+            return False
+        return (len(self.pending) >= self.max_batch
+                or time.monotonic() - self._first_pending >= self.window)
+
+    def due_at(self) -> Optional[float]:
+        """``time.monotonic()`` value at which the pending batch is due by its window."""
+        return None if not self.pending else self._first_pending + self.window
+
+    def _known_paths(self) -> List[str]:
+        # git add and commit fail on a pathspec that matches nothing
+        return [p for p in self.paths
+                if (self.repo / p).exists() or self._git('ls-files', '--', p).stdout]
+
+    def _commit(self, message: str) -> bool:
+        paths = self._known_paths()
+        if not paths:
+            return False
+        self._git('add', '-A', '--', *paths)
+        if self._git('diff', '--cached', '--quiet', '--', *paths, check=False).returncode == 0:
+            return False
+        # Only the data paths, whatever else is staged in the checkout
+        self._git('-c', f'user.name={BOT_NAME}', '-c', f'user.email={BOT_EMAIL}',
+                  'commit', '-q', '-m', message, '--', *paths)
+        return True
+
+    @staticmethod
+    def _rejected(push: subprocess.CompletedProcess) -> bool:
+        """Whether the remote refused the push because it has commits we lack."""
+        return 'non-fast-forward' in push.stderr or 'fetch first' in push.stderr
+
+    def _replay(self) -> None:
+        """Move onto the remote branch and apply the queued operations again.
+
+        HEAD moves with a soft reset and only the data paths are reset to the
+        remote version; the rest of the index and working tree is kept.
+        """
+        self._git('fetch', '-q', self.remote, self.branch)
+        self._git('reset', '-q', '--soft', 'FETCH_HEAD')
+        self._git('reset', '-q', 'FETCH_HEAD', '--', *self.paths)
+        remote_paths = self._git('ls-tree', '--name-only', 'FETCH_HEAD', '--', *self.paths).stdout.splitlines()
+        if remote_paths:
+            self._git('checkout', 'FETCH_HEAD', '--', *remote_paths)
+        # Files created by the discarded attempt would otherwise be committed as leftovers
+        self._git('clean', '-fdq', '--', *self.paths)
+        self.apply(list(self.pending))
+
+    def flush(self, message: str) -> bool:
+        """Commit everything queued and push it, replaying on rejection.
+
+        Returns False when there was nothing to commit. Raises ``PushError``
+        once ``attempts`` pushes failed; the operations stay queued.
+        """
+        if self.branch is None:
+            self.branch = self._git('rev-parse', '--abbrev-ref', 'HEAD').stdout.strip()
+        attempt = 0
+        committed = False
+        while True:
+            metrics.count('git.attempts')
+            with metrics.span('git.commit'):
+                committed = self._commit(message) or committed
+            with metrics.span('git.push'):
+                push = self._git('push', '-q', self.remote, f'HEAD:{self.branch}', check=False)
+            if push.returncode == 0:
+                self.pending = []
+                self._first_pending = None
+                return committed
+            attempt += 1
+            if attempt >= self.attempts:
+                raise PushError(f"push failed after {attempt} attempts: {push.stderr.strip()}")
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            self.sleep(delay * random.uniform(0.5, 1.0))
+            if self._rejected(push):
+                with metrics.span('git.replay'):
+                    self._replay()
+                committed = False  # the replay dropped the local commit
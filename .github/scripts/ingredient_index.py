@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Ingredient inverted index for "what can I cook with" queries.
+
+``build`` reads every ``recipes/<id>.json`` once and writes
+``.github/data/ingredient_index.json`` with a posting list per ingredient
+name (accent- and case-folded) and a small summary per recipe. ``query``
+only reads that file and ranks recipes by how many pantry ingredients they
+cover.
+
+Posting lists are kept sorted by recipe id, so adding or replacing one
+recipe finds its slot with ``bisect`` instead of scanning the list.
+
+Usage:
+  python ingredient_index.py build
+  python ingredient_index.py query "almidon de maiz" huevo [--category Postres] [--max-missing 2]
+"""
+
+import argparse
+import bisect
+import json
+import re
+import sys
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from catalog import ROOT, RecipeCatalog
+from storage import atomic_write_json, read_json
+
+INGREDIENT_INDEX_FILE = ROOT / '.github' / 'data' / 'ingredient_index.json'
+INDEX_VERSION = 1
+
+
+def fold_text(text: str) -> str:
+    """Accent-, case- and whitespace-insensitive key ("Maíz " -> "maiz")."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', stripped).strip().casefold()
+
+
+def load_recipe_details(entry: dict) -> dict:
+    """Load ``recipes/<id>.json`` for an index entry ({} if missing/corrupt)."""
+    path = ROOT / (entry.get('path') or f"recipes/{entry.get('id')}.json")
+    try:
+        return read_json(path, {}) or {}
+    except Exception:
+        return {}
+
+
+def _recipe_summary(entry: dict, details: dict) -> dict:
+    names, seen = [], set()
+    for ing in details.get('ingredients') or []:
+        name = (ing.get('name') or '').strip() if isinstance(ing, dict) else ''
+        if name and fold_text(name) not in seen:
+            seen.add(fold_text(name))
+            names.append(name)
+    return {
+        'name': entry.get('name', ''),
+        'category': entry.get('category') or details.get('category') or '',
+        'ingredients': names,
+    }
+
+
+def empty_index() -> dict:
+    return {'version': INDEX_VERSION, 'built_at': None, 'recipes': {}, 'postings': {}}
+
+
+def add_recipe(index: dict, entry: dict, details: dict) -> None:
+    """Add or replace one recipe in an in-memory ingredient index."""
+    rid = entry.get('id')
+    if rid in index['recipes']:
+        remove_recipe(index, rid)
+    # The summary lists each folded ingredient name once
+    summary = _recipe_summary(entry, details)
+    index['recipes'][rid] = summary
+    for name in summary['ingredients']:
+        bisect.insort(index['postings'].setdefault(fold_text(name), []), rid)
+
+
+def remove_recipe(index: dict, rid: str) -> None:
+    summary = index['recipes'].pop(rid, None)
+    if not summary:
+        return
+    for name in summary['ingredients']:
+        key = fold_text(name)
+        postings = index['postings'].get(key, [])
+        i = bisect.bisect_left(postings, rid)
+        if i < len(postings) and postings[i] == rid:
+            del postings[i]
+        if not postings:
+            index['postings'].pop(key, None)
+
+
+def build_index(catalog: Optional[RecipeCatalog] = None) -> dict:
+    """Build the full index from the catalog and the recipe files."""
+    catalog = catalog or RecipeCatalog.load()
+    index = empty_index()
+    postings: Dict[str, List[str]] = {}
+    for entry in catalog:
+        summary = _recipe_summary(entry, load_recipe_details(entry))
+        index['recipes'][entry.get('id')] = summary
+        for name in summary['ingredients']:
+            postings.setdefault(fold_text(name), []).append(entry.get('id'))
+    index['postings'] = {key: sorted(rids) for key, rids in postings.items()}
+    index['built_at'] = datetime.now(timezone.utc).isoformat()
+    return index
+
+
+def load_ingredient_index() -> Optional[dict]:
+    index = read_json(INGREDIENT_INDEX_FILE, None)
+    if index is None or index.get('version') != INDEX_VERSION:
+        return None
+    # Files written before the lists were kept sorted; a no-op pass otherwise
+    for rids in index['postings'].values():
+        rids.sort()
+    return index
+
+
+def save_ingredient_index(index: dict) -> None:
+    atomic_write_json(INGREDIENT_INDEX_FILE, index)
+
+
+def query(index: dict, pantry: List[str], category: Optional[str] = None,
+          max_missing: Optional[int] = None, limit: int = 10) -> List[Dict[str, any]]:
+    """Rank recipes by how many of the pantry ingredients they use.
+
+    Only recipes sharing at least one ingredient with the pantry are
+    returned, best coverage first, then fewest missing ingredients.
+    """
+    pantry_keys = {fold_text(p) for p in pantry if fold_text(p)}
+    covered = Counter()
+    for key in pantry_keys:
+        for rid in index['postings'].get(key, ()):
+            covered[rid] += 1
+
+    category_key = fold_text(category) if category else None
+    results = []
+    for rid, count in covered.items():
+        summary = index['recipes'].get(rid)
+        if summary is None:
+            continue
+        if category_key and fold_text(summary['category']) != category_key:
+            continue
+        missing = [n for n in summary['ingredients'] if fold_text(n) not in pantry_keys]
+        if max_missing is not None and len(missing) > max_missing:
+            continue
+        results.append({
+            'id': rid,
+            'name': summary['name'],
+            'category': summary['category'],
+            'covered': count,
+            'missing_count': len(missing),
+            'missing': missing,
+        })
+
+    results.sort(key=lambda r: (-r['covered'], r['missing_count'], r['name']))
+    return results[:limit]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Ingredient index for MealPrep recipes')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build', help='Rebuild the ingredient index from recipes/*.json')
+    q = sub.add_parser('query', help='Find recipes you can cook with these ingredients')
+    q.add_argument('ingredients', nargs='+')
+    q.add_argument('--category', help='Only recipes in this category')
+    q.add_argument('--max-missing', type=int, help='Hide recipes missing more ingredients')
+    q.add_argument('--limit', type=int, default=10)
+    q.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        index = build_index()
+        save_ingredient_index(index)
+        print(f"Indexed {len(index['recipes'])} recipes, {len(index['postings'])} ingredients")
+        return 0
+
+    index = load_ingredient_index()
+    if index is None:
+        print("Ingredient index not found; run: python ingredient_index.py build", file=sys.stderr)
+        return 1
+
+    results = query(index, args.ingredients, args.category, args.max_missing, args.limit)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+
+    if not results:
+        print("Ninguna receta usa esos ingredientes.")
+    for i, r in enumerate(results, 1):
+        missing = f" — falta: {', '.join(r['missing'])}" if r['missing'] else ''
+        print(f"{i:2d}. {r['name'][:30]:<30} ({r['covered']} de tus ingredientes, "
+              f"{r['missing_count']} faltantes){missing}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,31 @@
 import json
 import os
 import re
-from pathlib import Path
+import sys
 from datetime import datetime, timezone
 
-ROOT = Path(__file__).resolve().parents[2]
-INDEX = ROOT / 'recipes_index.json'
+from storage import atomic_write_json, repo_root
+
+ROOT = repo_root()
 RECIPES_DIR = ROOT / 'recipes'
 
 # Import vote tracking system
-from vote_tracker import has_build_id_voted, record_build_id_vote, cleanup_old_votes
+from vote_tracker import VoteBackend, cleanup_old_votes, open_vote_store
+from catalog import INDEX, SHARD_DIRNAME, RecipeCatalog, index_lock
+import metrics
 
 
 def load_issue_payload() -> dict | None:
     raw = os.environ.get('GH_EVENT')
     if not raw:
         return None
-    evt = json.loads(raw)
+    metrics.count('bytes_read', len(raw))
+    with metrics.span('parse_event'):
+        return parse_issue_event(json.loads(raw))
+
+
+def parse_issue_event(evt: dict) -> dict:
+    """Extract title, labels and the JSON payload from a GitHub issue event."""
     issue = evt.get('issue') or {}
     title = (issue.get('title') or '').strip().lower()
     body = issue.get('body') or ''
@@ -36,65 +45,90 @@ def load_issue_payload() -> dict | None:
     }
 
 
-def load_index() -> dict:
-    if INDEX.exists():
-        try:
-            return json.loads(INDEX.read_text(encoding='utf-8'))
-        except Exception:
-            pass
-    return {'recipes': []}
-
-
-def save_index(idx: dict) -> None:
-    INDEX.write_text(json.dumps(idx, ensure_ascii=False, indent=2), encoding='utf-8')
-
-
 def normalize_id(text: str) -> str:
     s = re.sub(r"[^a-zA-Z0-9_-]+", "-", (text or '').strip()).strip('-').lower()
     return s or 'recipe'
 
 
+def payload_recipe_id(payload: dict) -> str:
+    """Recipe id a share or vote payload refers to."""
+    return normalize_id(payload.get('id') or payload.get('name') or '')
+
+
 def upsert_index_entry(idx: dict, entry: dict) -> None:
-    rid = entry.get('id')
-    lst = idx.setdefault('recipes', [])
-    for i, e in enumerate(lst):
-        if (e.get('id') == rid) or (rid and e.get('path') == entry.get('path')):
-            # Preserve original creation timestamp if not provided
-            if not entry.get('created_at') and e.get('created_at'):
-                entry['created_at'] = e.get('created_at')
-            lst[i] = entry
-            return
-    lst.append(entry)
-
-
-def handle_share(payload: dict) -> tuple[bool, str]:
+    RecipeCatalog(idx).upsert(entry)
+
+
+def update_derived_files(added: list[tuple[dict, dict]]) -> None:
+    """Fold new recipes into the ingredient index, nutrition and neighbors files, one write each."""
+    if not added:
+        return
+    import ingredient_index  # only new recipes touch the derived recipe files
+    import nutrition
+    import recipe_neighbors
+    nutrition.update_for_recipes(added)
+    index = ingredient_index.load_ingredient_index()
+    if index is None:
+        return
+    for entry, details in added:
+        ingredient_index.add_recipe(index, entry, details)
+    index['built_at'] = datetime.now(timezone.utc).isoformat()
+    ingredient_index.save_ingredient_index(index)
+    recipe_neighbors.update_for_recipes([entry['id'] for entry, _ in added], index)
+
+
+def publish_changes(catalog: RecipeCatalog) -> None:
+    """After a save: update the derived recipe files, log the catalog's changes
+    to the feed and refresh the ``api/`` views.
+
+    Each is a no-op until it has been built/started, so the files are never
+    ahead of the saved index. The catalog's pending changes are only cleared
+    once all three succeeded, so a failed publish is retried whole (the feed
+    may then log a change twice, with the same data).
+    """
+    import api_build
+    import change_feed
+    update_derived_files(catalog.added)
+    change_feed.append_changes(catalog, catalog.changes)
+    api_build.update_for_recipes([rid for _, rid in catalog.changes], catalog, catalog.before)
+    catalog.changes, catalog.added, catalog.before = [], [], {}
+
+
+def handle_share(payload: dict, catalog: RecipeCatalog | None = None) -> tuple[bool, str]:
     """Create a new recipe entry. Reject if name or id already exists.
 
-    Returns (success, message).
+    When ``catalog`` is given it is updated in place and the caller saves and
+    publishes it. Returns (success, message).
     """
+    if catalog is None:
+        with index_lock():
+            catalog = RecipeCatalog.load()
+            success, msg = handle_share(payload, catalog)
+            if success:
+                catalog.save()
+                publish_changes(catalog)
+            return success, msg
+
     RECIPES_DIR.mkdir(parents=True, exist_ok=True)
-    idx = load_index()
     now = datetime.now(timezone.utc).isoformat()
 
     name = (payload.get('name') or '').strip() or 'Receta'
-    rid = normalize_id(payload.get('id') or payload.get('name') or '')
+    rid = payload_recipe_id(payload)
     path = f"recipes/{rid}.json"
 
     # Reject duplicates by id or by case-insensitive name
-    normalized_name = name.lower()
-    for e in idx.get('recipes', []):
-        existing_id = (e.get('id') or '').strip()
-        existing_name = (e.get('name') or '').strip().lower()
-        if existing_id == rid:
-            return False, (
-                f"Error: ya existe una receta con id '{rid}' (nombre: {e.get('name','')}). "
-                "No se permiten duplicados."
-            )
-        if existing_name and existing_name == normalized_name:
-            return False, (
-                f"Error: ya existe una receta con el mismo nombre: '{name}' (id: {existing_id}). "
-                "Por favor elegí otro nombre."
-            )
+    existing = catalog.get(rid)
+    if existing is not None:
+        return False, (
+            f"Error: ya existe una receta con id '{rid}' (nombre: {existing.get('name','')}). "
+            "No se permiten duplicados."
+        )
+    existing_id = catalog.id_for_name(name)
+    if existing_id is not None:
+        return False, (
+            f"Error: ya existe una receta con el mismo nombre: '{name}' (id: {existing_id}). "
+            "Por favor elegí otro nombre."
+        )
 
     # Create new entry
     entry = {
@@ -114,18 +148,33 @@ def handle_share(payload: dict) -> tuple[bool, str]:
         'servings': payload.get('servings') or 1,
         'category': payload.get('category') or '',
     }
-    (ROOT / path).write_text(json.dumps(details, ensure_ascii=False, indent=2), encoding='utf-8')
-    upsert_index_entry(idx, entry)
-    save_index(idx)
+    atomic_write_json(ROOT / path, details)
+    catalog.upsert(entry)
+    catalog.added.append((entry, details))
     return True, f"Gracias por compartir! La receta '{name}' fue agregada."
 
 
-def handle_vote(payload: dict) -> tuple[bool, str]:
+def handle_vote(payload: dict, catalog: RecipeCatalog | None = None,
+                store: VoteBackend | None = None) -> tuple[bool, str]:
     """
     Handle a vote request. Returns (success, message).
+
+    When ``catalog`` is given it is updated in place and the caller saves it.
+    Without a ``store`` a vote tracker session is opened for this vote only.
     """
-    idx = load_index()
-    rid = normalize_id(payload.get('id') or payload.get('name') or '')
+    if catalog is None:
+        with index_lock():
+            catalog = RecipeCatalog.load()
+            success, msg = handle_vote(payload, catalog, store)
+            if success:
+                catalog.save()
+                publish_changes(catalog)
+            return success, msg
+    if store is None:
+        with open_vote_store() as store:
+            return handle_vote(payload, catalog, store)
+
+    rid = payload_recipe_id(payload)
     build_id = payload.get('build_id', '').strip()
     
     # Check if build_id is provided
@@ -133,70 +182,168 @@ def handle_vote(payload: dict) -> tuple[bool, str]:
         return False, "Error: build_id es requerido para votar"
     
     # Check if this build_id has already voted for this recipe
-    if has_build_id_voted(build_id, rid):
+    if store.has_voted(build_id, rid):
         return False, f"Ya has votado por esta receta desde esta instalación (build_id: {build_id[:8]}...)"
     
     # Find the recipe in the index
-    recipe_found = False
-    lst = idx.setdefault('recipes', [])
-    for e in lst:
-        if e.get('id') == rid:
-            # Record the vote in the tracker
-            record_build_id_vote(build_id, rid, e.get('name', ''))
-            
-            # Increment the likes count
-            e['likes'] = int(e.get('likes') or 0) + 1
-            now = datetime.now(timezone.utc).isoformat()
-            e['updated_at'] = now
-            e['last_vote_at'] = now
-            recipe_found = True
-            break
-    
-    if not recipe_found:
+    e = catalog.get(rid)
+    if e is None:
         return False, f"Receta no encontrada: {rid}"
     
-    save_index(idx)
+    # Record the vote in the tracker
+    store.record_vote(build_id, rid, e.get('name', ''))
+    catalog.remember(rid)
+    
+    # Increment the likes count
+    e['likes'] = int(e.get('likes') or 0) + 1
+    now = datetime.now(timezone.utc).isoformat()
+    e['updated_at'] = now
+    e['last_vote_at'] = now
+    catalog.changes.append(('likes', rid))
+    
     return True, f"¡Voto registrado! Likes actualizados para la receta '{rid}'"
 
 
-def main():
-    issue = load_issue_payload()
-    if not issue:
-        print('No issue payload')
-        return
-    
+def issue_action(issue: dict) -> str:
+    """'share', 'vote' or 'none', from the issue labels or title prefix."""
     labels = set(issue['labels'])
+    if ('recipe' in labels) or issue['title'].startswith('share:'):
+        return 'share'
+    if ('vote' in labels) or issue['title'].startswith('vote:'):
+        return 'vote'
+    return 'none'
+
+
+def process_issue(issue: dict, catalog: RecipeCatalog | None = None, store: VoteBackend | None = None) -> tuple[str, bool, str]:
+    """Dispatch one parsed issue to the matching handler.
+
+    Returns (action, success, message) where action is 'share', 'vote' or 'none'.
+    """
+    action = issue_action(issue)
     payload = issue['payload'] or {}
-    
-    # Clean up old votes periodically (every 10th run)
+
+    if action == 'share':
+        success, msg = handle_share(payload, catalog)
+        return 'share', success, msg
+    if action == 'vote':
+        success, msg = handle_vote(payload, catalog, store)
+        return 'vote', success, msg
+    return 'none', False, 'No action for this issue.'
+
+
+def ensure_data_ready() -> None:
+    """Cheap schema stamp check; runs the vote data migration only when it changed."""
+    from migrate_vote_data import ensure_schema
+    with metrics.span('schema_check'):
+        ensure_schema()
+
+
+def maybe_cleanup_votes() -> None:
+    """Clean up old votes periodically (every 10th run)."""
     import random
     if random.randint(1, 10) == 1:
-        cleaned = cleanup_old_votes(days_threshold=90)
+        cleaned = cleanup_old_votes()
         if cleaned > 0:
             print(f"Cleaned up {cleaned} old vote records")
-    
-    if ('recipe' in labels) or issue['title'].startswith('share:'):
-        success, msg = handle_share(payload)
-        commit_changes = success
-    elif ('vote' in labels) or issue['title'].startswith('vote:'):
-        success, msg = handle_vote(payload)
-        commit_changes = success
-        if not success:
-            print(f"Vote rejected: {msg}")
+
+
+def make_commit_writer(**options) -> 'CommitWriter':
+    """Commit writer over the files intake changes, replaying events with ``run_batch``."""
+    from api_build import API_DIRNAME
+    from change_feed import FEED_DIRNAME
+    from commit_writer import CommitWriter
+    paths = (INDEX.name, SHARD_DIRNAME, API_DIRNAME, FEED_DIRNAME, 'recipes', '.github/data')
+    return CommitWriter(apply=run_batch, paths=paths, repo=ROOT, **options)
+
+
+def commit_and_push(events: list[str], message: str = 'community: update index/recipes via issue') -> None:
+    """Commit and push the applied ``events`` (GH_EVENT JSON), replaying them on push conflicts."""
+    writer = make_commit_writer()
+    writer.record(events)
+    writer.flush(message)
+
+
+def run_batch(lines) -> list[dict]:
+    """Apply a backlog of issue events (one GH_EVENT JSON object per line).
+
+    The index and the vote tracker are loaded once, every event is applied in
+    order with the same duplicate rules as a single run, and each file is
+    written at most once at the end. Returns one result dict per event.
+    """
+    results = []
+    index_dirty = False
+
+    with index_lock(), open_vote_store() as store:
+        catalog = RecipeCatalog.load()
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            metrics.count('events')
+            try:
+                with metrics.span('parse_event'):
+                    issue = parse_issue_event(json.loads(line))
+            except Exception as e:
+                results.append({'line': lineno, 'issue_number': None, 'action': 'none',
+                                'success': False, 'message': f'Evento inválido: {e}'})
+                continue
+            action, success, msg = process_issue(issue, catalog, store)
+            index_dirty = index_dirty or success
+            results.append({'line': lineno, 'issue_number': issue['issue_number'], 'action': action,
+                            'success': success, 'message': msg})
+
+        if index_dirty:
+            catalog.save()
+            publish_changes(catalog)
+    return results
+
+
+def main_batch(source: str) -> None:
+    """Process a JSONL backlog from ``source`` ('-' reads stdin)."""
+    ensure_data_ready()
+    maybe_cleanup_votes()
+
+    if source == '-':
+        lines = sys.stdin.readlines()
     else:
-        msg = 'No action for this issue.'
-        commit_changes = False
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+    results = run_batch(lines)
+
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+
+    # Only accepted events are replayed on a push conflict: a rejected one
+    # could pass on top of newer data and diverge from the printed results
+    accepted = [lines[r['line'] - 1] for r in results if r['success']]
+    print(f"Processed {len(results)} events, {len(accepted)} accepted")
+    if accepted:
+        commit_and_push(accepted, f'community: apply {len(accepted)} issue events in batch')
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        main_batch(sys.argv[2])
+        return
+
+    issue = load_issue_payload()
+    if not issue:
+        print('No issue payload')
+        return
+    
+    ensure_data_ready()
+    maybe_cleanup_votes()
+    
+    action, success, msg = process_issue(issue)
+    if action == 'vote' and not success:
+        print(f"Vote rejected: {msg}")
     
     # Commit and push changes back only if successful
-    if commit_changes:
-        os.system("git config user.name 'mealprep-bot'")
-        os.system("git config user.email 'bot@mealprep'")
-        os.system("git add recipes_index.json recipes .github/data/vote_tracker.json || true")
-        os.system("git commit -m 'community: update index/recipes via issue' || true")
-        os.system("git push || true")
+    if success:
+        commit_and_push([os.environ['GH_EVENT']])
     
     print(msg)
 
 
 if __name__ == '__main__':
-    main()
+    metrics.run(main, 'intake')
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+Long-running webhook intake server.
+
+Starting a workflow runner per issue costs seconds before ``intake.py``
+even runs. This asyncio HTTP server accepts the same issue-event JSON as
+``GH_EVENT`` (a GitHub ``issues`` webhook delivery, or any client POSTing
+it) and applies it with the ``process_issue`` rules of ``intake.py``.
+
+Request handlers parse and validate events concurrently and put them on a
+bounded queue; malformed events, events with no action and votes without a
+``build_id`` are answered right away. A single writer task owns the catalog
+and the vote tracker session (and their locks) for the server's lifetime,
+applies events in arrival order and answers each request with the handler's
+result. Writes are debounced: the index, derived files and tracker are
+flushed once the queue has been idle for ``--debounce`` seconds, after at
+most ``--max-delay`` seconds of pending changes, or every ``--flush-every``
+events. With ``--push`` the flushed files are committed and pushed through
+``commit_writer.CommitWriter`` (one commit per batch/window, replaying the
+events on push conflicts). A failed flush or push is logged and retried
+later with its events kept, and so is reloading the index and tracker
+after a push; if the writer task stops anyway, requests still waiting on
+it are answered with 503.
+
+Endpoints:
+  POST /  or  POST /events   issue event JSON; ``?wait=flush`` answers after it is on disk
+  GET  /metrics              queue depth, throughput, apply/flush latency percentiles
+  GET  /healthz
+
+``MEALPREP_WEBHOOK_SECRET`` enables GitHub's ``X-Hub-Signature-256`` check.
+
+``load`` is a local load generator: it sends vote events for recipes in
+the catalog from many keep-alive connections and reports throughput and
+latency.
+
+Usage:
+  python intake_server.py serve [--port 8080] [--debounce 0.2] [--push]
+  python intake_server.py load [--events 5000] [--concurrency 50] [--port 8080]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import signal
+import sys
+import time
+import uuid
+from collections import deque
+from contextlib import ExitStack
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from catalog import RecipeCatalog, index_lock
+from commit_writer import PushError
+from intake import (ensure_data_ready, issue_action, make_commit_writer, parse_issue_event,
+                    process_issue, publish_changes)
+from vote_tracker import open_vote_store
+
+MAX_BODY = 1 << 20
+QUEUE_SIZE = 10000
+LATENCY_SAMPLES = 10000
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50': round(pick(0.5), 3), 'p95': round(pick(0.95), 3),
+            'p99': round(pick(0.99), 3), 'max': round(ordered[-1], 3)}
+
+
+class WriterStopped(Exception):
+    """Set on the futures of events the writer task can no longer apply or flush."""
+
+
+class Event:
+    """One queued issue event and the future its HTTP request waits on."""
+
+    __slots__ = ('raw', 'issue', 'received', 'done', 'durable')
+
+    def __init__(self, raw: str, issue: dict, loop: asyncio.AbstractEventLoop) -> None:
+        self.raw = raw
+        self.issue = issue
+        self.received = time.perf_counter()
+        self.done = loop.create_future()
+        self.durable: Optional[asyncio.Future] = None
+
+
+class IntakeServer:
+    """HTTP front end plus the single writer task."""
+
+    def __init__(self, debounce: float = 0.2, max_delay: float = 2.0, flush_every: int = 5000,
+                 push: bool = False, secret: Optional[str] = None) -> None:
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.flush_every = flush_every
+        self.secret = secret.encode('utf-8') if secret else None
+        self.committer = make_commit_writer() if push else None
+        self.queue: Optional[asyncio.Queue] = None
+        self.catalog: Optional[RecipeCatalog] = None
+        self.store = None
+        self._session = ExitStack()
+        self._unflushed: List[Event] = []
+        self._first_unflushed = 0.0
+        self._flush_retry_at = 0.0
+        self._push_retry_at = 0.0
+        self.writer_task: Optional[asyncio.Task] = None
+        self.started = time.monotonic()
+        self.counters = {'received': 0, 'invalid': 0, 'applied': 0, 'accepted': 0,
+                         'flushes': 0, 'pushes': 0, 'flush_errors': 0, 'push_errors': 0,
+                         'session_errors': 0}
+        self.stopping = False
+        self.max_queue_depth = 0
+        self.apply_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.durable_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.flush_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    # --- writer side ---
+
+    def open_session(self) -> None:
+        """Take the index and tracker locks and load both into memory."""
+        self._session.enter_context(index_lock())
+        self.store = self._session.enter_context(open_vote_store())
+        self.catalog = RecipeCatalog.load()
+
+    def close_session(self) -> None:
+        self._session.close()
+        self.store = self.catalog = None
+
+    def try_open_session(self) -> bool:
+        """``open_session``, logging a failure (e.g. a bad file after a replay)."""
+        try:
+            self.open_session()
+            return True
+        except Exception as e:
+            self.close_session()
+            self.counters['session_errors'] += 1
+            print(f"⚠️  Reloading the index and tracker failed, retrying in {self.max_delay}s: {e}",
+                  file=sys.stderr, flush=True)
+            return False
+
+    def _apply(self, event: Event) -> dict:
+        action, success, msg = process_issue(event.issue, self.catalog, self.store)
+        return {'action': action, 'success': success, 'message': msg}
+
+    def flush(self) -> None:
+        """Write the index, derived files, feed and tracker for the applied events."""
+        if not self._unflushed:
+            return
+        t0 = time.perf_counter()
+        with metrics.span('server.flush'):
+            if self.catalog.changes:
+                self.catalog.save()
+                publish_changes(self.catalog)
+            self.store.flush()
+        now = time.perf_counter()
+        self.flush_ms.append((now - t0) * 1000)
+        self.counters['flushes'] += 1
+        for event in self._unflushed:
+            self.durable_ms.append((now - event.received) * 1000)
+            if event.durable is not None and not event.durable.done():
+                event.durable.set_result(True)
+        accepted = [e.raw for e in self._unflushed if e.done.result()['success']]
+        if self.committer is not None:
+            self.committer.record(accepted)
+        self._unflushed = []
+
+    def try_flush(self) -> bool:
+        """``flush``, logging a failure and holding off the next attempt for ``max_delay``."""
+        try:
+            self.flush()
+            return True
+        except Exception as e:
+            self.counters['flush_errors'] += 1
+            self._flush_retry_at = time.perf_counter() + self.max_delay
+            print(f"⚠️  Flush failed, retrying in {self.max_delay}s: {e}", file=sys.stderr, flush=True)
+            return False
+
+    async def push(self, force: bool = False) -> None:
+        """Commit and push the flushed files when the commit writer's batch is due.
+
+        A failed push is logged and its events stay queued in the commit
+        writer; it is retried once due again, no sooner than its window.
+        """
+        if self.committer is None or not self.committer.pending or self._unflushed:
+            return
+        if not force and (not self.committer.due() or time.monotonic() < self._push_retry_at):
+            return
+        # The writer may replay events through intake, which takes the same locks
+        self.close_session()
+        try:
+            count = len(self.committer.pending)
+            await asyncio.to_thread(self.committer.flush, f'community: apply {count} issue events via webhook')
+            self.counters['pushes'] += 1
+        except PushError as e:
+            self.counters['push_errors'] += 1
+            self._push_retry_at = time.monotonic() + self.committer.window
+            print(f"⚠️  Push failed, {count} events kept for the next one: {e}", file=sys.stderr, flush=True)
+        finally:
+            # On failure the writer loop keeps retrying before it applies anything
+            self.try_open_session()
+
+    def _fail_waiting(self, reason: str) -> None:
+        """Answer every request still waiting on the writer with ``WriterStopped``."""
+        waiting = list(self._unflushed)
+        while not self.queue.empty():
+            event = self.queue.get_nowait()
+            if event is not None:
+                waiting.append(event)
+        for event in waiting:
+            for future in (event.done, event.durable):
+                if future is not None and not future.done():
+                    future.set_exception(WriterStopped(reason))
+
+    async def writer(self) -> None:
+        """Run the writer loop; requests still waiting when it stops get a 503."""
+        reason = 'el servidor se está cerrando'
+        try:
+            await self._write_loop()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            reason = f'error interno del escritor: {e}'
+            print(f"⚠️  Writer stopped: {e!r}", file=sys.stderr, flush=True)
+            raise
+        finally:
+            self._fail_waiting(reason)
+
+    async def _write_loop(self) -> None:
+        """Apply queued events one at a time; flush on the debounce deadline."""
+        while True:
+            if self.store is None and not self.try_open_session():
+                if self.stopping:
+                    return
+                await asyncio.sleep(self.max_delay)
+                continue
+            timeout = None
+            if self._unflushed:
+                now = time.perf_counter()
+                deadline = min(self._unflushed[-1].received + self.debounce, self._first_unflushed + self.max_delay)
+                timeout = max(0.0, max(deadline, self._flush_retry_at) - now)
+            elif self.committer is not None and self.committer.pending:
+                # Push an idle batch (or retry a failed push) without waiting for new events
+                timeout = max(0.0, max(self.committer.due_at(), self._push_retry_at) - time.monotonic())
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if self.try_flush():
+                    await self.push()
+                continue
+            if event is None:  # shutdown
+                if self.try_flush():
+                    await self.push(force=True)
+                return
+            try:
+                result = self._apply(event)
+            except Exception as e:
+                result = {'action': issue_action(event.issue), 'success': False, 'message': f'Error interno: {e}'}
+            self.counters['applied'] += 1
+            self.counters['accepted'] += result['success']
+            self.apply_ms.append((time.perf_counter() - event.received) * 1000)
+            event.done.set_result(result)
+            if not self._unflushed:
+                self._first_unflushed = event.received
+            self._unflushed.append(event)
+            if len(self._unflushed) >= self.flush_every and time.perf_counter() >= self._flush_retry_at:
+                if self.try_flush():
+                    await self.push()
+
+    # --- HTTP side ---
+
+    def validate(self, body: bytes, headers: Dict[str, str]) -> Tuple[int, Optional[dict], dict]:
+        """(status, parsed issue or None, response) for an event body, without touching any data."""
+        if self.secret is not None:
+            expected = 'sha256=' + hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected, headers.get('x-hub-signature-256', '')):
+                return 401, None, {'success': False, 'message': 'Firma inválida'}
+        try:
+            evt = json.loads(body)
+            issue = parse_issue_event(evt)
+        except Exception as e:
+            return 400, None, {'success': False, 'message': f'Evento inválido: {e}'}
+        if evt.get('action') not in (None, 'opened'):
+            return 202, None, {'action': 'none', 'success': False, 'message': 'Solo se procesan issues nuevos.'}
+        action = issue_action(issue)
+        if action == 'none':
+            return 202, None, {'action': 'none', 'success': False, 'message': 'No action for this issue.'}
+        if not isinstance(issue['payload'] or {}, dict):
+            return 400, None, {'action': action, 'success': False, 'message': 'Evento inválido: el JSON debe ser un objeto'}
+        if action == 'vote' and not str(issue['payload'] and issue['payload'].get('build_id') or '').strip():
+            return 400, None, {'action': 'vote', 'success': False,
+                               'message': 'Error: build_id es requerido para votar'}
+        return 200, issue, {}
+
+    def metrics_snapshot(self) -> dict:
+        uptime = time.monotonic() - self.started
+        return {
+            'uptime_s': round(uptime, 3),
+            'queue_depth': self.queue.qsize() if self.queue else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'unflushed': len(self._unflushed),
+            'writer_running': self.writer_task is not None and not self.writer_task.done(),
+            **self.counters,
+            'events_per_s': round(self.counters['applied'] / uptime, 1) if uptime else 0.0,
+            'apply_latency_ms': _percentiles(self.apply_ms),
+            'durable_latency_ms': _percentiles(self.durable_ms),
+            'flush_ms': _percentiles(self.flush_ms),
+            'stages': metrics.collected() if metrics.ENABLED else None,
+        }
+
+    async def handle_event(self, body: bytes, headers: Dict[str, str], query: dict) -> Tuple[int, dict]:
+        self.counters['received'] += 1
+        status, issue, response = self.validate(body, headers)
+        if issue is None:
+            self.counters['invalid'] += 1
+            return status, response
+        if self.writer_task is None or self.writer_task.done():
+            return 503, {'success': False, 'message': 'El escritor no está corriendo, reintentá más tarde'}
+        if self.queue.full():
+            return 503, {'success': False, 'message': 'Cola llena, reintentá más tarde'}
+        event = Event(body.decode('utf-8'), issue, asyncio.get_running_loop())
+        wait_flush = query.get('wait') == ['flush']
+        if wait_flush:
+            event.durable = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(event)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        try:
+            result = await event.done
+            if wait_flush and result['success']:
+                await event.durable
+        except WriterStopped as e:
+            return 503, {'success': False, 'message': f'No se pudo procesar el evento: {e}'}
+        return 200, {**result, 'durable': wait_flush and result['success']}
+
+    async def route(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, dict]:
+        url = urlsplit(target)
+        if url.path in ('/', '/events'):
+            if method != 'POST':
+                return 405, {'message': 'Usá POST'}
+            return await self.handle_event(body, headers, parse_qs(url.query))
+        if url.path == '/metrics':
+            return 200, self.metrics_snapshot()
+        if url.path == '/healthz':
+            return 200, {'ok': True}
+        return 404, {'message': 'No encontrado'}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                if body is None:
+                    status, response = 413, {'message': 'Cuerpo demasiado grande'}
+                else:
+                    status, response = await self.route(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and body is not None
+                _write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        ensure_data_ready()
+        self.open_session()
+        self.writer_task = asyncio.create_task(self.writer())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+        print(f"Intake server listening on http://{host}:{port} ({len(self.catalog)} recipes)", flush=True)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            server.close()
+            self.stopping = True
+            if not self.writer_task.done():
+                await self.queue.put(None)
+            try:
+                await self.writer_task
+            except Exception:
+                pass  # already logged; waiting requests were answered with a 503
+            self.close_session()
+            print(json.dumps(self.metrics_snapshot(), ensure_ascii=False), file=sys.stderr)
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """(method, target, headers, body) of the next request; body None when too large."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY:
+        return method, target, headers, None
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+
+
+# --- load generator ---
+
+def vote_event(recipe_id: str, build_id: str) -> bytes:
+    payload = json.dumps({'id': recipe_id, 'build_id': build_id})
+    return json.dumps({'action': 'opened', 'issue': {
+        'title': f'vote: {recipe_id}', 'number': 0, 'labels': [{'name': 'vote'}],
+        'body': f'```json\n{payload}\n```'}}).encode('utf-8')
+
+
+async def _request(reader, writer, host: str, method: str, path: str, body: bytes = b'') -> Tuple[int, dict]:
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_load(host: str, port: int, events: int, concurrency: int, recipe_ids: List[str]) -> dict:
+    """Send ``events`` vote events over ``concurrency`` keep-alive connections."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(events))
+
+    async def client() -> None:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for _ in remaining:
+                body = vote_event(random.choice(recipe_ids), f'load-{uuid.uuid4().hex}')
+                t0 = time.perf_counter()
+                status, _ = await _request(reader, writer, host, 'POST', '/events', body)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    reader, writer = await asyncio.open_connection(host, port)
+    _, server_metrics = await _request(reader, writer, host, 'GET', '/metrics')
+    writer.close()
+    return {'events': events, 'seconds': round(elapsed, 3), 'events_per_s': round(events / elapsed, 1),
+            'statuses': statuses, 'latency_ms': _percentiles(latencies), 'server': server_metrics}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Webhook intake server and load generator')
+    sub = parser.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('serve', help='Run the intake server')
+    s.add_argument('--host', default='127.0.0.1')
+    s.add_argument('--port', type=int, default=8080)
+    s.add_argument('--debounce', type=float, default=0.2, help='Idle seconds before flushing')
+    s.add_argument('--max-delay', type=float, default=2.0, help='Longest wait for a flush while busy')
+    s.add_argument('--flush-every', type=int, default=5000, help='Flush after this many events')
+    s.add_argument('--push', action='store_true', help='Commit and push flushed changes')
+    l = sub.add_parser('load', help='Send vote events to a running server')
+    l.add_argument('--host', default='127.0.0.1')
+    l.add_argument('--port', type=int, default=8080)
+    l.add_argument('--events', type=int, default=5000)
+    l.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = IntakeServer(args.debounce, args.max_delay, args.flush_every, args.push,
+                              os.environ.get('MEALPREP_WEBHOOK_SECRET'))
+        asyncio.run(server.serve(args.host, args.port))
+        return 0
+
+    recipe_ids = [e['id'] for e in RecipeCatalog.load() if e.get('id')]
+    if not recipe_ids:
+        print("No recipes in the index", file=sys.stderr)
+        return 1
+    report = asyncio.run(run_load(args.host, args.port, args.events, args.concurrency, recipe_ids))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
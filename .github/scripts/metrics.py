@@ -0,0 +1,78 @@
+"""
+Opt-in timing and counters for the intake pipeline.
+
+``MEALPREP_METRICS=1`` turns the layer on: ``span(name)`` accumulates wall
+time per stage, ``count(name, n)`` adds to a counter and ``run()`` prints one
+``MEALPREP_METRICS {...}`` JSON line to stderr when the entry point returns.
+With the variable unset, spans and counters are no-ops.
+
+``MEALPREP_PROFILE=path`` runs the entry point under cProfile, dumps the
+stats to ``path`` and prints the top functions to stderr, so a slow run can
+be diagnosed from the workflow log alone.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict
+
+ENABLED = os.environ.get('MEALPREP_METRICS', '') not in ('', '0')
+PROFILE_PATH = os.environ.get('MEALPREP_PROFILE') or None
+
+_durations: Dict[str, float] = {}
+_calls: Dict[str, int] = {}
+_counters: Dict[str, int] = {}
+_NULL_SPAN = nullcontext()
+
+
+@contextmanager
+def _timed(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _durations[name] = _durations.get(name, 0.0) + time.perf_counter() - t0
+        _calls[name] = _calls.get(name, 0) + 1
+
+
+def span(name: str):
+    """Context manager adding the block's wall time to stage ``name``."""
+    return _timed(name) if ENABLED else _NULL_SPAN
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add ``n`` to counter ``name`` (bytes, records, events...)."""
+    if ENABLED:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def collected() -> Dict[str, any]:
+    """Stage durations (ms), call counts and counters recorded so far."""
+    return {
+        'durations_ms': {k: round(v * 1000, 3) for k, v in sorted(_durations.items())},
+        'calls': dict(sorted(_calls.items())),
+        'counters': dict(sorted(_counters.items())),
+    }
+
+
+def run(main: Callable[[], any], entry: str):
+    """Run an entry point, profiling it and emitting its metrics line as configured."""
+    t0 = time.perf_counter()
+    try:
+        if PROFILE_PATH:
+            import cProfile
+            import pstats
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(main)
+            finally:
+                profiler.dump_stats(PROFILE_PATH)
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+        return main()
+    finally:
+        if ENABLED:
+            line = {'entry': entry, 'total_ms': round((time.perf_counter() - t0) * 1000, 3),
+                    **collected()}
+            print('MEALPREP_METRICS ' + json.dumps(line, ensure_ascii=False), file=sys.stderr)
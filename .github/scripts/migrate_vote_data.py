@@ -2,26 +2,30 @@
 """
 Migration script for existing vote data.
 This script helps migrate any existing vote data to the new build_id tracking system.
+
+The data layout is stamped with ``SCHEMA_VERSION`` in schema_version.json.
+Intake calls ``ensure_schema()`` on every run: while the stamp is current it
+costs one small file read, and the initialization/validation below only runs
+again after ``SCHEMA_VERSION`` is bumped.
+
+Usage:
+  python migrate_vote_data.py              # initialize and validate the JSON tracker
+  python migrate_vote_data.py to-sqlite    # copy vote_tracker.json (+ journal) into SQLite
+  python migrate_vote_data.py export-json  # regenerate vote_tracker.json from SQLite
 """
 
-import json
-import os
-from pathlib import Path
+import sys
 from datetime import datetime, timezone
-from vote_tracker import load_vote_tracker, save_vote_tracker
-
-ROOT = Path(__file__).resolve().parents[2]
-INDEX = ROOT / 'recipes_index.json'
+from typing import Optional
+from storage import StorageError, atomic_write_json, read_json, repo_root
+from vote_tracker import (SqliteVoteStore, VoteStore, load_vote_tracker,
+                          save_vote_tracker, tracker_lock)
 
+ROOT = repo_root()
+SCHEMA_FILE = ROOT / '.github' / 'data' / 'schema_version.json'
 
-def load_index():
-    """Load the recipes index."""
-    if INDEX.exists():
-        try:
-            return json.loads(INDEX.read_text(encoding='utf-8'))
-        except Exception:
-            pass
-    return {'recipes': []}
+# Bump when the data files need initialize/migrate to run again
+SCHEMA_VERSION = 1
 
 
 def migrate_existing_votes():
@@ -31,10 +35,6 @@ def migrate_existing_votes():
     """
     print("🔄 Migrating existing vote data...")
     
-    # Load current index
-    index = load_index()
-    recipes = index.get('recipes', [])
-    
     # For now, we don't have historical vote data to migrate
     # This function is here for future use if needed
     print("   ℹ️  No existing vote data to migrate")
@@ -47,19 +47,20 @@ def initialize_vote_tracker():
     """Initialize the vote tracker with default structure."""
     print("🔧 Initializing vote tracker...")
     
-    tracker = load_vote_tracker()
-    
-    # Add metadata if not present
-    if 'metadata' not in tracker:
-        tracker['metadata'] = {
-            'version': '1.0',
-            'created_at': datetime.now(timezone.utc).isoformat(),
-            'description': 'MealPrep Community Vote Tracking System'
-        }
-        save_vote_tracker(tracker)
-        print("   ✅ Vote tracker initialized with metadata")
-    else:
-        print("   ℹ️  Vote tracker already initialized")
+    with tracker_lock():
+        tracker = load_vote_tracker()
+        
+        # Add metadata if not present
+        if 'metadata' not in tracker:
+            tracker['metadata'] = {
+                'version': '1.0',
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'description': 'MealPrep Community Vote Tracking System'
+            }
+            save_vote_tracker(tracker)
+            print("   ✅ Vote tracker initialized with metadata")
+        else:
+            print("   ℹ️  Vote tracker already initialized")
     
     return True
 
@@ -115,6 +116,63 @@ def create_sample_data():
     return True
 
 
+def current_schema_version() -> Optional[int]:
+    """Schema version the data files were last migrated to (None if never)."""
+    try:
+        return read_json(SCHEMA_FILE, {}).get('schema_version')
+    except StorageError:
+        return None
+
+
+def write_schema_version() -> None:
+    atomic_write_json(SCHEMA_FILE, {
+        'schema_version': SCHEMA_VERSION,
+        'migrated_at': datetime.now(timezone.utc).isoformat(),
+    })
+
+
+def ensure_schema() -> bool:
+    """Initialize, migrate and validate only when the schema stamp is outdated.
+
+    Returns True when the migration ran. Raises ``StorageError`` if the
+    data fails validation, leaving the stamp untouched so the next run retries.
+    """
+    if current_schema_version() == SCHEMA_VERSION:
+        return False
+    initialize_vote_tracker()
+    migrate_existing_votes()
+    if not validate_system_integrity():
+        raise StorageError("vote tracker failed integrity validation")
+    write_schema_version()
+    return True
+
+
+def migrate_to_sqlite():
+    """Copy the JSON tracker (snapshot plus journal) into the SQLite database."""
+    print("🔄 Migrating vote tracker to SQLite...")
+    with VoteStore(readonly=True) as source:
+        data = source.export_data()
+    with SqliteVoteStore() as target:
+        target.import_data(data)
+        problems = target.verify_index()
+        records = sum(1 for _ in target.iter_records())
+    for problem in problems:
+        print(f"   ⚠️  {problem}")
+    print(f"   ✅ Copied {records} build_ids to {target.path.name}")
+    return not problems
+
+
+def export_to_json():
+    """Regenerate vote_tracker.json from the SQLite database (journal is folded)."""
+    print("📤 Exporting SQLite vote data to JSON...")
+    with SqliteVoteStore(readonly=True) as source:
+        data = source.export_data()
+    with VoteStore() as target:
+        target.import_data(data)
+    print(f"   ✅ Wrote {len(data)} entries to vote_tracker.json")
+    return True
+
+
 def main():
     """Main migration function."""
     print("🚀 MealPrep Vote System Migration")
@@ -135,6 +193,8 @@ def main():
         # Create sample data if needed
         create_sample_data()
         
+        write_schema_version()
+        
         print("=" * 40)
         print("✅ Migration completed successfully!")
         print("\nNext steps:")
@@ -150,5 +210,15 @@ def main():
 
 
 if __name__ == '__main__':
-    success = main()
+    command = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    if command == 'to-sqlite':
+        success = migrate_to_sqlite()
+    elif command == 'export-json':
+        success = export_to_json()
+    elif command is None:
+        success = main()
+    else:
+        print(f"Unknown command: {command}")
+        print("Usage: python migrate_vote_data.py [to-sqlite|export-json]")
+        success = False
     exit(0 if success else 1)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Per-serving nutrition and cost for the whole catalog.
+
+``.github/data/ingredient_reference.json`` gives, per ingredient, nutrients
+and price for ``per`` canonical units (``g``, ``ml`` or ``unidad``), the
+recipe units mapped onto those (``taza`` -> 240 ml, ``kg`` -> 1000 g...) and
+the densities needed to cross dimensions (``g_per_ml``, ``g_per_unit``).
+
+``build`` turns the catalog into a sparse recipes x ingredients matrix (per
+recipe, ``(column, portions per serving)`` pairs) and multiplies it by the
+ingredients x values reference matrix in a single pass over the non-zero
+entries, writing ``.github/data/recipe_nutrition.json``. Shares and bulk
+imports fold new recipes in with ``update_for_recipes`` without touching the
+rest; when the reference table changes (its SHA-256 differs from the one
+recorded in the sidecar) the sidecar is rebuilt.
+
+Ingredients without a reference entry or with a unit that cannot be
+converted are listed per recipe under ``missing`` and count as zero.
+
+Usage:
+  python nutrition.py build
+  python nutrition.py show omelette curry-de-garbanzos [--json]
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from catalog import ROOT, RecipeCatalog
+from ingredient_index import fold_text, load_recipe_details
+from storage import atomic_write_json, read_json
+
+REFERENCE_FILE = ROOT / '.github' / 'data' / 'ingredient_reference.json'
+NUTRITION_FILE = ROOT / '.github' / 'data' / 'recipe_nutrition.json'
+NUTRITION_VERSION = 1
+
+SparseRow = List[Tuple[int, float]]
+
+
+class Reference:
+    """The reference table as a dense ingredients x (nutrients..., price) matrix."""
+
+    def __init__(self, data: dict, digest: str) -> None:
+        self.digest = digest
+        self.currency = data.get('currency', '')
+        self.nutrients: List[str] = list(data['nutrients'])
+        self.units: Dict[str, Tuple[str, float]] = {
+            fold_text(unit): (dim, float(factor)) for unit, (dim, factor) in data['units'].items()}
+        self.entries: List[dict] = []
+        self.values: List[Tuple[float, ...]] = []
+        self.column: Dict[str, int] = {}
+        # (raw name, raw unit) -> (column, portions per unit of quantity), or None
+        self._resolved: Dict[Tuple[str, str], Optional[Tuple[int, float]]] = {}
+        for name, entry in data['ingredients'].items():
+            col = len(self.entries)
+            self.entries.append(entry)
+            self.values.append(tuple(float(entry.get(n) or 0) for n in self.nutrients)
+                               + (float(entry.get('price') or 0),))
+            for key in [name] + list(entry.get('aliases') or ()):
+                self.column.setdefault(fold_text(key), col)
+
+    def _grams_per(self, dim: str, entry: dict) -> Optional[float]:
+        if dim == 'g':
+            return 1.0
+        return entry.get('g_per_ml') if dim == 'ml' else entry.get('g_per_unit')
+
+    def portions(self, col: int, quantity: float, unit: str) -> Optional[float]:
+        """``quantity`` of ``unit`` in multiples of the entry's reference amount."""
+        entry = self.entries[col]
+        source = self.units.get(fold_text(unit))
+        target = self.units.get(fold_text(entry['unit']))
+        if source is None or target is None:
+            return None
+        amount = quantity * source[1]
+        if source[0] != target[0]:
+            source_g = self._grams_per(source[0], entry)
+            target_g = self._grams_per(target[0], entry)
+            if not source_g or not target_g:
+                return None
+            amount = amount * source_g / target_g
+        return amount / (target[1] * float(entry.get('per') or 1))
+
+    def resolve(self, name: str, unit: str) -> Optional[Tuple[int, float]]:
+        """Column and conversion factor for an ingredient as written in a recipe.
+
+        Catalogs repeat the same few hundred (name, unit) pairs, so folding
+        and conversion run once per pair rather than once per ingredient.
+        """
+        key = (name, unit)
+        if key not in self._resolved:
+            col = self.column.get(fold_text(name))
+            factor = self.portions(col, 1.0, unit) if col is not None else None
+            self._resolved[key] = (col, factor) if factor is not None else None
+        return self._resolved[key]
+
+    def recipe_row(self, details: dict) -> Tuple[SparseRow, List[str]]:
+        """Sparse row of (column, portions per serving) and the unmatched ingredient names."""
+        try:
+            servings = float(details.get('servings') or 1) or 1.0
+        except (TypeError, ValueError):
+            servings = 1.0
+        cells: Dict[int, float] = {}
+        missing = []
+        for ing in details.get('ingredients') or []:
+            if not isinstance(ing, dict) or not (ing.get('name') or '').strip():
+                continue
+            resolved = self.resolve(ing['name'], ing.get('unit') or '')
+            try:
+                quantity = float(ing.get('quantity') or 0)
+            except (TypeError, ValueError):
+                resolved = None
+            if resolved is None:
+                missing.append(ing['name'].strip())
+                continue
+            col, factor = resolved
+            cells[col] = cells.get(col, 0.0) + quantity * factor / servings
+        return sorted(cells.items()), missing
+
+    def multiply(self, rows: Iterable[SparseRow]) -> List[List[float]]:
+        """Sparse rows x reference matrix: one (nutrients..., price) vector per row."""
+        values = self.values
+        width = len(self.nutrients) + 1
+        result = []
+        for row in rows:
+            acc = [0.0] * width
+            for col, portions in row:
+                vector = values[col]
+                for j in range(width):
+                    acc[j] += portions * vector[j]
+            result.append(acc)
+        return result
+
+    def summary(self, vector: List[float], missing: List[str]) -> dict:
+        return {
+            'per_serving': {n: round(v, 1) for n, v in zip(self.nutrients, vector)},
+            'cost_per_serving': round(vector[-1], 2),
+            'missing': missing,
+        }
+
+
+def load_reference() -> Optional[Reference]:
+    """The reference table, or None if the file does not exist."""
+    try:
+        raw = REFERENCE_FILE.read_bytes()
+    except FileNotFoundError:
+        return None
+    return Reference(json.loads(raw), hashlib.sha256(raw).hexdigest())
+
+
+def _sidecar(reference: Reference, recipes: Dict[str, dict]) -> dict:
+    return {
+        'version': NUTRITION_VERSION,
+        'reference_sha256': reference.digest,
+        'currency': reference.currency,
+        'nutrients': reference.nutrients,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'recipes': recipes,
+    }
+
+
+def compute(reference: Reference, pairs: Iterable[Tuple[dict, dict]]) -> Dict[str, dict]:
+    """Nutrition summaries for ``(entry, details)`` pairs with one matrix product."""
+    ids, rows, missing = [], [], []
+    for entry, details in pairs:
+        row, unmatched = reference.recipe_row(details)
+        ids.append(entry.get('id'))
+        rows.append(row)
+        missing.append(unmatched)
+    vectors = reference.multiply(rows)
+    return {rid: reference.summary(v, m) for rid, v, m in zip(ids, vectors, missing)}
+
+
+def build_nutrition(catalog: Optional[RecipeCatalog] = None,
+                    reference: Optional[Reference] = None) -> dict:
+    """Compute the sidecar for every recipe in the catalog."""
+    catalog = catalog or RecipeCatalog.load()
+    reference = reference or load_reference()
+    if reference is None:
+        raise FileNotFoundError(REFERENCE_FILE)
+    return _sidecar(reference, compute(reference, ((e, load_recipe_details(e)) for e in catalog)))
+
+
+def load_nutrition() -> Optional[dict]:
+    data = read_json(NUTRITION_FILE, None)
+    if data is None or data.get('version') != NUTRITION_VERSION:
+        return None
+    return data
+
+
+def save_nutrition(data: dict) -> None:
+    atomic_write_json(NUTRITION_FILE, data)
+
+
+def update_for_recipes(pairs: List[Tuple[dict, dict]]) -> None:
+    """Fold new/changed ``(entry, details)`` pairs into the on-disk sidecar, if it exists.
+
+    Only these recipes are computed, unless the reference table changed
+    since the sidecar was built, in which case it is rebuilt first.
+    """
+    data = load_nutrition()
+    reference = load_reference()
+    if data is None or reference is None or not pairs:
+        return
+    if data.get('reference_sha256') != reference.digest:
+        data = build_nutrition(reference=reference)
+    data['recipes'].update(compute(reference, pairs))
+    data['built_at'] = datetime.now(timezone.utc).isoformat()
+    save_nutrition(data)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Nutrition and cost per serving for MealPrep recipes')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build', help='Recompute recipe_nutrition.json for the whole catalog')
+    s = sub.add_parser('show', help='Show nutrition and cost per serving')
+    s.add_argument('recipes', nargs='+')
+    s.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        data = build_nutrition()
+        save_nutrition(data)
+        incomplete = sum(1 for r in data['recipes'].values() if r['missing'])
+        print(f"Computed {len(data['recipes'])} recipes ({incomplete} with unmatched ingredients)")
+        return 0
+
+    data = load_nutrition()
+    if data is None:
+        print("Nutrition file not found; run: python nutrition.py build", file=sys.stderr)
+        return 1
+    found = {rid: data['recipes'][rid] for rid in args.recipes if rid in data['recipes']}
+    if args.json:
+        print(json.dumps(found, ensure_ascii=False, indent=2))
+        return 0 if len(found) == len(args.recipes) else 1
+
+    for rid in args.recipes:
+        info = found.get(rid)
+        if info is None:
+            print(f"⚠️  Receta no encontrada: {rid}")
+            continue
+        values = ', '.join(f"{n}: {v:g}" for n, v in info['per_serving'].items())
+        print(f"🍽️  {rid} (por porción): {values}, costo: {info['cost_per_serving']:g} {data['currency']}")
+        if info['missing']:
+            print(f"   sin datos de referencia: {', '.join(info['missing'])}")
+    return 0 if len(found) == len(args.recipes) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
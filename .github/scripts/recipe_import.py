@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Bulk recipe import from JSONL or CSV.
+
+Onboarding a partner catalog through ``share:`` issues costs one workflow
+run per recipe. This command validates and normalizes every row in a
+process pool (id via ``normalize_id``, ingredient schema, numeric
+quantities, servings), then checks duplicate ids and names against the
+existing index and the rest of the batch in one ordered pass, writes the
+accepted ``recipes/<id>.json`` files and saves ``recipes_index.json`` and
+each derived file (ingredient index, nutrition, neighbors, api views, change
+feed) once.
+
+JSONL rows use the ``share:`` payload shape. CSV files need a header with
+``id``, ``name``, ``author``, ``category``, ``servings``, ``notes`` and
+``ingredients`` columns (only ``name`` is required); ``ingredients`` holds
+either a JSON list or ``nombre|cantidad|unidad|categoría`` items separated
+by ``;``.
+
+Usage:
+  python recipe_import.py partner.jsonl [--workers 4] [--dry-run] [--report report.jsonl]
+  python recipe_import.py partner.csv --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from catalog import ROOT, RecipeCatalog, index_lock, normalize_name
+from intake import normalize_id, publish_changes
+from storage import atomic_write_json
+
+# Below this many rows the pool costs more than it saves
+PARALLEL_THRESHOLD = 200
+
+Row = Tuple[int, object]  # (line number, raw JSON text or CSV dict)
+
+
+def _number(value, field: str) -> float:
+    """Parse a quantity ("1,5" and "2" are accepted); raises ValueError."""
+    if isinstance(value, bool):
+        raise ValueError(f"{field} debe ser numérico")
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = str(value if value is not None else '').strip().replace(',', '.')
+        if not text:
+            return 0.0
+        try:
+            number = float(text)
+        except ValueError:
+            raise ValueError(f"{field} no es un número: {value!r}") from None
+    if number != number or number < 0 or number == float('inf'):
+        raise ValueError(f"{field} debe ser un número positivo: {value!r}")
+    return number
+
+
+def _parse_ingredients(value) -> List[dict]:
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith('['):
+            value = json.loads(text)
+        else:
+            value = []
+            for item in text.split(';'):
+                parts = [p.strip() for p in item.split('|')]
+                if any(parts):
+                    value.append(dict(zip(('name', 'quantity', 'unit', 'category'), parts)))
+    if not isinstance(value, list):
+        raise ValueError("ingredients debe ser una lista")
+    return value
+
+
+def normalize_ingredient(raw, position: int) -> dict:
+    """One ingredient in the stored schema; raises ValueError when invalid."""
+    if isinstance(raw, str):
+        raw = {'name': raw}
+    if not isinstance(raw, dict):
+        raise ValueError(f"ingrediente {position}: formato inválido")
+    name = str(raw.get('name') or '').strip()
+    if not name:
+        raise ValueError(f"ingrediente {position}: falta el nombre")
+    return {
+        'name': name,
+        'unit': str(raw.get('unit') or '').strip(),
+        'quantity': _number(raw.get('quantity'), f"ingrediente {position} ({name}): quantity"),
+        'category': str(raw.get('category') or '').strip(),
+        'notes': str(raw.get('notes') or '').strip(),
+    }
+
+
+def validate_row(row: Row) -> Tuple[int, Optional[dict], Optional[dict], List[str]]:
+    """Validate and normalize one row (runs in the worker processes).
+
+    Returns (line, entry, details, errors); entry and details are None when
+    there are errors. Duplicate checks need the whole batch and are done by
+    the caller.
+    """
+    lineno, raw = row
+    try:
+        payload = json.loads(raw) if isinstance(raw, str) else raw
+    except Exception as e:
+        return lineno, None, None, [f"JSON inválido: {e}"]
+    if not isinstance(payload, dict):
+        return lineno, None, None, ["la fila debe ser un objeto"]
+
+    errors = []
+    name = str(payload.get('name') or '').strip()
+    if not name:
+        errors.append("falta el nombre")
+    rid = normalize_id(str(payload.get('id') or name))
+
+    ingredients = []
+    try:
+        raw_ingredients = _parse_ingredients(payload.get('ingredients'))
+    except Exception as e:
+        errors.append(f"ingredients inválido: {e}")
+        raw_ingredients = []
+    for position, item in enumerate(raw_ingredients, 1):
+        try:
+            ingredients.append(normalize_ingredient(item, position))
+        except ValueError as e:
+            errors.append(str(e))
+
+    try:
+        servings = _number(payload.get('servings') or 1, 'servings')
+        if servings < 1 or servings != int(servings):
+            raise ValueError(f"servings debe ser un entero mayor a 0: {payload.get('servings')!r}")
+        servings = int(servings)
+    except ValueError as e:
+        errors.append(str(e))
+        servings = 1
+    try:
+        likes = int(_number(payload.get('likes') or 0, 'likes'))
+    except ValueError as e:
+        errors.append(str(e))
+        likes = 0
+
+    if errors:
+        return lineno, None, None, errors
+
+    category = str(payload.get('category') or '').strip()
+    entry = {
+        'id': rid,
+        'name': name,
+        'author': str(payload.get('author') or '').strip(),
+        'likes': likes,
+        'category': category,
+        'path': f"recipes/{rid}.json",
+    }
+    details = {
+        'ingredients': ingredients,
+        'notes': str(payload.get('notes') or ''),
+        'servings': servings,
+        'category': category,
+    }
+    return lineno, entry, details, []
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Row]:
+    """Rows of a JSONL or CSV file ('-' reads JSONL from stdin)."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for lineno, line in enumerate(f, 1):
+                if line.strip():
+                    yield lineno, line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def validate_rows(rows: Iterable[Row], workers: Optional[int] = None) -> List[tuple]:
+    """Run ``validate_row`` over every row, in a process pool for large batches."""
+    rows = list(rows)
+    workers = workers or os.cpu_count() or 1
+    with metrics.span('import.validate'):
+        if workers == 1 or len(rows) < PARALLEL_THRESHOLD:
+            return [validate_row(row) for row in rows]
+        chunksize = max(1, len(rows) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(validate_row, rows, chunksize=chunksize))
+
+
+def import_recipes(rows: Iterable[Row], catalog: RecipeCatalog, root: Path = ROOT,
+                   workers: Optional[int] = None, dry_run: bool = False) -> Tuple[List[dict], List[tuple]]:
+    """Validate ``rows`` and add the accepted recipes to ``catalog``.
+
+    Recipe files are written under ``root`` unless ``dry_run``; the caller
+    saves the catalog and publishes it (``intake.publish_changes``). Returns (one report dict per row, accepted
+    ``(entry, details)`` pairs).
+    """
+    report, accepted = [], []
+    batch_ids: Dict[str, int] = {}
+    batch_names: Dict[str, int] = {}
+    now = datetime.now(timezone.utc).isoformat()
+
+    for lineno, entry, details, errors in validate_rows(rows, workers):
+        if not errors:
+            rid, name = entry['id'], entry['name']
+            existing = catalog.get(rid)
+            existing_id = catalog.id_for_name(name)
+            if existing is not None:
+                errors.append(f"ya existe una receta con id '{rid}' (nombre: {existing.get('name', '')})")
+            elif rid in batch_ids:
+                errors.append(f"id '{rid}' repetido en el lote (línea {batch_ids[rid]})")
+            elif existing_id is not None:
+                errors.append(f"ya existe una receta con el mismo nombre: '{name}' (id: {existing_id})")
+            elif normalize_name(name) in batch_names:
+                errors.append(f"nombre '{name}' repetido en el lote (línea {batch_names[normalize_name(name)]})")
+        if errors:
+            report.append({'line': lineno, 'id': entry and entry['id'], 'success': False,
+                           'errors': errors})
+            continue
+
+        batch_ids[entry['id']] = lineno
+        batch_names[normalize_name(entry['name'])] = lineno
+        entry['created_at'] = entry['updated_at'] = now
+        accepted.append((entry, details))
+        report.append({'line': lineno, 'id': entry['id'], 'success': True, 'errors': []})
+
+    if not dry_run:
+        with metrics.span('import.write'):
+            for entry, details in accepted:
+                atomic_write_json(root / entry['path'], details)
+                catalog.upsert(entry)
+                catalog.added.append((entry, details))
+    return report, accepted
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk import recipes from JSONL or CSV')
+    parser.add_argument('source', help="JSONL or CSV file ('-' reads JSONL from stdin)")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='Default: from the file extension')
+    parser.add_argument('--workers', type=int, help='Validation processes (default: CPU count)')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and report without writing')
+    parser.add_argument('--report', help='Write the per-row report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    with index_lock():
+        catalog = RecipeCatalog.load()
+        report, accepted = import_recipes(read_rows(args.source, args.format), catalog,
+                                          workers=args.workers, dry_run=args.dry_run)
+        if accepted and not args.dry_run:
+            catalog.save()
+            publish_changes(catalog)
+
+    lines = (json.dumps(r, ensure_ascii=False) for r in report)
+    if args.report:
+        Path(args.report).write_text(''.join(line + '\n' for line in lines), encoding='utf-8')
+    else:
+        for line in lines:
+            print(line)
+
+    rejected = len(report) - len(accepted)
+    verb = 'Validadas' if args.dry_run else 'Importadas'
+    print(f"{verb} {len(accepted)} de {len(report)} recetas, {rejected} con errores", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(metrics.run(main, 'recipe_import'))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Precomputed "similar recipes" lists.
+
+Similarity is the Jaccard index of the recipes' ingredient sets, taken from
+``ingredient_index.json`` (accent/case-folded names). Each set is a Python
+int bitset over an interned vocabulary, so scoring a pair is one AND plus
+``bit_count()``.
+
+Candidates for a recipe come from the posting lists of its ingredients,
+rarest first, until ``MAX_CANDIDATES`` recipes are collected. Ubiquitous
+ingredients (salt, onion...) therefore never turn a row into a scan of the
+whole catalog, and work and memory stay proportional to
+``recipes x MAX_CANDIDATES`` plus the top-k lists. Recipes that share a rare
+ingredient are always compared; recipes whose ingredients are all very
+common get approximate neighbors.
+
+``build`` writes ``.github/data/recipe_neighbors.json`` (recipe id ->
+``[[neighbor id, score], ...]`` best first), which clients read directly.
+When a recipe is shared, ``update_for_recipes`` computes only its row and
+inserts it into the lists of the candidates it beats.
+
+Usage:
+  python recipe_neighbors.py build [-k 10]
+  python recipe_neighbors.py show omelette
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from catalog import ROOT
+from ingredient_index import load_ingredient_index
+from storage import atomic_write_json, read_json
+
+NEIGHBORS_FILE = ROOT / '.github' / 'data' / 'recipe_neighbors.json'
+NEIGHBORS_VERSION = 1
+TOP_K = 10
+MAX_CANDIDATES = 1000
+BLOCK_SIZE = 2000
+
+Neighbors = List[Tuple[str, float]]
+
+
+class IngredientSets:
+    """Bitset per recipe over the ingredient index vocabulary."""
+
+    def __init__(self, index: dict) -> None:
+        self.postings: Dict[str, List[str]] = index['postings']
+        self.vocabulary = {key: bit for bit, key in enumerate(self.postings)}
+        self.keys: Dict[str, List[str]] = {}
+        self.masks: Dict[str, int] = {}
+        for key, rids in self.postings.items():
+            bit = 1 << self.vocabulary[key]
+            for rid in rids:
+                self.masks[rid] = self.masks.get(rid, 0) | bit
+                self.keys.setdefault(rid, []).append(key)
+        self.sizes = {rid: mask.bit_count() for rid, mask in self.masks.items()}
+
+    def candidates(self, rid: str, limit: int = MAX_CANDIDATES) -> Set[str]:
+        """Recipes sharing an ingredient with ``rid``, from the rarest ingredients on.
+
+        Whole posting lists are added until the next one would exceed
+        ``limit``; a first list that is already too long is truncated.
+        """
+        result: Set[str] = set()
+        for key in sorted(self.keys.get(rid, ()), key=lambda k: len(self.postings[k])):
+            postings = self.postings[key]
+            if len(result) + len(postings) > limit:
+                if not result:
+                    result.update(postings[:limit])
+                break
+            result.update(postings)
+        result.discard(rid)
+        return result
+
+    def _jaccard(self, rid: str) -> Tuple[List[str], List[float]]:
+        mask = self.masks.get(rid, 0)
+        size = self.sizes.get(rid, 0)
+        masks, sizes = self.masks, self.sizes
+        others = list(self.candidates(rid))
+        scores = []
+        for other in others:
+            shared = (mask & masks[other]).bit_count()
+            scores.append(shared / (size + sizes[other] - shared))
+        return others, scores
+
+    def scores(self, rid: str) -> Neighbors:
+        """``(candidate, jaccard)`` for every candidate of ``rid``."""
+        others, scores = self._jaccard(rid)
+        return [(other, round(score, 4)) for other, score in zip(others, scores)]
+
+    def row(self, rid: str, k: int = TOP_K) -> Neighbors:
+        """Top-k ``(neighbor, jaccard)`` pairs for ``rid``, best first."""
+        others, scores = self._jaccard(rid)
+        if not scores:
+            return []
+        # Cheap float cutoff first; only the survivors are ranked with ties by id
+        cutoff = heapq.nlargest(k, scores)[-1]
+        kept = [(other, round(score, 4)) for other, score in zip(others, scores) if score >= cutoff]
+        kept.sort(key=_rank)
+        return kept[:k]
+
+
+def _rank(neighbor) -> tuple:
+    # Best score first, ties by id so builds and incremental updates agree
+    return -neighbor[1], neighbor[0]
+
+
+_worker_sets: Optional[IngredientSets] = None
+
+
+def _init_worker(index: dict) -> None:
+    global _worker_sets
+    _worker_sets = IngredientSets(index)
+
+
+def _rows_for_block(args: Tuple[List[str], int]) -> List[list]:
+    block, k = args
+    return [[list(n) for n in _worker_sets.row(rid, k)] for rid in block]
+
+
+def build_neighbors(index: Optional[dict] = None, k: int = TOP_K,
+                    workers: Optional[int] = None) -> dict:
+    """Compute the top-k lists for every recipe in the ingredient index.
+
+    Rows are computed in blocks of ``BLOCK_SIZE`` recipes, spread over a
+    process pool when the catalog is large enough to pay for it.
+    """
+    index = index or load_ingredient_index()
+    if index is None:
+        raise SystemExit("Ingredient index not found; run: python ingredient_index.py build")
+    rids = list(index['recipes'])
+    blocks = [(rids[i:i + BLOCK_SIZE], k) for i in range(0, len(rids), BLOCK_SIZE)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(blocks) < 2:
+        _init_worker(index)
+        rows = map(_rows_for_block, blocks)
+        neighbors = {rid: row for (block, _), block_rows in zip(blocks, rows)
+                     for rid, row in zip(block, block_rows)}
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(index,)) as pool:
+            neighbors = {rid: row for (block, _), block_rows in zip(blocks, pool.map(_rows_for_block, blocks))
+                         for rid, row in zip(block, block_rows)}
+    return {
+        'version': NEIGHBORS_VERSION,
+        'k': k,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'neighbors': neighbors,
+    }
+
+
+def load_neighbors() -> Optional[dict]:
+    data = read_json(NEIGHBORS_FILE, None)
+    if data is None or data.get('version') != NEIGHBORS_VERSION:
+        return None
+    return data
+
+
+def save_neighbors(data: dict) -> None:
+    atomic_write_json(NEIGHBORS_FILE, data)
+
+
+def _insert(neighbors: list, rid: str, score: float, k: int) -> None:
+    """Put ``rid`` into a best-first list if it makes the top k."""
+    if len(neighbors) >= k and _rank((rid, score)) >= _rank(neighbors[-1]):
+        return
+    neighbors.append([rid, score])
+    neighbors.sort(key=_rank)
+    del neighbors[k:]
+
+
+def add_recipes(data: dict, sets: IngredientSets, rids: List[str]) -> None:
+    """Fold new recipes into ``data``: their rows plus the candidates' lists."""
+    k = data.get('k', TOP_K)
+    neighbors = data['neighbors']
+    for rid in rids:
+        scored = sets.scores(rid)
+        neighbors[rid] = [list(n) for n in heapq.nsmallest(k, scored, key=_rank)]
+        # Every candidate may now rank rid in its own top k
+        for other, score in scored:
+            current = [n for n in neighbors.get(other, ()) if n[0] != rid]
+            _insert(current, rid, score, k)
+            neighbors[other] = current
+    data['built_at'] = datetime.now(timezone.utc).isoformat()
+
+
+def update_for_recipes(rids: List[str], index: Optional[dict] = None) -> None:
+    """Add new recipes to the on-disk neighbors file, if it exists.
+
+    ``index`` is the ingredient index already holding the new recipes.
+    Only their rows and the lists of the recipes they displace are touched.
+    """
+    data = load_neighbors()
+    index = index or load_ingredient_index()
+    if data is None or index is None or not rids:
+        return
+    add_recipes(data, IngredientSets(index), rids)
+    save_neighbors(data)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Similar recipes by shared ingredients')
+    sub = parser.add_subparsers(dest='command', required=True)
+    b = sub.add_parser('build', help='Recompute recipe_neighbors.json for the whole catalog')
+    b.add_argument('-k', type=int, default=TOP_K, help='Neighbors kept per recipe')
+    b.add_argument('--workers', type=int, help='Processes for the full build (default: CPU count)')
+    s = sub.add_parser('show', help='Show the recipes most similar to one recipe')
+    s.add_argument('recipe')
+    s.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        data = build_neighbors(k=args.k, workers=args.workers)
+        save_neighbors(data)
+        print(f"Computed neighbors for {len(data['neighbors'])} recipes (k={data['k']})")
+        return 0
+
+    data = load_neighbors()
+    if data is None:
+        print("Neighbors file not found; run: python recipe_neighbors.py build", file=sys.stderr)
+        return 1
+    row = data['neighbors'].get(args.recipe)
+    if row is None:
+        print(f"⚠️  Receta no encontrada: {args.recipe}")
+        return 1
+    if args.json:
+        print(json.dumps(row, ensure_ascii=False, indent=2))
+        return 0
+    print(f"🍲 Recetas parecidas a {args.recipe}:")
+    for i, (rid, score) in enumerate(row, 1):
+        print(f"{i:2d}. {rid} ({score:.0%} de ingredientes en común)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Weekly shopping list from a meal plan of (recipe_id, servings) pairs.
+
+Only the recipe files named in the plan are read, and parsed recipes are
+cached by file mtime. The plan is first collapsed per recipe, so a catering
+plan with thousands of entries costs one scaling pass per distinct recipe
+rather than one per entry. Quantities are merged by ingredient name
+(accent/case-folded) and unit, and grouped by the ingredient ``category``.
+
+Usage:
+  python shopping_list.py omelette:2 curry-de-garbanzos:4
+  python shopping_list.py --plan plan.json [--json]
+
+``plan.json`` is a list of ``[recipe_id, servings]`` pairs or of
+``{"recipe_id": ..., "servings": ...}`` objects.
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from catalog import ROOT
+from ingredient_index import fold_text
+from storage import read_json
+
+RECIPES_DIR = ROOT / 'recipes'
+UNCATEGORIZED = 'Otros'
+
+# path -> (mtime_ns, servings, [(key, name, unit, category, quantity), ...])
+_RECIPE_CACHE: Dict[str, Tuple[int, float, List[tuple]]] = {}
+
+
+def _load_recipe(recipe_id: str) -> Optional[Tuple[float, List[tuple]]]:
+    """Parsed ingredient rows for a recipe, re-read only when the file changes."""
+    path = RECIPES_DIR / f'{recipe_id}.json'
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _RECIPE_CACHE.get(str(path))
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    details = read_json(path, {}) or {}
+    rows = []
+    for ing in details.get('ingredients') or []:
+        if not isinstance(ing, dict) or not (ing.get('name') or '').strip():
+            continue
+        try:
+            quantity = float(ing.get('quantity') or 0)
+        except (TypeError, ValueError):
+            quantity = 0.0
+        name = ing['name'].strip()
+        unit = (ing.get('unit') or '').strip()
+        rows.append(((fold_text(name), fold_text(unit)), name, unit,
+                     (ing.get('category') or '').strip() or UNCATEGORIZED, quantity))
+    try:
+        servings = float(details.get('servings') or 1) or 1.0
+    except (TypeError, ValueError):
+        servings = 1.0
+
+    _RECIPE_CACHE[str(path)] = (mtime, servings, rows)
+    return servings, rows
+
+
+def build_shopping_list(plan: Iterable[Tuple[str, float]]) -> Dict[str, any]:
+    """Aggregate the ingredients needed for every (recipe_id, servings) pair.
+
+    Returns ``{'categories': {category: [item, ...]}, 'missing': [ids]}``
+    where each item has ``name``, ``unit`` and ``quantity``.
+    """
+    servings_by_recipe: Dict[str, float] = defaultdict(float)
+    for recipe_id, servings in plan:
+        servings_by_recipe[recipe_id] += float(servings)
+
+    totals: Dict[tuple, float] = defaultdict(float)
+    labels: Dict[tuple, tuple] = {}
+    missing = []
+    for recipe_id, servings in servings_by_recipe.items():
+        recipe = _load_recipe(recipe_id)
+        if recipe is None:
+            missing.append(recipe_id)
+            continue
+        base_servings, rows = recipe
+        factor = servings / base_servings
+        for key, name, unit, category, quantity in rows:
+            totals[key] += quantity * factor
+            labels.setdefault(key, (name, unit, category))
+
+    categories: Dict[str, List[dict]] = defaultdict(list)
+    for key, quantity in totals.items():
+        name, unit, category = labels[key]
+        categories[category].append({'name': name, 'unit': unit, 'quantity': round(quantity, 2)})
+    for items in categories.values():
+        items.sort(key=lambda i: (fold_text(i['name']), i['unit']))
+
+    return {
+        'categories': {c: categories[c] for c in sorted(categories, key=fold_text)},
+        'missing': sorted(missing),
+    }
+
+
+def parse_plan_file(path: str) -> List[Tuple[str, float]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    plan = []
+    for item in raw:
+        if isinstance(item, dict):
+            plan.append((item['recipe_id'], item.get('servings', 1)))
+        else:
+            plan.append((item[0], item[1]))
+    return plan
+
+
+def parse_plan_args(items: List[str]) -> List[Tuple[str, float]]:
+    plan = []
+    for item in items:
+        recipe_id, _, servings = item.partition(':')
+        plan.append((recipe_id, float(servings or 1)))
+    return plan
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Build a shopping list from a meal plan')
+    parser.add_argument('recipes', nargs='*', help='recipe_id[:servings] entries')
+    parser.add_argument('--plan', help='JSON file with (recipe_id, servings) pairs')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable output')
+    args = parser.parse_args(argv)
+
+    plan = parse_plan_args(args.recipes)
+    if args.plan:
+        plan.extend(parse_plan_file(args.plan))
+    if not plan:
+        parser.error('the plan is empty')
+
+    result = build_shopping_list(plan)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    print("🛒 Lista de compras")
+    for category, items in result['categories'].items():
+        print(f"\n{category}:")
+        for item in items:
+            print(f"   • {item['name']}: {item['quantity']:g} {item['unit']}")
+    if result['missing']:
+        print(f"\n⚠️  Recetas no encontradas: {', '.join(result['missing'])}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Crash-safe file storage shared by the intake and vote tracking scripts.
+
+Writes go to a temporary file in the same directory, are fsynced and then
+renamed over the live file, so readers only ever see the old or the new
+content. Read-modify-write cycles are serialized across processes with an
+advisory lock on a ``<name>.lock`` sidecar file.
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX runners
+    fcntl = None
+
+# os.umask can only be read by setting it, so read it once at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def repo_root() -> Path:
+    """Repository root the scripts read and write.
+
+    ``MEALPREP_ROOT`` points the scripts at another checkout (e.g. a
+    synthetic benchmark dataset in a temp directory).
+    """
+    override = os.environ.get('MEALPREP_ROOT')
+    return Path(override).resolve() if override else Path(__file__).resolve().parents[2]
+
+
+class StorageError(Exception):
+    """Raised when a data file exists but cannot be parsed."""
+
+
+def read_json(path: Path, default):
+    """Load JSON from ``path``.
+
+    Returns ``default`` when the file does not exist. A file that exists but
+    does not parse raises ``StorageError`` instead of silently returning empty
+    data that a later save would write over the real content.
+    """
+    if not path.exists():
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            metrics.count('bytes_read', os.fstat(f.fileno()).st_size)
+            return json.load(f)
+    except ValueError as e:
+        raise StorageError(f"{path} is corrupt: {e}") from e
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Replace ``path`` with ``text`` via temp file, fsync and rename."""
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def _file_mode(path: Path) -> int:
+    # mkstemp creates 0600 files; keep the live file's mode, or what open() would give a new one
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Replace ``path`` with ``data`` via temp file, fsync and rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    metrics.count('bytes_written', len(data))
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        with metrics.span('fs.write'), os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, _file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_dir(path.parent)
+
+
+def atomic_write_json(path: Path, data) -> bytes:
+    """Serialize ``data`` the way the repo stores it and write it atomically.
+
+    Returns the bytes written.
+    """
+    with metrics.span('json.encode'):
+        encoded = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    atomic_write_bytes(path, encoded)
+    return encoded
+
+
+def append_text(path: Path, text: str) -> None:
+    """Append ``text`` to ``path`` and fsync before returning."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = text.encode('utf-8')
+    metrics.count('bytes_written', len(data))
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(directory: Path) -> None:
+    # Persist the rename itself; not supported everywhere
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False):
+    """Hold an advisory lock guarding ``path`` for the duration of the block.
+
+    Exclusive by default; ``shared=True`` allows concurrent readers. Without
+    ``fcntl`` (non-POSIX) this is a no-op.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_path = path.with_name(path.name + '.lock')
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
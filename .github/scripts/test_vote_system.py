@@ -4,16 +4,74 @@ Test script for the MealPrep vote tracking system.
 This script simulates various voting scenarios to ensure the system works correctly.
 """
 
+import asyncio
 import json
+import os
 import sys
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from io import StringIO
+from multiprocessing import Pool
 from pathlib import Path
+import api_build
+import binary_snapshot
+import catalog
+import change_feed
+import ingredient_index
+import intake
+import intake_server
+import meal_planner
+import migrate_vote_data
+import stat
+import subprocess
+import nutrition
+import recipe_import
+import recipe_neighbors
+import shopping_list
+import vote_tracker
+from catalog import RecipeCatalog
+from commit_writer import CommitWriter, PushError
+from storage import atomic_write_bytes
+from vote_aggregates import DAY_SECONDS, CoVotes, ExpiryIndex, parse_timestamp
 from vote_tracker import (
+    VOTE_TRACKER_FILE,
+    SqliteVoteStore,
+    VoteStore,
+    load_vote_tracker,
+    load_vote_journal,
     has_build_id_voted, 
     record_build_id_vote, 
     get_build_id_stats,
     cleanup_old_votes
 )
 
+
+@contextmanager
+def temp_data_root():
+    """Point the scripts' data files at an empty ``MEALPREP_ROOT`` for the block."""
+    old_root = vote_tracker.ROOT
+    modules = (vote_tracker, migrate_vote_data, catalog, intake, api_build, change_feed,
+               ingredient_index, nutrition, recipe_neighbors, shopping_list)
+    saved = {(module, name): value for module in modules
+             for name, value in vars(module).items()
+             if isinstance(value, Path) and value.is_relative_to(old_root)}
+    saved_env = os.environ.get('MEALPREP_ROOT')
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp).resolve()
+        (root / '.github' / 'data').mkdir(parents=True)
+        os.environ['MEALPREP_ROOT'] = str(root)
+        for (module, name), value in saved.items():
+            setattr(module, name, root / value.relative_to(old_root))
+        try:
+            yield root
+        finally:
+            for (module, name), value in saved.items():
+                setattr(module, name, value)
+            if saved_env is None:
+                os.environ.pop('MEALPREP_ROOT', None)
+            else:
+                os.environ['MEALPREP_ROOT'] = saved_env
+
 def test_basic_voting():
     """Test basic voting functionality."""
     print("🧪 Testing basic voting functionality...")
@@ -127,6 +185,871 @@ def test_edge_cases():
     print("✅ Edge cases tests passed!\n")
 
 
+def test_vote_store_session():
+    """Test that a VoteStore session batches reads and writes."""
+    print("🧪 Testing VoteStore session...")
+    
+    build_id = "session-test-build"
+    
+    with VoteStore() as store:
+        assert not store.dirty, "A fresh session should not be dirty"
+        assert not store.has_voted(build_id, "session-recipe-1"), "Build ID should not have voted initially"
+        store.record_vote(build_id, "session-recipe-1", "Session Recipe 1")
+        store.record_vote(build_id, "session-recipe-2", "Session Recipe 2")
+        store.record_vote(build_id, "session-recipe-1", "Session Recipe 1")
+        assert store.dirty, "Recording votes should mark the session dirty"
+        assert store.has_voted(build_id, "session-recipe-2"), "Votes should be visible inside the session"
+    print("   ✅ Votes visible inside the session")
+    
+    stats = get_build_id_stats(build_id)
+    assert stats['voted_recipes'] == ["session-recipe-1", "session-recipe-2"], "Votes should be flushed in order"
+    assert stats['total_votes'] == 2, "Repeated votes should not be counted twice"
+    print("   ✅ Session flushed once on exit")
+    print("✅ VoteStore session tests passed!\n")
+
+
+def test_recipe_voter_index():
+    """Test the recipe -> voters reverse index."""
+    print("🧪 Testing recipe voter index...")
+    
+    recipe_id = "index-test-recipe"
+    
+    with VoteStore() as store:
+        before = store.recipe_vote_stats(recipe_id)['unique_voters']
+        store.record_vote("index-build-1", recipe_id, "Index Recipe")
+        store.record_vote("index-build-2", recipe_id, "Index Recipe")
+        store.record_vote("index-build-2", recipe_id, "Index Recipe")
+        assert store.recipe_vote_stats(recipe_id)['unique_voters'] == before + 2, "Each build_id counts once"
+        assert store.verify_index() == [], "Index should match the tracker after recording"
+    print("   ✅ Unique voters counted from the index")
+    
+    store = VoteStore()
+    store.load()
+    assert store.verify_index() == [], "Index should match the tracker after reloading"
+    assert {"index-build-1", "index-build-2"} <= store.recipe_voters(recipe_id), "Voters should survive a reload"
+    print("   ✅ Index consistent after reload")
+    print("✅ Recipe voter index tests passed!\n")
+
+
+def test_vote_journal():
+    """Test that votes go to the journal and compaction folds them in."""
+    print("🧪 Testing vote journal...")
+    
+    build_id = "journal-test-build"
+    recipe_id = "journal-test-recipe"
+    
+    record_build_id_vote(build_id, recipe_id, "Journal Recipe")
+    journal = load_vote_journal()
+    assert any(e['build_id'] == build_id and e['recipe_id'] == recipe_id for e in journal), "Vote should be journaled"
+    assert has_build_id_voted(build_id, recipe_id), "Readers should see journaled votes"
+    assert get_build_id_stats(build_id)['total_votes'] == 1, "Stats should include journaled votes"
+    print("   ✅ Journaled vote visible to readers")
+    
+    with VoteStore() as store:
+        folded = store.compact()
+    assert folded >= 1, "Compaction should fold the journaled vote"
+    assert load_vote_journal() == [], "Journal should be empty after compaction"
+    assert recipe_id in load_vote_tracker()[build_id]['voted_recipes'], "Snapshot should contain the vote"
+    assert has_build_id_voted(build_id, recipe_id), "Vote should survive compaction"
+    print("   ✅ Compaction folded the journal into the snapshot")
+    print("✅ Vote journal tests passed!\n")
+
+
+def _record_votes_worker(worker: int) -> None:
+    for i in range(10):
+        record_build_id_vote(f"concurrent-build-{worker}-{i}", "concurrent-recipe", "Concurrent Recipe")
+
+
+def test_atomic_write_mode():
+    """Test that atomic writes keep the file mode instead of mkstemp's 0600."""
+    print("🧪 Testing atomic write permissions...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'data.json'
+        atomic_write_bytes(path, b'{}')
+        umask = os.umask(0)
+        os.umask(umask)
+        assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~umask, "New files should follow the umask"
+        os.chmod(path, 0o640)
+        atomic_write_bytes(path, b'[]')
+        assert stat.S_IMODE(path.stat().st_mode) == 0o640, "Rewrites should keep the existing mode"
+        assert path.read_bytes() == b'[]', "Content should be replaced"
+    print("   ✅ New files follow the umask and rewrites keep their mode")
+    print("✅ Atomic write permission tests passed!\n")
+
+
+def test_concurrent_writers():
+    """Test that parallel writers do not lose each other's votes."""
+    print("🧪 Testing concurrent writers...")
+    
+    with Pool(4) as pool:
+        pool.map(_record_votes_worker, range(4))
+    
+    for worker in range(4):
+        for i in range(10):
+            assert has_build_id_voted(f"concurrent-build-{worker}-{i}", "concurrent-recipe"), "No vote should be lost"
+    print("   ✅ 40 votes from 4 processes all recorded")
+    print("✅ Concurrent writers tests passed!\n")
+
+
+def test_binary_snapshot():
+    """Test that the binary snapshot reproduces the JSON tracker exactly."""
+    print("🧪 Testing binary snapshot...")
+    
+    with VoteStore() as store:
+        store.record_vote("snapshot-test-build", "snapshot-recipe", "Snapshot Recipe")
+        store.compact()
+    
+    source_bytes = VOTE_TRACKER_FILE.read_bytes()
+    decoded = binary_snapshot.read_snapshot(VOTE_TRACKER_FILE, binary_snapshot.KIND_TRACKER, source_bytes)
+    assert decoded is not None, "Saving the tracker should refresh its snapshot"
+    assert decoded == json.loads(source_bytes), "Snapshot should decode to the JSON content"
+    assert list(decoded) == list(json.loads(source_bytes)), "Snapshot should keep build_id order"
+    print("   ✅ Snapshot matches the JSON source")
+    
+    stale = source_bytes + b" "
+    assert binary_snapshot.read_snapshot(VOTE_TRACKER_FILE, binary_snapshot.KIND_TRACKER, stale) is None, \
+        "A snapshot of different source bytes must be ignored"
+    print("   ✅ Stale snapshot ignored")
+    print("✅ Binary snapshot tests passed!\n")
+
+
+def test_sqlite_backend():
+    """Test that the SQLite backend matches the JSON tracker round-trip."""
+    print("🧪 Testing SQLite backend...")
+    
+    with VoteStore() as store:
+        store.record_vote("sqlite-test-build", "sqlite-recipe", "SQLite Recipe")
+    with VoteStore(readonly=True) as store:
+        data = store.export_data()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / 'votes.db'
+        with SqliteVoteStore(path=db) as store:
+            store.import_data(data)
+        with SqliteVoteStore(readonly=True, path=db) as store:
+            assert store.export_data() == data, "Export should reproduce the imported tracker"
+            assert list(store.export_data()) == list(data), "Export should keep build_id order"
+            assert store.has_voted("sqlite-test-build", "sqlite-recipe"), "Imported vote should be found"
+            assert store.verify_index() == [], "Imported data should be consistent"
+        print("   ✅ JSON -> SQLite -> JSON round-trip is exact")
+        
+        with SqliteVoteStore(path=db) as store:
+            store.record_vote("sqlite-new-build", "sqlite-recipe")
+            store.record_vote("sqlite-new-build", "sqlite-recipe")
+            store.record_vote("sqlite-new-build", "sqlite-other")
+            stats = store.get_build_stats("sqlite-new-build")
+            assert stats['voted_recipes'] == ["sqlite-recipe", "sqlite-other"], "Duplicate vote should be ignored"
+            assert stats['total_votes'] == 2, "Should count two distinct votes"
+            assert store.recipe_vote_stats("sqlite-recipe")['unique_voters'] == 2, "Should count both voters"
+            assert store.recipe_vote_counts()["sqlite-other"] == 1, "GROUP BY counts should include new recipe"
+            records = sum(1 for _ in store.iter_records())
+            assert store.cleanup(days_threshold=-1) == records, "A negative threshold should expire every vote record"
+            assert not store.has_voted("sqlite-new-build", "sqlite-recipe"), "Expired votes should be deleted"
+            assert "metadata" in store.export_data(), "Non-vote entries survive cleanup"
+            assert store.rebuild_aggregates() == [], "SQLite aggregates should match a rebuild"
+        print("   ✅ Indexed votes, duplicates and range cleanup work")
+    print("✅ SQLite backend tests passed!\n")
+
+
+def test_vote_aggregates():
+    """Test that incrementally maintained aggregates match a full rebuild."""
+    print("🧪 Testing vote aggregates...")
+    
+    with temp_data_root():
+        with VoteStore() as store:
+            store.record_vote("aggregate-build-0", "aggregate-recipe-0")
+            store.compact()
+        stored = vote_tracker.VOTE_AGGREGATES_FILE.read_bytes()
+        with VoteStore() as store:
+            for i in range(1, 12):
+                store.record_vote(f"aggregate-build-{i % 4}", f"aggregate-recipe-{i % 3}")
+            assert store.aggregates.top_voters()[0][0] >= 3, "Top voter should have at least 3 votes"
+        assert vote_tracker.VOTE_AGGREGATES_FILE.read_bytes() == stored, "A vote should only append to the journal"
+        with VoteStore() as store:
+            problems = store.rebuild_aggregates()
+            assert problems == [], f"Checkpoint plus journal should match the rebuild: {problems}"
+            assert store.aggregates.recent_voters()[0][1].startswith("aggregate-build-"), \
+                "Most recent voter should come first"
+        assert load_vote_journal() == [], "An explicit rebuild should checkpoint the aggregates"
+        print("   ✅ Votes keep totals, heaps and recent ring in sync without rewriting them")
+        
+        with VoteStore() as store:
+            store.cleanup(days_threshold=-1)
+            assert store.aggregates.total_build_ids == 0, "Cleanup should remove every build_id"
+            assert store.rebuild_aggregates() == [], "Aggregates should stay in sync after cleanup"
+        assert json.loads(vote_tracker.VOTE_AGGREGATES_FILE.read_text(encoding='utf-8'))['total_votes'] == 0, \
+            "Cleanup should checkpoint the aggregates"
+    print("   ✅ Cleanup keeps aggregates in sync")
+    print("✅ Vote aggregates tests passed!\n")
+
+
+def test_expiry_index():
+    """Test that cleanup only pops the expiry buckets that are due."""
+    print("🧪 Testing expiry index...")
+    
+    index = ExpiryIndex.rebuild([
+        ("old-build", {'first_vote_at': '2024-01-01T10:00:00+00:00'}),
+        ("edge-build", {'first_vote_at': '2024-01-05T08:00:00+00:00'}),
+        ("new-build", {'first_vote_at': '2024-01-05T20:00:00+00:00'}),
+        ("bad-build", {'first_vote_at': 'not-a-date'}),
+    ])
+    cutoff_epoch = int(parse_timestamp('2024-01-05T12:00:00+00:00'))
+    assert index.pop_expired(cutoff_epoch - 10 * DAY_SECONDS) == [], "Nothing should be due yet"
+    assert sorted(index.pop_expired(cutoff_epoch)) == ["edge-build", "old-build"], \
+        "Whole old days and earlier entries of the cutoff day should expire"
+    assert len(index) == 2, "Later entries and unparseable dates should be kept"
+    print("   ✅ Day buckets expire by epoch")
+    
+    with temp_data_root():
+        with VoteStore() as store:
+            store.record_vote("expiry-old-build", "expiry-recipe")
+            store.compact()
+        stored = vote_tracker.VOTE_EXPIRY_FILE.read_bytes()
+        with VoteStore() as store:
+            store.record_vote("expiry-test-build", "expiry-recipe")
+        assert vote_tracker.VOTE_EXPIRY_FILE.read_bytes() == stored, "A new voter should only append to the journal"
+        with VoteStore() as store:
+            assert store.cleanup() == 0, "Fresh votes should not expire with the configured threshold"
+            assert len(store.expiry) == store.aggregates.total_build_ids == 2, \
+                "Build_ids from the journal should be indexed on load"
+            assert store.cleanup(days_threshold=-1) == 2, "Journaled build_ids should expire too"
+    print("   ✅ Cleanup with the configured threshold keeps fresh votes")
+    print("✅ Expiry index tests passed!\n")
+
+
+def test_fast_start():
+    """Test the schema stamp check and the lazily built tracker indexes."""
+    print("🧪 Testing fast-start intake...")
+    
+    with temp_data_root():
+        migrate_vote_data.write_schema_version()
+        assert not migrate_vote_data.ensure_schema(), "A current stamp should skip the migration"
+        migrate_vote_data.SCHEMA_FILE.write_text('{"schema_version": 0}', encoding='utf-8')
+        assert migrate_vote_data.ensure_schema(), "An outdated stamp should run the migration"
+        assert migrate_vote_data.current_schema_version() == migrate_vote_data.SCHEMA_VERSION, \
+            "The migration should refresh the stamp"
+        assert 'metadata' in load_vote_tracker(), "The migration should initialize the tracker"
+        print("   ✅ Migration only runs when the schema version changes")
+        
+        with VoteStore() as store:
+            store.record_vote("lazy-build", "lazy-recipe")
+        store = VoteStore()
+        store.load()
+        assert store.has_voted("lazy-build", "lazy-recipe"), "Duplicate check should work without full indexes"
+        assert store._voters is None, "A duplicate check should not build the recipe -> voters index"
+        assert "lazy-build" in store.recipe_voters("lazy-recipe"), "Voter index should build on first use"
+        assert store.verify_index() == [], "Lazy indexes should match the tracker"
+    print("   ✅ Tracker indexes are built on demand")
+    print("✅ Fast-start tests passed!\n")
+
+
+def test_recipe_catalog():
+    """Test id/name lookups and in-place upserts of the hash-indexed catalog."""
+    print("🧪 Testing recipe catalog...")
+    
+    data = {'recipes': [
+        {'id': 'omelette', 'name': 'Omelette', 'likes': 3, 'path': 'recipes/omelette.json', 'created_at': '2024-01-01'},
+        {'id': 'flan', 'name': 'Flan', 'likes': 5, 'path': 'recipes/flan.json'},
+        {'id': 'omelette', 'name': 'Omelette duplicado', 'likes': 0},
+    ]}
+    recipes = RecipeCatalog(data)
+    assert recipes.get('omelette')['likes'] == 3, "The first entry with an id should win"
+    assert 'flan' in recipes and recipes.get('guiso') is None and 'guiso' not in recipes
+    assert recipes.id_for_name('  OMELETTE ') == 'omelette', "Name lookups ignore case and spacing"
+    assert recipes.id_for_name('') is None
+    
+    recipes.upsert({'id': 'omelette', 'name': 'Tortilla francesa', 'likes': 4, 'path': 'recipes/omelette.json'})
+    assert data['recipes'][0]['name'] == 'Tortilla francesa', "Upserts replace the entry in place"
+    assert data['recipes'][0]['created_at'] == '2024-01-01', "Upserts keep the original created_at"
+    assert recipes.id_for_name('tortilla francesa') == 'omelette' and recipes.id_for_name('Omelette') is None, \
+        "A renamed recipe is found by its new name only"
+    recipes.upsert({'id': 'guiso', 'name': 'Guiso', 'likes': 0, 'path': 'recipes/guiso.json'})
+    assert [e['id'] for e in data['recipes']] == ['omelette', 'flan', 'omelette', 'guiso'], "New recipes are appended"
+    assert recipes.changes == [('update', 'omelette'), ('add', 'guiso')], f"Unexpected changes: {recipes.changes}"
+    assert recipes.before['omelette']['name'] == 'Omelette' and recipes.before['guiso'] is None, \
+        "before keeps each entry as it was loaded"
+    print("   ✅ Id and name lookups, in-place updates and appends")
+    
+    with temp_data_root():
+        recipes.save()
+        assert json.loads(catalog.INDEX.read_text(encoding='utf-8')) == data, "Saving keeps the index format and order"
+        assert [e['id'] for e in RecipeCatalog.load()] == ['omelette', 'flan', 'omelette', 'guiso']
+    print("   ✅ The saved index keeps the list format")
+    print("✅ Recipe catalog tests passed!\n")
+
+
+def _issue_event(title: str, label: str, payload: dict) -> str:
+    return json.dumps({'action': 'opened', 'issue': {
+        'title': title, 'number': 1, 'labels': [{'name': label}],
+        'body': f"```json\n{json.dumps(payload)}\n```"}})
+
+
+def test_batch_intake():
+    """Test that a backlog of issue events is applied in order with one save and one push."""
+    print("🧪 Testing batch intake...")
+    
+    events = [
+        _issue_event('vote: tarta', 'vote', {'id': 'tarta', 'build_id': 'batch-1'}),
+        _issue_event('share: guiso', 'recipe', {'name': 'Guiso', 'category': 'Platos',
+                                                'ingredients': [{'name': 'Lentejas'}]}),
+        '{not json',
+        _issue_event('vote: guiso', 'vote', {'id': 'guiso', 'build_id': 'batch-1'}),
+        _issue_event('vote: tarta', 'vote', {'id': 'tarta', 'build_id': 'batch-1'}),
+        _issue_event('share: tarta', 'recipe', {'name': ' TARTA', 'id': 'otra-tarta'}),
+        '',
+        _issue_event('vote: sopa', 'vote', {'id': 'sopa', 'build_id': 'batch-2'}),
+    ]
+    saves, pushes = [], []
+    original_save, original_push = RecipeCatalog.save, intake.commit_and_push
+    RecipeCatalog.save = lambda self: (saves.append(len(self)), original_save(self))
+    intake.commit_and_push = lambda lines, message: pushes.append(lines)
+    try:
+        with temp_data_root() as tmp:
+            (tmp / 'recipes_index.json').write_text(json.dumps({'recipes': [
+                {'id': 'tarta', 'name': 'Tarta', 'likes': 2, 'path': 'recipes/tarta.json'}]}), encoding='utf-8')
+            (tmp / 'events.jsonl').write_text('\n'.join(events) + '\n', encoding='utf-8')
+            out = StringIO()
+            with redirect_stdout(out):
+                intake.main_batch(str(tmp / 'events.jsonl'))
+            results = [json.loads(l) for l in out.getvalue().splitlines() if l.startswith('{')]
+            recipes = RecipeCatalog.load()
+            tarta, guiso = recipes.get('tarta'), recipes.get('guiso')
+            assert has_build_id_voted('batch-1', 'guiso') and not has_build_id_voted('batch-2', 'sopa')
+            assert (tmp / 'recipes' / 'guiso.json').exists(), "Shared recipes are written"
+    finally:
+        RecipeCatalog.save, intake.commit_and_push = original_save, original_push
+    
+    assert [r['line'] for r in results] == [1, 2, 3, 4, 5, 6, 8], "Blank lines are skipped"
+    assert [r['success'] for r in results] == [True, True, False, True, False, False, False], \
+        f"Unexpected results: {results}"
+    assert "Evento inválido" in results[2]['message'], "A bad line is reported without stopping the batch"
+    assert "Ya has votado" in results[4]['message'] and "mismo nombre" in results[5]['message'], \
+        "Duplicate votes and names are rejected as in a single run"
+    assert tarta['likes'] == 3 and guiso['likes'] == 1, "A vote sees the recipe shared earlier in the batch"
+    assert saves == [2], f"The index should be saved once: {saves}"
+    assert pushes == [[events[0] + '\n', events[1] + '\n', events[3] + '\n']], "Accepted events are pushed once, in order"
+    print("   ✅ Events applied in order, bad and duplicate events isolated")
+    print("   ✅ One index save and one push for the whole batch")
+    print("✅ Batch intake tests passed!\n")
+
+
+def test_recipe_import():
+    """Test bulk import validation, duplicate detection and file writes."""
+    print("🧪 Testing bulk recipe import...")
+    
+    catalog = RecipeCatalog({'recipes': [{'id': 'existing', 'name': 'Existente', 'path': 'recipes/existing.json'}]})
+    rows = [(i, json.dumps({'name': f'Importada {i}', 'servings': 2,
+                            'ingredients': [{'name': 'Huevo', 'quantity': '1,5', 'unit': 'unidad'}]}))
+            for i in range(1, 251)]
+    rows += [
+        (251, json.dumps({'name': 'importada 3'})),
+        (252, json.dumps({'id': 'existing', 'name': 'Otra'})),
+        (253, {'name': 'Desde CSV', 'servings': '4', 'ingredients': 'Harina|200|g;Leche|x|ml'}),
+        (254, '{not json'),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        report, accepted = recipe_import.import_recipes(rows, catalog, root=Path(tmp), workers=2)
+        assert len(accepted) == 250 and len(catalog) == 251, "Valid rows should be added to the catalog"
+        details = json.loads((Path(tmp) / 'recipes' / 'importada-1.json').read_text(encoding='utf-8'))
+        assert details['ingredients'][0]['quantity'] == 1.5, "Quantities should be normalized to numbers"
+    failed = {r['line']: r['errors'] for r in report if not r['success']}
+    assert sorted(failed) == [251, 252, 253, 254], f"Unexpected rejected rows: {failed}"
+    assert "repetido en el lote" in failed[251][0], "Case-insensitive duplicate names in the batch are rejected"
+    assert "ya existe" in failed[252][0], "Ids already in the index are rejected"
+    assert "no es un número" in failed[253][0], "Non-numeric quantities are rejected"
+    print("   ✅ Rows validated in parallel, duplicates and bad rows reported")
+    print("✅ Bulk recipe import tests passed!\n")
+
+
+def test_nutrition():
+    """Test unit conversion and the per-serving nutrition/cost product."""
+    print("🧪 Testing nutrition and cost...")
+    
+    reference = nutrition.Reference({
+        'currency': 'ARS',
+        'nutrients': ['kcal'],
+        'units': {'g': ['g', 1], 'kg': ['g', 1000], 'ml': ['ml', 1], 'taza': ['ml', 240], 'unidad': ['unidad', 1]},
+        'ingredients': {
+            'Harina': {'unit': 'g', 'per': 100, 'kcal': 364, 'price': 90, 'g_per_ml': 0.5},
+            'Huevo': {'unit': 'unidad', 'per': 1, 'kcal': 72, 'price': 150, 'g_per_unit': 50},
+        },
+    }, digest='test')
+    details = {'servings': 2, 'ingredients': [
+        {'name': 'harina', 'unit': 'taza', 'quantity': 1},   # 240 ml * 0.5 g/ml = 120 g
+        {'name': 'Huevo', 'unit': 'g', 'quantity': 100},     # 100 g / 50 g = 2 huevos
+        {'name': 'Azafrán', 'unit': 'g', 'quantity': 1},
+    ]}
+    result = nutrition.compute(reference, [({'id': 'test'}, details)])['test']
+    assert result['per_serving']['kcal'] == round((1.2 * 364 + 2 * 72) / 2, 1), f"Unexpected kcal: {result}"
+    assert result['cost_per_serving'] == round((1.2 * 90 + 2 * 150) / 2, 2), f"Unexpected cost: {result}"
+    assert result['missing'] == ['Azafrán'], "Ingredients without reference data should be reported"
+    print("   ✅ Units converted across mass, volume and count")
+    print("✅ Nutrition tests passed!\n")
+
+
+def test_ingredient_index():
+    """Test pantry queries and that incremental updates match a full build."""
+    print("🧪 Testing ingredient index...")
+    
+    details = {
+        'tortilla': {'category': 'Platos', 'ingredients': [{'name': 'Papa'}, {'name': 'Huevo'}, {'name': 'Cebolla'}]},
+        'omelette': {'category': 'Platos', 'ingredients': [{'name': 'huevo'}, {'name': 'Queso'}, {'name': 'Huevo '}]},
+        'flan': {'category': 'Postres', 'ingredients': [{'name': 'Huevo'}, {'name': 'Leche'}, {'name': 'Azúcar'}]},
+        'pure': {'category': 'Platos', 'ingredients': [{'name': 'Papa'}, {'name': 'Manteca'}, {'name': 'Leche'}]},
+    }
+    entries = [{'id': rid, 'name': rid.capitalize()} for rid in ['tortilla', 'omelette', 'flan', 'pure']]
+    
+    index = ingredient_index.empty_index()
+    for entry in reversed(entries):
+        ingredient_index.add_recipe(index, entry, details[entry['id']])
+    assert index['postings']['huevo'] == ['flan', 'omelette', 'tortilla'], "Postings should stay sorted and deduped"
+    
+    results = ingredient_index.query(index, ['huevo', 'LECHE', 'azucar'])
+    assert [r['id'] for r in results] == ['flan', 'omelette', 'pure', 'tortilla'], f"Unexpected ranking: {results}"
+    assert results[0]['covered'] == 3 and results[0]['missing'] == [], "Flan uses the whole pantry"
+    results = ingredient_index.query(index, ['huevo', 'papa'], category='platos', max_missing=1)
+    assert [r['id'] for r in results] == ['tortilla', 'omelette'], f"Category and max_missing should filter: {results}"
+    print("   ✅ Pantry query ranks by coverage and filters by category and missing count")
+    
+    ingredient_index.add_recipe(index, entries[1], {'category': 'Platos', 'ingredients': [{'name': 'Queso'}]})
+    assert index['postings']['huevo'] == ['flan', 'tortilla'], "Replacing a recipe drops its old ingredients"
+    ingredient_index.remove_recipe(index, 'omelette')
+    assert 'queso' not in index['postings'], "Empty posting lists are dropped"
+    
+    original = ingredient_index.load_recipe_details
+    ingredient_index.load_recipe_details = lambda entry: details[entry['id']]
+    try:
+        full = ingredient_index.build_index(RecipeCatalog({'recipes': [e for e in entries if e['id'] != 'omelette']}))
+    finally:
+        ingredient_index.load_recipe_details = original
+    assert full['postings'] == index['postings'] and full['recipes'] == index['recipes'], "Incremental index should match a full build"
+    print("   ✅ Incremental updates match a full build")
+    print("✅ Ingredient index tests passed!\n")
+
+
+def test_shopping_list():
+    """Test scaling, merging and category grouping of the shopping list."""
+    print("🧪 Testing shopping list...")
+    
+    with temp_data_root() as tmp:
+        recipes = tmp / 'recipes'
+        recipes.mkdir()
+        def write(rid, details):
+            (recipes / f'{rid}.json').write_text(json.dumps(details), encoding='utf-8')
+        write('tortilla', {'servings': 2, 'ingredients': [
+            {'name': 'Huevo', 'unit': 'unidad', 'quantity': 4, 'category': 'Frescos'},
+            {'name': 'Papa', 'unit': 'g', 'quantity': 500, 'category': 'Verdulería'},
+            {'name': 'Aceite', 'unit': 'ml', 'quantity': 50, 'category': 'Aceites/Condimentos'},
+        ]})
+        write('flan', {'servings': 4, 'ingredients': [
+            {'name': 'huevo ', 'unit': 'Unidad', 'quantity': 6, 'category': 'Frescos'},
+            {'name': 'Leche', 'unit': 'ml', 'quantity': 500, 'category': 'Frescos'},
+            {'name': 'Aceite', 'unit': 'cda', 'quantity': 1},
+        ]})
+        shopping_list._RECIPE_CACHE.clear()
+        result = shopping_list.build_shopping_list([('tortilla', 2), ('flan', 2), ('tortilla', 2), ('sopa', 1)])
+        assert result['missing'] == ['sopa'], "Unknown recipes are reported"
+        assert list(result['categories']) == ['Aceites/Condimentos', 'Frescos', 'Otros', 'Verdulería'], \
+            f"Unexpected categories: {list(result['categories'])}"
+        assert result['categories']['Frescos'] == [
+            {'name': 'Huevo', 'unit': 'unidad', 'quantity': 11.0},
+            {'name': 'Leche', 'unit': 'ml', 'quantity': 250.0},
+        ], "Repeated recipes add up and names/units merge ignoring case"
+        assert result['categories']['Otros'] == [{'name': 'Aceite', 'unit': 'cda', 'quantity': 0.5}], \
+            "Different units are kept apart"
+        print("   ✅ Quantities scaled by servings, merged and grouped by category")
+        
+        path = recipes / 'flan.json'
+        mtime = path.stat().st_mtime_ns
+        write('flan', {'servings': 4, 'ingredients': [{'name': 'Leche', 'unit': 'ml', 'quantity': 1000}]})
+        os.utime(path, ns=(mtime, mtime))
+        cached = shopping_list.build_shopping_list([('flan', 4)])
+        assert cached['categories']['Frescos'][1]['quantity'] == 500.0, "An unchanged mtime reuses the cache"
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+        fresh = shopping_list.build_shopping_list([('flan', 4)])
+        assert fresh['categories'] == {'Otros': [{'name': 'Leche', 'unit': 'ml', 'quantity': 1000.0}]}, \
+            "A modified recipe file is read again"
+        shopping_list._RECIPE_CACHE.clear()
+    print("   ✅ Recipe files cached by mtime")
+    print("✅ Shopping list tests passed!\n")
+
+
+def test_meal_planner():
+    """Test that the planner trades likes for overlap and respects the constraints."""
+    print("🧪 Testing meal planner...")
+    
+    data = meal_planner.PlannerData()
+    data.add('pollo-arroz', 'Pollo con arroz', 'Platos', 10, ['Pollo', 'Arroz', 'Cebolla'])
+    data.add('pollo-wok', 'Wok de pollo', 'Platos', 9, ['pollo', 'arroz', 'Pimiento'])
+    data.add('flan', 'Flan', 'Postres', 10, ['Huevo', 'Leche', 'Azúcar'])
+    data.add('caldo', 'Caldo', 'Platos', 1, ['Pollo'])
+    names = lambda plan: sorted(data.ids[i] for i in plan)
+    
+    Constraints = meal_planner.PlanConstraints
+    plan = meal_planner.greedy_plan(data, Constraints(n=2))
+    assert names(plan) == ['pollo-arroz', 'pollo-wok'], "Two shared ingredients outweigh one like"
+    assert meal_planner.plan_score(data, plan, Constraints(n=2)) == 21
+    plan = meal_planner.greedy_plan(data, Constraints(n=2, quotas={'Platos': 1}))
+    assert names(plan) == ['flan', 'pollo-arroz'], "Category quotas are respected"
+    plan = meal_planner.greedy_plan(data, Constraints(n=2, max_ingredients=3))
+    assert names(plan) == ['caldo', 'pollo-arroz'], "The distinct ingredient cap is respected"
+    assert len(meal_planner.greedy_plan(data, Constraints(n=6))) == 4, "Plans stop when no recipe is left"
+    print("   ✅ Greedy plans follow likes, overlap, quotas and the ingredient cap")
+    
+    big = meal_planner.synthetic_data(2000)
+    c = Constraints(n=7, quotas={'Postres': 1}, max_ingredients=40)
+    greedy = meal_planner.greedy_plan(big, c)
+    improved = meal_planner.optimize(big, c, time_budget=0.2)
+    assert len(improved) == 7 and meal_planner._feasible(big, improved, c), "The optimized plan is feasible"
+    assert meal_planner.plan_score(big, improved, c) >= meal_planner.plan_score(big, greedy, c), \
+        "Local search never makes the plan worse"
+    print("   ✅ Local search keeps the plan feasible and at least as good as greedy")
+    
+    with temp_data_root() as tmp:
+        (tmp / 'recipes_index.json').write_text(json.dumps({'recipes': [
+            {'id': 'flan', 'name': 'Flan', 'category': 'Postres', 'likes': 7},
+            {'id': 'sin-indexar', 'name': 'Sin indexar', 'likes': 99}]}), encoding='utf-8')
+        index = ingredient_index.empty_index()
+        ingredient_index.add_recipe(index, {'id': 'flan', 'name': 'Flan'}, {'ingredients': [{'name': 'Huevo'}]})
+        ingredient_index.save_ingredient_index(index)
+        loaded = meal_planner.load_planner_data()
+    assert loaded.ids == ['flan'] and loaded.likes == [7] and loaded.categories == ['Postres'], \
+        "Planner data joins the catalog with the ingredient index"
+    print("   ✅ Catalog likes joined with the ingredient index")
+    print("✅ Meal planner tests passed!\n")
+
+
+def test_recipe_neighbors():
+    """Test that adding recipes incrementally matches a full neighbors build."""
+    print("🧪 Testing similar recipes...")
+    
+    recipes = {
+        'tortilla': ['papa', 'huevo', 'cebolla'],
+        'omelette': ['huevo', 'queso'],
+        'pure': ['papa', 'manteca', 'leche'],
+        'flan': ['huevo', 'leche', 'azucar'],
+        'budin': ['huevo', 'harina', 'azucar', 'leche'],
+    }
+    def index_for(ids):
+        index = {'recipes': {rid: {'ingredients': recipes[rid]} for rid in ids}, 'postings': {}}
+        for rid in ids:
+            for ing in recipes[rid]:
+                index['postings'].setdefault(ing, []).append(rid)
+        return index
+    
+    full = recipe_neighbors.build_neighbors(index_for(recipes), k=2, workers=1)
+    assert full['neighbors']['flan'][0] == ['budin', 0.75], "Flan and budín share 3 of 4 ingredients"
+    data = recipe_neighbors.build_neighbors(index_for(['tortilla', 'omelette', 'pure']), k=2, workers=1)
+    recipe_neighbors.add_recipes(data, recipe_neighbors.IngredientSets(index_for(recipes)), ['flan', 'budin'])
+    assert data['neighbors'] == full['neighbors'], "Incremental lists should match a full build"
+    print("   ✅ Incremental neighbors match a full build")
+    print("✅ Similar recipes tests passed!\n")
+
+
+def test_covote_recommendations():
+    """Test that incremental co-vote counts match a rebuild from the tracker."""
+    print("🧪 Testing co-vote recommendations...")
+    
+    with temp_data_root():
+        with VoteStore() as store:
+            store.record_vote("covote-a", "cv-tarta")
+            store.compact()
+        stored = vote_tracker.VOTE_RECOMMENDATIONS_FILE.read_bytes()
+        with VoteStore() as store:
+            for build_id, recipes in [("covote-a", ["cv-flan"]),
+                                      ("covote-b", ["cv-tarta", "cv-flan", "cv-sopa"]),
+                                      ("covote-c", ["cv-sopa", "cv-tarta"])]:
+                for recipe_id in recipes:
+                    store.record_vote(build_id, recipe_id)
+        assert vote_tracker.VOTE_RECOMMENDATIONS_FILE.read_bytes() == stored, \
+            "A vote should not rewrite the pair counts"
+        with VoteStore(readonly=True) as store:
+            covotes = store.covotes
+            rebuilt = CoVotes.rebuild(store.iter_records())
+            for recipe_id in ("cv-tarta", "cv-flan", "cv-sopa"):
+                assert covotes.recommendations.get(recipe_id) == rebuilt.recommendations.get(recipe_id), \
+                    f"Checkpoint plus journal for {recipe_id} should match the rebuild"
+            assert covotes.recommendations["cv-flan"][0] == ("cv-tarta", round(2 / (2 * 3) ** 0.5, 4)), \
+                "Scores should be cosine-normalized co-vote counts"
+        print("   ✅ Votes update only the voter's pairs and match a rebuild")
+        
+        with VoteStore() as store:
+            store.cleanup(days_threshold=-1)
+        stored = json.loads(vote_tracker.VOTE_RECOMMENDATIONS_FILE.read_text(encoding='utf-8'))
+        assert stored['total_votes'] == 0, "Cleanup should checkpoint the voters' removal"
+        assert "cv-tarta" not in stored['recommendations'], "Lists should drop recipes without voters"
+    print("   ✅ Cleanup removes expired voters from the counts")
+    print("✅ Co-vote recommendation tests passed!\n")
+
+
+def test_sharded_index():
+    """Test that a sharded index loads and rewrites only the shards it touches."""
+    print("🧪 Testing sharded recipe index...")
+    
+    recipes = [{'id': f'shard-{i}', 'name': f'Receta {i}', 'likes': 0, 'path': f'recipes/shard-{i}.json',
+                'category': ['Postres', 'Platos principales', ''][i % 3]} for i in range(9)]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        binary_snapshot.write_json(root / 'recipes_index.json', {'recipes': recipes}, binary_snapshot.KIND_INDEX)
+        (root / 'recipes').mkdir()
+        (root / 'recipes' / 'shard-0.json').write_text('{"category": "Postres"}', encoding='utf-8')
+        manifest = catalog.shard_index(root)
+        assert sorted(manifest['shards']) == ['platos-principales', 'postres', 'sin-categoria'], \
+            f"Unexpected shards: {sorted(manifest['shards'])}"
+        assert manifest['total'] == 9 and not (root / 'recipes_index.json').exists(), "All recipes should move to shards"
+        
+        store = catalog.ShardedCatalog(catalog.load_manifest(root), root)
+        store.get('shard-0')['likes'] += 1
+        assert store._loaded == {'postres'}, "A vote should only read its category's shard"
+        before = dict(manifest['shards'])
+        store.save()
+        after = catalog.load_manifest(root)['shards']
+        assert after['postres']['sha256'] != before['postres']['sha256'], "The voted shard should be rewritten"
+        assert after['sin-categoria'] == before['sin-categoria'], "Untouched shards should keep their entry"
+        print("   ✅ A vote reads and rewrites a single shard")
+        
+        store = catalog.ShardedCatalog(catalog.load_manifest(root), root)
+        assert store.id_for_name('receta 4') == 'shard-4', "Name lookups should search every shard"
+        store.upsert(dict(recipes[1], category='Postres'))
+        store.save()
+        assert catalog.load_manifest(root)['shards']['postres']['count'] == 4, "Moved recipe should join its new shard"
+        assert catalog.merge_index(root) == 9, "Merging should keep every recipe"
+        merged = binary_snapshot.read_json(root / 'recipes_index.json', None, binary_snapshot.KIND_INDEX)
+        assert RecipeCatalog(merged).get('shard-0')['likes'] == 1, "Merged index should keep the vote"
+        print("   ✅ Upserts move recipes between shards and merge restores the single file")
+    print("✅ Sharded index tests passed!\n")
+
+
+def test_api_build():
+    """Test that incremental api/ updates match a full build and only touch changed pages."""
+    print("🧪 Testing static API views...")
+    
+    recipes = [{'id': f'api-{i:03d}', 'name': f'Receta {i}', 'likes': i % 7, 'category': ['Postres', 'Sopas'][i % 2],
+                'created_at': f'2025-01-01T00:00:{i % 60:02d}+00:00'} for i in range(250)]
+    saved = api_build.API_DIR, api_build.MANIFEST_FILE, api_build.RETIRED_GRACE
+    with tempfile.TemporaryDirectory() as tmp:
+        api_build.API_DIR = Path(tmp)
+        api_build.MANIFEST_FILE = Path(tmp) / 'manifest.json'
+        try:
+            store = RecipeCatalog({'recipes': recipes})
+            before = api_build.build_api(store)
+            assert before['views']['top-liked']['total'] == 250, "Every recipe should be in top-liked"
+            assert 'recently-voted' in before['views'] and before['views']['recently-voted']['total'] == 0
+            
+            class NoScan(RecipeCatalog):
+                def __iter__(self):
+                    raise AssertionError("An incremental update should not scan the catalog")
+            store = NoScan(store.data)
+            store.remember('api-010')
+            store.get('api-010')['last_vote_at'] = '2025-02-01T00:00:00+00:00'
+            api_build.update_for_recipes(['api-010'], store, store.before)
+            after = api_build.load_manifest()
+            assert after['views']['category/sopas'] == before['views']['category/sopas'], \
+                "Views without the changed recipe should be reused"
+            changed_pages = [p for v in before['views']
+                             for p, q in zip(after['views'][v]['pages'], before['views'][v]['pages']) if p != q]
+            assert len(changed_pages) == 3, f"Only the pages holding the recipe should change: {changed_pages}"
+            page = json.loads((Path(tmp) / after['views']['recently-voted']['pages'][0]['file']).read_text(encoding='utf-8'))
+            assert [r['id'] for r in page['recipes']] == ['api-010'], "Recently voted should list the voted recipe"
+            
+            store.before = {}
+            store.remember('api-003')
+            store.get('api-003')['likes'] = 50
+            store.upsert({'id': 'api-new', 'name': 'Nueva', 'likes': 3, 'category': 'Sopas',
+                          'created_at': '2025-03-01T00:00:00+00:00'})
+            api_build.update_for_recipes(['api-003', 'api-new'], store, store.before)
+            spliced = api_build.load_manifest()
+            assert spliced['views']['top-liked']['total'] == 251, "A new recipe should grow its views"
+            assert spliced['views']['top-liked']['pages'][0]['first'] == [-50, 'api-003'], \
+                "A recipe with more likes should move to the first page"
+            retired = set(after['retired'])
+            assert len(retired) == 3 and all((Path(tmp) / path).exists() for path in retired), \
+                "Pages left out of the manifest should stay for clients holding the previous one"
+            incremental = spliced['views']
+            api_build.RETIRED_GRACE = 0
+            assert api_build.build_api(RecipeCatalog(store.data))['views'] == incremental, "A full build should match the incremental one"
+            files = {str(p.relative_to(tmp)) for p in Path(tmp).glob('**/*.json')} - {'manifest.json'}
+            assert files == {page['file'] for view in incremental.values() for page in view['pages']}, \
+                "Retired pages should be removed once the grace period is over"
+        finally:
+            api_build.API_DIR, api_build.MANIFEST_FILE, api_build.RETIRED_GRACE = saved
+    print("   ✅ Only views and pages holding a changed recipe are regenerated")
+    print("✅ Static API tests passed!\n")
+
+
+def test_change_feed():
+    """Test sequence numbers, since-reads and checkpoint retention of the change feed."""
+    print("🧪 Testing change feed...")
+    
+    saved = change_feed.FEED_DIR, change_feed.HEAD_FILE, change_feed.SEGMENT_SIZE, change_feed.CHECKPOINT_EVERY
+    with tempfile.TemporaryDirectory() as tmp:
+        change_feed.FEED_DIR, change_feed.HEAD_FILE = Path(tmp), Path(tmp) / 'head.json'
+        change_feed.SEGMENT_SIZE, change_feed.CHECKPOINT_EVERY = 3, 6
+        try:
+            store = RecipeCatalog({'recipes': [{'id': 'feed-0', 'name': 'Base', 'likes': 0}]})
+            assert change_feed.append_changes(store, [('likes', 'feed-0')]) is None, "No feed until it is started"
+            change_feed.start_feed(store)
+            store.upsert({'id': 'feed-1', 'name': 'Nueva', 'likes': 0})
+            for _ in range(2):
+                store.get('feed-0')['likes'] += 1
+                store.changes.append(('likes', 'feed-0'))
+            assert change_feed.append_changes(store, store.changes) == 2, "Repeated votes should be logged once"
+            store.changes = []
+            delta = change_feed.read_since(1)
+            assert [(c['seq'], c['op'], c['data']) for c in delta['changes']] == [(2, 'likes', {'likes': 2})], \
+                f"Unexpected delta: {delta}"
+            print("   ✅ Mutations get increasing sequence numbers and since-reads return only deltas")
+            
+            for i in range(2, 14):
+                store.upsert({'id': f'feed-{i}', 'name': f'Receta {i}'})
+                change_feed.append_changes(store, store.changes)
+                store.changes = []
+            head = change_feed.load_head()
+            assert head['seq'] == 14 and head['checkpoint']['seq'] == 12, f"Unexpected head: {head}"
+            assert len(list(Path(tmp).glob('*.jsonl'))) == len(head['segments']) == 3, "Old segments should be dropped"
+            reset = change_feed.read_since(0)
+            assert reset['checkpoint'] == head['checkpoint']['file'], "A client too far behind should reload the checkpoint"
+            assert [c['seq'] for c in reset['changes']] == [13, 14], "Changes after the checkpoint should follow it"
+            assert [c['seq'] for c in change_feed.read_since(6)['changes']] == list(range(7, 15)), \
+                "Retained segments should serve clients slightly behind"
+        finally:
+            (change_feed.FEED_DIR, change_feed.HEAD_FILE,
+             change_feed.SEGMENT_SIZE, change_feed.CHECKPOINT_EVERY) = saved
+    print("   ✅ Checkpoints keep the feed bounded")
+    print("✅ Change feed tests passed!\n")
+
+
+def test_commit_writer():
+    """Test that a rejected push is replayed on top of the remote instead of dropped."""
+    print("🧪 Testing commit writer against a local bare repository...")
+    
+    def git(cwd, *args):
+        subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        git(tmp, 'init', '-q', '--bare', '-b', 'main', 'remote.git')
+        git(tmp, 'clone', '-q', 'remote.git', 'seed')
+        (tmp / 'seed' / 'likes.json').write_text('{}', encoding='utf-8')
+        (tmp / 'seed' / 'notes.txt').write_text('seed\n', encoding='utf-8')
+        git(tmp / 'seed', 'add', 'likes.json', 'notes.txt')
+        git(tmp / 'seed', '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-q', '-m', 'seed')
+        git(tmp / 'seed', 'push', '-q', 'origin', 'HEAD:main')
+        
+        def writer_for(name):
+            git(tmp, 'clone', '-q', 'remote.git', name)
+            def apply(ops):
+                path = tmp / name / 'likes.json'
+                likes = json.loads(path.read_text(encoding='utf-8'))
+                for rid in ops:
+                    likes[rid] = likes.get(rid, 0) + 1
+                path.write_text(json.dumps(likes, sort_keys=True), encoding='utf-8')
+            return CommitWriter(apply, ['likes.json'], repo=tmp / name, branch='main', max_batch=2,
+                                sleep=lambda seconds: None)
+        
+        first, second = writer_for('first'), writer_for('second')
+        first.submit(['omelette'])
+        assert not first.due(), "One operation should not fill the batch"
+        first.submit(['curry'])
+        assert first.due(), "A full batch should be due"
+        second.submit(['omelette'])
+        (tmp / 'second' / 'notes.txt').write_text('local edit\n', encoding='utf-8')
+        assert first.flush('votes from first') and second.flush('votes from second'), "Both writers should commit"
+        
+        git(tmp, 'clone', '-q', 'remote.git', 'check')
+        likes = json.loads((tmp / 'check' / 'likes.json').read_text(encoding='utf-8'))
+        assert likes == {'curry': 1, 'omelette': 2}, f"The rejected push should be replayed, got {likes}"
+        log = subprocess.run(['git', 'log', '--format=%s'], cwd=tmp / 'check', capture_output=True, text=True).stdout
+        assert log.splitlines() == ['votes from second', 'votes from first', 'seed'], \
+            f"Each flush should be one commit on top of the other: {log}"
+        assert (tmp / 'check' / 'notes.txt').read_text(encoding='utf-8') == 'seed\n', \
+            "Only the data paths should be committed"
+        assert (tmp / 'second' / 'notes.txt').read_text(encoding='utf-8') == 'local edit\n', \
+            "A replay should keep edits outside the data paths"
+    print("   ✅ Batched operations are replayed on the new remote head after a rejection")
+    print("✅ Commit writer tests passed!\n")
+
+
+def test_intake_server():
+    """Test HTTP validation, single-writer apply and metrics of the intake server."""
+    print("🧪 Testing intake server...")
+
+    async def exercise(server):
+        server.queue = asyncio.Queue(10)
+        server.writer_task = asyncio.create_task(server.writer())
+        http = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+        port = http.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        send = lambda body: intake_server._request(reader, writer, '127.0.0.1', 'POST', '/events', body)
+        results = [await send(intake_server.vote_event('server-test', build_id)) for build_id in ('a', 'b', 'a')]
+        results.append(await send(intake_server.vote_event('server-test', '')))
+        results.append(await send(b'{not json'))
+        _, metrics_snapshot = await intake_server._request(reader, writer, '127.0.0.1', 'GET', '/metrics')
+        server.writer_task.cancel()
+        await asyncio.gather(server.writer_task, return_exceptions=True)
+        results.append(await send(intake_server.vote_event('server-test', 'c')))
+        writer.close()
+        await writer.wait_closed()
+        http.close()
+        await http.wait_closed()
+        return results, metrics_snapshot
+
+    class FailingCommitter:
+        pending, window = ['event'], 60
+        due = lambda self: True
+        def flush(self, message):
+            raise PushError('remote unreachable')
+
+    with temp_data_root() as tmp, SqliteVoteStore(path=tmp / 'votes.db') as store:
+        server = intake_server.IntakeServer(debounce=60, max_delay=60)
+        server.catalog = RecipeCatalog({'recipes': [{'id': 'server-test', 'name': 'Servidor', 'likes': 0}]})
+        server.store = store
+        results, snapshot = asyncio.run(exercise(server))
+        
+        published = []
+        def failing_feed(catalog, changes):
+            raise OSError("disk full")
+        saved = change_feed.append_changes, api_build.update_for_recipes
+        change_feed.append_changes = failing_feed
+        api_build.update_for_recipes = lambda rids, catalog, before: published.append(sorted(rids))
+        server.catalog.save = lambda: None
+        try:
+            assert not server.try_flush(), "A failed publish should fail the flush"
+            assert server.catalog.changes and len(server._unflushed) == 3, \
+                "A failed publish should keep the changes and events for the retry"
+            change_feed.append_changes = lambda catalog, changes: published.append('feed')
+            assert server.try_flush(), "The retried flush should succeed"
+        finally:
+            change_feed.append_changes, api_build.update_for_recipes = saved
+        assert published == ['feed', ['server-test', 'server-test']] and not server.catalog.changes, \
+            f"The retry should publish the earlier changes: {published}"
+        assert server.counters['flush_errors'] == 1 and not server._unflushed
+        
+        server.committer = FailingCommitter()
+        reloads = []
+        def reload_session():
+            reloads.append(len(reloads))
+            if len(reloads) == 1:
+                raise OSError("truncated index after the replay")
+        server.open_session, server.close_session = reload_session, lambda: None
+        asyncio.run(server.push())
+        assert server.counters['session_errors'] == 1 and server.try_open_session(), \
+            "A failed reload after a push should be logged and retried"
+    statuses = [status for status, _ in results]
+    assert statuses == [200, 200, 200, 400, 400, 503], f"Unexpected statuses: {statuses}"
+    assert server.counters['push_errors'] == 1 and server.committer.pending == ['event'], \
+        "A failed push should be logged and its events kept for the next one"
+    assert [r['success'] for _, r in results[:3]] == [True, True, False], "Duplicate votes should be rejected"
+    assert server.catalog.get('server-test')['likes'] == 2, "Accepted votes should update the in-memory index"
+    assert snapshot['applied'] == 3 and snapshot['invalid'] == 2 and snapshot['unflushed'] == 3, \
+        f"Unexpected metrics: {snapshot}"
+    assert snapshot['apply_latency_ms']['max'] > 0, "Apply latency should be reported"
+    print("   ✅ Invalid events answered by the handlers, valid ones applied in order by the writer")
+    print("   ✅ Publish, push and reload errors keep the writer alive; a stopped writer answers with 503")
+    print("✅ Intake server tests passed!\n")
+
+
 def run_all_tests():
     """Run all tests."""
     print("🚀 Starting MealPrep Vote System Tests\n")
@@ -138,6 +1061,30 @@ def run_all_tests():
         test_statistics()
         test_cleanup()
         test_edge_cases()
+        test_vote_store_session()
+        test_recipe_voter_index()
+        test_vote_journal()
+        test_atomic_write_mode()
+        test_concurrent_writers()
+        test_binary_snapshot()
+        test_sqlite_backend()
+        test_vote_aggregates()
+        test_expiry_index()
+        test_fast_start()
+        test_recipe_catalog()
+        test_batch_intake()
+        test_recipe_import()
+        test_nutrition()
+        test_ingredient_index()
+        test_shopping_list()
+        test_meal_planner()
+        test_recipe_neighbors()
+        test_covote_recommendations()
+        test_sharded_index()
+        test_api_build()
+        test_change_feed()
+        test_commit_writer()
+        test_intake_server()
         
         print("=" * 50)
         print("🎉 All tests passed! The vote system is working correctly.")
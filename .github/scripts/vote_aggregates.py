@@ -0,0 +1,379 @@
+"""
+Incrementally maintained vote statistics.
+
+``VoteAggregates`` keeps the numbers the ``vote_stats.py stats`` report needs
+(totals, unique voters per recipe, the top voters and recipes and the most
+recent voters) so the report never has to scan the tracker. The vote
+backends update it on every accepted vote and on cleanup, persist it at
+their checkpoints (compaction, cleanup, rebuild) and fold in the votes
+accepted since then when they load it; ``rebuild()`` recomputes it from the
+tracker records.
+
+Top-K lists are bounded min-heaps of ``(score, key)`` tuples: a vote only
+raises scores, so it costs at most one ``heappushpop``. Removals (cleanup)
+refill the affected heap from the full counts.
+
+``ExpiryIndex`` buckets build_ids by the UTC day of their first vote, with
+integer epochs, so cleanup only visits the buckets that are due.
+
+``CoVotes`` keeps recipe co-vote counts and the "also liked" lists derived
+from them.
+"""
+
+import heapq
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+TOP_K = 10
+RECENT_SIZE = 10
+DAY_SECONDS = 24 * 60 * 60
+
+Records = Iterable[Tuple[str, Dict[str, any]]]
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds for an ISO-8601 tracker timestamp, or None if unparseable."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except Exception:
+        return None
+
+
+def _offer(heap: List[Tuple[int, str]], key: str, score: int, k: int) -> None:
+    """Raise ``key`` to ``score`` in a bounded top-k min-heap."""
+    for i, (_, existing) in enumerate(heap):
+        if existing == key:
+            heap[i] = (score, key)
+            heapq.heapify(heap)
+            return
+    if len(heap) < k:
+        heapq.heappush(heap, (score, key))
+    elif (score, key) > heap[0]:
+        heapq.heapreplace(heap, (score, key))
+
+
+def _top(items: Iterable[Tuple[int, str]], k: int) -> List[Tuple[int, str]]:
+    heap = heapq.nlargest(k, items)
+    heapq.heapify(heap)
+    return heap
+
+
+class VoteAggregates:
+    """Totals, per-recipe counts, top-K heaps and a ring of recent voters."""
+
+    def __init__(self, top_k: int = TOP_K, recent_size: int = RECENT_SIZE) -> None:
+        self.top_k = top_k
+        self.recent_size = recent_size
+        self.total_build_ids = 0
+        self.total_votes = 0
+        self.recipe_counts: Dict[str, int] = {}
+        self.voters_heap: List[Tuple[int, str]] = []
+        self.recipes_heap: List[Tuple[int, str]] = []
+        # (last_vote epoch, build_id, total_votes), oldest first
+        self.recent: deque = deque(maxlen=recent_size)
+
+    @classmethod
+    def rebuild(cls, records: Records, top_k: int = TOP_K,
+                recent_size: int = RECENT_SIZE) -> 'VoteAggregates':
+        """Recompute every aggregate from ``(build_id, record)`` pairs."""
+        agg = cls(top_k, recent_size)
+        voters = []
+        recent = []
+        for build_id, record in records:
+            total = record.get('total_votes', 0)
+            agg.total_build_ids += 1
+            agg.total_votes += total
+            voters.append((total, build_id))
+            for recipe_id in record.get('voted_recipes') or ():
+                agg.recipe_counts[recipe_id] = agg.recipe_counts.get(recipe_id, 0) + 1
+            last_vote = parse_timestamp(record.get('last_vote_at'))
+            if last_vote is not None:
+                recent.append((last_vote, build_id, total))
+        agg.voters_heap = _top(voters, top_k)
+        agg.recipes_heap = _top(((n, r) for r, n in agg.recipe_counts.items()), top_k)
+        agg.recent.extend(sorted(heapq.nlargest(recent_size, recent)))
+        return agg
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> 'VoteAggregates':
+        agg = cls(data.get('top_k', TOP_K), data.get('recent_size', RECENT_SIZE))
+        agg.total_build_ids = data['total_build_ids']
+        agg.total_votes = data['total_votes']
+        agg.recipe_counts = dict(data['recipe_counts'])
+        agg.voters_heap = [tuple(item) for item in data['top_voters']]
+        agg.recipes_heap = [tuple(item) for item in data['top_recipes']]
+        heapq.heapify(agg.voters_heap)
+        heapq.heapify(agg.recipes_heap)
+        agg.recent.extend(tuple(item) for item in data['recent'])
+        return agg
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'version': 1,
+            'top_k': self.top_k,
+            'recent_size': self.recent_size,
+            'total_build_ids': self.total_build_ids,
+            'total_votes': self.total_votes,
+            'recipe_counts': self.recipe_counts,
+            'top_voters': [list(item) for item in self.top_voters()],
+            'top_recipes': [list(item) for item in self.top_recipes()],
+            'recent': [list(item) for item in self.recent],
+        }
+
+    def top_voters(self) -> List[Tuple[int, str]]:
+        """``(total_votes, build_id)`` best first."""
+        return sorted(self.voters_heap, reverse=True)
+
+    def top_recipes(self) -> List[Tuple[int, str]]:
+        """``(unique_voters, recipe_id)`` best first."""
+        return sorted(self.recipes_heap, reverse=True)
+
+    def recent_voters(self) -> List[Tuple[float, str, int]]:
+        """``(last_vote epoch, build_id, total_votes)`` most recent first."""
+        return list(reversed(self.recent))
+
+    def record_vote(self, build_id: str, recipe_id: str, build_total: int,
+                    new_build: bool, voted_at: Optional[float]) -> None:
+        """Account for one accepted (non-duplicate) vote."""
+        if new_build:
+            self.total_build_ids += 1
+        self.total_votes += 1
+        count = self.recipe_counts.get(recipe_id, 0) + 1
+        self.recipe_counts[recipe_id] = count
+        _offer(self.voters_heap, build_id, build_total, self.top_k)
+        _offer(self.recipes_heap, recipe_id, count, self.top_k)
+        if voted_at is not None:
+            for i, entry in enumerate(self.recent):
+                if entry[1] == build_id:
+                    del self.recent[i]
+                    break
+            self.recent.append((voted_at, build_id, build_total))
+
+    def remove_builds(self, removed: Dict[str, int], recipe_decrements: Dict[str, int],
+                      remaining: Callable[[], Records]) -> None:
+        """Account for deleted build_ids.
+
+        ``removed`` maps build_id -> total_votes, ``recipe_decrements`` maps
+        recipe_id -> voters lost and ``remaining`` yields the records left,
+        used only if a removed build_id was in the top voters or recent ring.
+        """
+        if not removed:
+            return
+        self.total_build_ids -= len(removed)
+        self.total_votes -= sum(removed.values())
+        for recipe_id, lost in recipe_decrements.items():
+            count = self.recipe_counts.get(recipe_id, 0) - lost
+            if count > 0:
+                self.recipe_counts[recipe_id] = count
+            else:
+                self.recipe_counts.pop(recipe_id, None)
+        if recipe_decrements:
+            self.recipes_heap = _top(((n, r) for r, n in self.recipe_counts.items()), self.top_k)
+
+        if any(b in removed for _, b in self.voters_heap) or any(e[1] in removed for e in self.recent):
+            rebuilt = VoteAggregates.rebuild(remaining(), self.top_k, self.recent_size)
+            self.voters_heap = rebuilt.voters_heap
+            self.recent = rebuilt.recent
+
+    def compare(self, other: 'VoteAggregates') -> List[str]:
+        """Human readable differences against ``other`` (empty when equal)."""
+        problems = []
+        mine, theirs = self.to_dict(), other.to_dict()
+        for key in ('total_build_ids', 'total_votes', 'recipe_counts', 'top_voters', 'top_recipes'):
+            if mine[key] != theirs[key]:
+                problems.append(f"{key}: maintained {mine[key]!r}, recomputed {theirs[key]!r}")
+        if [e[1] for e in self.recent] != [e[1] for e in other.recent]:
+            problems.append("recent: maintained and recomputed recent voters differ")
+        return problems
+
+
+class ExpiryIndex:
+    """build_ids bucketed by first-vote day: ``{day: {build_id: epoch}}``.
+
+    Records whose ``first_vote_at`` does not parse are kept in ``unindexed``
+    and never expire, like the full-scan cleanup did.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: Dict[int, Dict[str, int]] = {}
+        self.unindexed: Set[str] = set()
+
+    @classmethod
+    def rebuild(cls, records: Records) -> 'ExpiryIndex':
+        index = cls()
+        for build_id, record in records:
+            index.add(build_id, record.get('first_vote_at'))
+        return index
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> 'ExpiryIndex':
+        index = cls()
+        index.buckets = {int(day): dict(bucket) for day, bucket in data['buckets'].items()}
+        index.unindexed = set(data['unindexed'])
+        return index
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'version': 1,
+            'buckets': {str(day): self.buckets[day] for day in sorted(self.buckets)},
+            'unindexed': sorted(self.unindexed),
+        }
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self.buckets.values()) + len(self.unindexed)
+
+    def add(self, build_id: str, first_vote_at: Optional[str]) -> None:
+        timestamp = parse_timestamp(first_vote_at)
+        if timestamp is None:
+            self.unindexed.add(build_id)
+            return
+        epoch = int(timestamp)
+        self.buckets.setdefault(epoch // DAY_SECONDS, {})[build_id] = epoch
+
+    def pop_expired(self, cutoff: int) -> List[str]:
+        """Remove and return the build_ids whose first vote is before ``cutoff``.
+
+        Whole days before the cutoff day are dropped without looking at their
+        entries; only the cutoff day itself is filtered by epoch.
+        """
+        cutoff_day = cutoff // DAY_SECONDS
+        expired = []
+        for day in [d for d in self.buckets if d <= cutoff_day]:
+            bucket = self.buckets[day]
+            if day < cutoff_day:
+                expired.extend(bucket)
+                del self.buckets[day]
+                continue
+            due = [build_id for build_id, epoch in bucket.items() if epoch < cutoff]
+            for build_id in due:
+                del bucket[build_id]
+            if not bucket:
+                del self.buckets[day]
+            expired.extend(due)
+        return expired
+
+
+class CoVotes:
+    """Recipe x recipe co-vote counts: "people who liked X also liked Y".
+
+    Recipe ids are interned to integers, so the state is a voters-per-recipe
+    list plus one ``{other: count}`` dict per recipe. Its size depends on the
+    number of recipes and co-voted pairs, never on the number of build_ids.
+    A new vote only changes the pairs between the voted recipe and the
+    voter's earlier recipes. Only the "also liked" lists of those rows are
+    recomputed, scored by cosine similarity
+    ``both / sqrt(voters_a * voters_b)``. Lists of other recipes keep their
+    scores until the next ``rebuild``.
+    """
+
+    def __init__(self, top_n: int = TOP_K) -> None:
+        self.top_n = top_n
+        self.total_votes = 0
+        self.ids: List[str] = []
+        self.voters: List[int] = []
+        self.pairs: List[Dict[int, int]] = []
+        self.recommendations: Dict[str, List[Tuple[str, float]]] = {}
+        self._interned: Dict[str, int] = {}
+        self._touched: Set[int] = set()
+
+    def _intern(self, recipe_id: str) -> int:
+        i = self._interned.get(recipe_id)
+        if i is None:
+            i = self._interned[recipe_id] = len(self.ids)
+            self.ids.append(recipe_id)
+            self.voters.append(0)
+            self.pairs.append({})
+        return i
+
+    def _add_voter(self, voted: List[int], sign: int) -> None:
+        for a in voted:
+            self.voters[a] += sign
+            row = self.pairs[a]
+            for b in voted:
+                if b != a:
+                    count = row.get(b, 0) + sign
+                    if count > 0:
+                        row[b] = count
+                    else:
+                        row.pop(b, None)
+        self.total_votes += sign * len(voted)
+        self._touched.update(voted)
+
+    @classmethod
+    def rebuild(cls, records: Records, top_n: int = TOP_K) -> 'CoVotes':
+        """Recompute every count and list from ``(build_id, record)`` pairs."""
+        covotes = cls(top_n)
+        for _, record in records:
+            voted = {covotes._intern(r) for r in record.get('voted_recipes') or ()}
+            covotes._add_voter(list(voted), 1)
+        covotes.refresh()
+        return covotes
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> 'CoVotes':
+        covotes = cls(data.get('top_n', TOP_K))
+        covotes.total_votes = data['total_votes']
+        covotes.ids = list(data['recipes'])
+        covotes._interned = {recipe_id: i for i, recipe_id in enumerate(covotes.ids)}
+        covotes.voters = list(data['voters'])
+        # Rows are stored flat: [other, count, other, count, ...]
+        covotes.pairs = [dict(zip(row[::2], row[1::2])) for row in data['pairs']]
+        covotes.recommendations = {r: [tuple(item) for item in items]
+                                   for r, items in data['recommendations'].items()}
+        return covotes
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'version': 1,
+            'top_n': self.top_n,
+            'total_votes': self.total_votes,
+            'recipes': self.ids,
+            'voters': self.voters,
+            'pairs': [[v for item in sorted(row.items()) for v in item] for row in self.pairs],
+            'recommendations': {r: [list(item) for item in items]
+                                for r, items in sorted(self.recommendations.items())},
+        }
+
+    def record_vote(self, recipe_id: str, previous: Iterable[str]) -> None:
+        """Account for a new vote by a build_id that already voted for ``previous``."""
+        a = self._intern(recipe_id)
+        earlier = [self._intern(r) for r in previous if r != recipe_id]
+        self.voters[a] += 1
+        row = self.pairs[a]
+        for b in earlier:
+            row[b] = row.get(b, 0) + 1
+            self.pairs[b][a] = self.pairs[b].get(a, 0) + 1
+        self.total_votes += 1
+        self._touched.add(a)
+        self._touched.update(earlier)
+
+    def remove_voter(self, voted: Iterable[str]) -> None:
+        """Account for a deleted build_id and all of its votes."""
+        self._add_voter(list({self._intern(r) for r in voted}), -1)
+
+    def voter_count(self, recipe_id: str) -> int:
+        i = self._interned.get(recipe_id)
+        return self.voters[i] if i is not None else 0
+
+    def also_liked(self, recipe_id: str) -> List[Tuple[str, float]]:
+        """Top-N ``(recipe_id, cosine)`` computed from the current counts."""
+        a = self._interned.get(recipe_id)
+        if a is None or not self.voters[a]:
+            return []
+        scored = [(self.ids[b], round(both / (self.voters[a] * self.voters[b]) ** 0.5, 4))
+                  for b, both in self.pairs[a].items() if self.voters[b]]
+        return heapq.nsmallest(self.top_n, scored, key=lambda item: (-item[1], item[0]))
+
+    def refresh(self) -> None:
+        """Recompute the lists of the recipes whose counts changed."""
+        for a in self._touched:
+            recipe_id = self.ids[a]
+            items = self.also_liked(recipe_id)
+            if items:
+                self.recommendations[recipe_id] = items
+            else:
+                self.recommendations.pop(recipe_id, None)
+        self._touched.clear()
@@ -4,36 +4,49 @@ Vote statistics and management script for the MealPrep community repository.
 This script provides insights into voting patterns and helps manage the vote tracking system.
 """
 
-import json
 import sys
-from pathlib import Path
 from datetime import datetime, timezone
-from vote_tracker import load_vote_tracker, get_recipe_vote_stats, cleanup_old_votes
-
-ROOT = Path(__file__).resolve().parents[2]
-INDEX = ROOT / 'recipes_index.json'
-
-
-def load_index():
-    """Load the recipes index."""
-    if INDEX.exists():
-        try:
-            return json.loads(INDEX.read_text(encoding='utf-8'))
-        except Exception:
-            pass
-    return {'recipes': []}
-
-
-def show_vote_statistics():
-    """Display comprehensive vote statistics."""
-    tracker = load_vote_tracker()
-    index = load_index()
+import api_build
+import catalog
+from storage import StorageError
+from vote_tracker import cleanup_days_threshold, cleanup_old_votes, load_vote_tracker, open_vote_store
+
+
+def load_catalog():
+    """Catalog for id lookups; a sharded index only reads the shard of each recipe looked up."""
+    try:
+        return catalog.RecipeCatalog.load()
+    except (StorageError, FileNotFoundError):
+        return catalog.RecipeCatalog()
+
+
+def show_vote_statistics(rebuild=False):
+    """Display comprehensive vote statistics.
+
+    Rendered from the maintained vote aggregates; ``rebuild=True`` recomputes
+    them from the tracker first and reports any difference. Returns False if
+    the rebuild found the maintained aggregates out of sync.
+    """
+    problems = []
+    with open_vote_store(readonly=not rebuild) as store:
+        if rebuild:
+            problems = store.rebuild_aggregates()
+        aggregates = store.aggregates
+    recipes = load_catalog()
     
     print("=== MEALPREP COMMUNITY VOTE STATISTICS ===\n")
     
+    if rebuild:
+        print("🔁 Aggregates rebuilt from the tracker:")
+        if not problems:
+            print("   ✅ Maintained aggregates matched the recomputed ones")
+        for problem in problems:
+            print(f"   ⚠️  {problem}")
+        print()
+    
     # Overall statistics
-    total_build_ids = len(tracker)
-    total_votes = sum(data.get('total_votes', 0) for data in tracker.values())
+    total_build_ids = aggregates.total_build_ids
+    total_votes = aggregates.total_votes
     
     print(f"📊 Overall Statistics:")
     print(f"   • Total unique installations (build_ids): {total_build_ids}")
@@ -41,62 +54,31 @@ def show_vote_statistics():
     print(f"   • Average votes per installation: {total_votes / max(total_build_ids, 1):.2f}")
     print()
     
-    # Top voters
-    top_voters = sorted(
-        [(build_id, data.get('total_votes', 0)) for build_id, data in tracker.items()],
-        key=lambda x: x[1],
-        reverse=True
-    )[:10]
-    
     print("🏆 Top Voters (by total votes):")
-    for i, (build_id, votes) in enumerate(top_voters, 1):
+    for i, (votes, build_id) in enumerate(aggregates.top_voters(), 1):
         print(f"   {i:2d}. {build_id[:12]}... ({votes} votes)")
     print()
     
-    # Recipe statistics
-    recipes = index.get('recipes', [])
-    recipe_stats = []
-    
-    for recipe in recipes:
-        recipe_id = recipe.get('id', '')
-        recipe_name = recipe.get('name', 'Unknown')
-        likes = recipe.get('likes', 0)
-        stats = get_recipe_vote_stats(recipe_id)
-        
-        recipe_stats.append({
-            'id': recipe_id,
-            'name': recipe_name,
-            'likes': likes,
-            'unique_voters': stats['unique_voters']
-        })
-    
-    # Sort by likes
-    recipe_stats.sort(key=lambda x: x['likes'], reverse=True)
-    
     print("🍽️  Top Recipes (by likes):")
-    for i, recipe in enumerate(recipe_stats[:10], 1):
-        print(f"   {i:2d}. {recipe['name'][:30]:<30} ({recipe['likes']} likes, {recipe['unique_voters']} unique voters)")
+    for i, recipe in enumerate(api_build.top_liked(recipes, aggregates.top_k), 1):
+        voters = aggregates.recipe_counts.get(recipe.get('id'), 0)
+        print(f"   {i:2d}. {recipe.get('name', 'Unknown')[:30]:<30} ({recipe.get('likes', 0)} likes, {voters} unique voters)")
     print()
     
-    # Recent activity
-    recent_voters = []
-    for build_id, data in tracker.items():
-        last_vote = data.get('last_vote_at')
-        if last_vote:
-            try:
-                last_vote_dt = datetime.fromisoformat(last_vote.replace('Z', '+00:00'))
-                recent_voters.append((build_id, last_vote_dt, data.get('total_votes', 0)))
-            except Exception:
-                pass
-    
-    recent_voters.sort(key=lambda x: x[1], reverse=True)
+    print("🗳️  Most Voted Recipes (by unique voters):")
+    for i, (voters, recipe_id) in enumerate(aggregates.top_recipes(), 1):
+        recipe = recipes.get(recipe_id) or {}
+        name = recipe.get('name', recipe_id)
+        print(f"   {i:2d}. {name[:30]:<30} ({recipe.get('likes', 0)} likes, {voters} unique voters)")
+    print()
     
-    print("🕒 Recent Activity (last 10 voters):")
-    for build_id, last_vote, total_votes in recent_voters[:10]:
-        time_ago = datetime.now(timezone.utc) - last_vote
-        hours_ago = int(time_ago.total_seconds() / 3600)
+    now = datetime.now(timezone.utc).timestamp()
+    print(f"🕒 Recent Activity (last {aggregates.recent_size} voters):")
+    for last_vote, build_id, total_votes in aggregates.recent_voters():
+        hours_ago = int((now - last_vote) / 3600)
         print(f"   • {build_id[:12]}... ({total_votes} total votes, {hours_ago}h ago)")
     print()
+    return not problems
 
 
 def show_duplicate_votes():
@@ -109,14 +91,64 @@ def show_duplicate_votes():
     print()
 
 
-def cleanup_old_data(days_threshold=90):
-    """Clean up old vote data."""
+def verify_vote_index():
+    """Check the recipe -> voters index against the build_id map."""
+    with open_vote_store(readonly=True) as store:
+        problems = store.verify_index()
+
+    print("🔍 Vote Index Consistency Check:")
+    if not problems:
+        print("   ✅ Recipe voter index matches the tracker")
+    for problem in problems:
+        print(f"   ⚠️  {problem}")
+    print()
+    return not problems
+
+
+def cleanup_old_data(days_threshold=None):
+    """Clean up old vote data (default: ``cleanup_days_threshold`` from the config)."""
+    if days_threshold is None:
+        days_threshold = cleanup_days_threshold()
     print(f"🧹 Cleaning up vote data older than {days_threshold} days...")
     cleaned = cleanup_old_votes(days_threshold)
     print(f"   Removed {cleaned} old vote records")
     print()
 
 
+def compact_vote_journal():
+    """Fold the vote journal into the tracker snapshot."""
+    print("🗜️  Compacting vote journal...")
+    with open_vote_store() as store:
+        folded = store.compact()
+    print(f"   Folded {folded} journaled votes into the snapshot")
+    print()
+
+
+def show_recommendations(recipe_id=None, rebuild=False):
+    """Show "also liked" lists from the co-vote counts; ``rebuild=True`` recomputes them."""
+    if rebuild:
+        print("🔄 Recomputing co-vote recommendations...")
+        with open_vote_store() as store:
+            store.rebuild_covotes()
+            covotes = store.covotes
+        print(f"   ✅ {len(covotes.recommendations)} recipes with recommendations")
+        print()
+    else:
+        with open_vote_store(readonly=True) as store:
+            covotes = store.covotes
+
+    recipe_ids = [recipe_id] if recipe_id else sorted(
+        covotes.recommendations, key=lambda r: -covotes.voter_count(r))[:10]
+    print("🤝 People who liked X also liked:")
+    if not recipe_ids:
+        print("   No co-votes yet")
+    for rid in recipe_ids:
+        items = covotes.recommendations.get(rid, [])
+        listed = ', '.join(f"{other} ({score:.2f})" for other, score in items[:5]) or '—'
+        print(f"   {rid}: {listed}")
+    print()
+
+
 def show_help():
     """Show help information."""
     print("MealPrep Community Vote Statistics Tool")
@@ -124,8 +156,13 @@ def show_help():
     print()
     print("Commands:")
     print("  stats     - Show comprehensive vote statistics (default)")
-    print("  cleanup   - Clean up old vote data (90+ days)")
+    print("              --rebuild recomputes the aggregates and verifies them")
+    print(f"  cleanup   - Clean up old vote data ({cleanup_days_threshold()}+ days)")
     print("  duplicates - Show duplicate vote analysis")
+    print("  verify    - Check the recipe voter index against the tracker")
+    print("  compact   - Fold the vote journal into the tracker snapshot")
+    print("  recommendations [recipe_id] - Show \"also liked\" recipes from co-votes")
+    print("              --rebuild recomputes every list from the tracker")
     print("  help      - Show this help message")
     print()
 
@@ -137,11 +174,20 @@ def main():
         command = sys.argv[1].lower()
     
     if command == "stats":
-        show_vote_statistics()
+        if not show_vote_statistics(rebuild='--rebuild' in sys.argv[2:]):
+            sys.exit(1)
     elif command == "cleanup":
         cleanup_old_data()
     elif command == "duplicates":
         show_duplicate_votes()
+    elif command == "verify":
+        if not verify_vote_index():
+            sys.exit(1)
+    elif command == "compact":
+        compact_vote_journal()
+    elif command == "recommendations":
+        args = [a for a in sys.argv[2:] if not a.startswith('--')]
+        show_recommendations(args[0] if args else None, rebuild='--rebuild' in sys.argv[2:])
     elif command == "help":
         show_help()
     else:
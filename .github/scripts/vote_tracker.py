@@ -1,124 +1,1000 @@
 """
 Vote tracking system to prevent duplicate votes from the same build_id.
 This module manages a JSON file that tracks which build_ids have voted for which recipes.
+
+Accepted votes are appended to a JSONL journal next to the snapshot instead of
+rewriting it; compaction folds the journal back into ``vote_tracker.json``.
+
+Two storage backends implement the same ``VoteBackend`` session interface:
+``VoteStore`` (the JSON snapshot + journal, the default) and
+``SqliteVoteStore`` (a WAL-mode SQLite database with indexed votes). The
+backend is picked by ``MEALPREP_VOTE_BACKEND`` or the ``storage_backend``
+setting in ``vote_config.json``; see ``open_vote_store()``.
 """
 
 import json
 import os
+from contextlib import ExitStack
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Set, Optional
+from typing import Dict, Iterator, List, Set, Optional, Tuple
+
+import binary_snapshot
+import metrics
+from storage import (StorageError, append_text, atomic_write_json, atomic_write_text,
+                     file_lock, read_json, repo_root)
+from vote_aggregates import CoVotes, ExpiryIndex, VoteAggregates, parse_timestamp
 
-ROOT = Path(__file__).resolve().parents[2]
+ROOT = repo_root()
 VOTE_TRACKER_FILE = ROOT / '.github' / 'data' / 'vote_tracker.json'
+VOTE_JOURNAL_FILE = ROOT / '.github' / 'data' / 'vote_journal.jsonl'
+VOTE_DB_FILE = ROOT / '.github' / 'data' / 'vote_tracker.db'
+VOTE_CONFIG_FILE = ROOT / '.github' / 'data' / 'vote_config.json'
+VOTE_AGGREGATES_FILE = ROOT / '.github' / 'data' / 'vote_aggregates.json'
+VOTE_EXPIRY_FILE = ROOT / '.github' / 'data' / 'vote_expiry.json'
+VOTE_RECOMMENDATIONS_FILE = ROOT / '.github' / 'data' / 'vote_recommendations.json'
+
+DEFAULT_CLEANUP_DAYS = 90
+
+# An accepted vote as the derived state folds it in:
+# (build_id, recipe_id, build total after the vote, new build_id, voted_at, recipes voted before)
+Vote = Tuple[str, str, int, bool, Optional[str], List[str]]
+
+# Overrides the ``storage_backend`` setting: "json" or "sqlite"
+VOTE_BACKEND_ENV = 'MEALPREP_VOTE_BACKEND'
+
+# Fold the journal into the snapshot automatically once it grows past this
+JOURNAL_COMPACT_THRESHOLD = 1000
 
 
 def load_vote_tracker() -> Dict[str, Dict[str, any]]:
-    """Load the vote tracker data from JSON file."""
-    if not VOTE_TRACKER_FILE.exists():
-        return {}
-    
-    try:
-        with open(VOTE_TRACKER_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    """Load the vote tracker data from JSON file.
+
+    Raises ``storage.StorageError`` if the file exists but is corrupt.
+    """
+    return binary_snapshot.read_json(VOTE_TRACKER_FILE, {}, binary_snapshot.KIND_TRACKER)
 
 
 def save_vote_tracker(data: Dict[str, Dict[str, any]]) -> None:
-    """Save the vote tracker data to JSON file."""
-    VOTE_TRACKER_FILE.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(VOTE_TRACKER_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Save the vote tracker data to JSON file (atomically)."""
+    binary_snapshot.write_json(VOTE_TRACKER_FILE, data, binary_snapshot.KIND_TRACKER)
+
+
+def tracker_lock(shared: bool = False):
+    """Advisory lock guarding the tracker snapshot and journal together."""
+    return file_lock(VOTE_TRACKER_FILE, shared=shared)
+
+
+def load_vote_journal() -> List[Dict[str, str]]:
+    """Load the journaled votes that are not yet in the snapshot.
+
+    A truncated last line (e.g. from a killed runner) is ignored.
+    """
+    if not VOTE_JOURNAL_FILE.exists():
+        return []
+
+    entries = []
+    with open(VOTE_JOURNAL_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and entry.get('build_id') is not None:
+                entries.append(entry)
+    return entries
+
+
+def append_vote_journal(entries: List[Dict[str, str]]) -> None:
+    """Append vote entries to the journal, one JSON object per line."""
+    text = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+    # Never glue a new entry onto a torn last line left by a killed runner
+    if VOTE_JOURNAL_FILE.exists() and VOTE_JOURNAL_FILE.stat().st_size:
+        with open(VOTE_JOURNAL_FILE, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                text = '\n' + text
+    append_text(VOTE_JOURNAL_FILE, text)
+
+
+def truncate_vote_journal() -> None:
+    """Empty the journal once its votes are part of the snapshot."""
+    if VOTE_JOURNAL_FILE.exists():
+        atomic_write_text(VOTE_JOURNAL_FILE, '')
+
+
+def load_vote_config() -> Dict[str, any]:
+    """Return the ``settings`` block of ``vote_config.json`` (empty if missing)."""
+    config = read_json(VOTE_CONFIG_FILE, {}) or {}
+    return config.get('settings') or {}
+
+
+def cleanup_days_threshold() -> int:
+    """Vote retention in days: ``VOTE_CLEANUP_DAYS``, then ``cleanup_days_threshold``
+    in ``vote_config.json``."""
+    days = os.environ.get('VOTE_CLEANUP_DAYS') or load_vote_config().get('cleanup_days_threshold')
+    return int(days or DEFAULT_CLEANUP_DAYS)
+
+
+def _is_vote_record(record) -> bool:
+    # Tracker entries such as ``metadata`` are not build_id vote records
+    return isinstance(record, dict) and 'first_vote_at' in record
+
+
+class VoteBackend:
+    """Session interface shared by the vote storage backends.
+
+    A backend is used as a context manager; changes made inside the block
+    are persisted when it exits cleanly. ``readonly=True`` sessions never
+    write. Records use the ``vote_tracker.json`` layout::
+
+        {'first_vote_at': iso, 'voted_recipes': [...], 'total_votes': n, 'last_vote_at': iso}
+    """
+
+    readonly = False
+
+    def __enter__(self) -> 'VoteBackend':
+        raise NotImplementedError
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persist the changes made so far and keep the session (and its lock) open."""
+        raise NotImplementedError
+
+    def has_voted(self, build_id: str, recipe_id: str) -> bool:
+        raise NotImplementedError
+
+    def record_vote(self, build_id: str, recipe_id: str, recipe_name: str = '') -> None:
+        raise NotImplementedError
+
+    def get_build_stats(self, build_id: str) -> Optional[Dict[str, any]]:
+        raise NotImplementedError
+
+    def cleanup(self, days_threshold: Optional[int] = None) -> int:
+        """Remove build_ids whose first vote is older than ``days_threshold``
+        (default: ``cleanup_days_threshold()``). Returns how many were removed."""
+        raise NotImplementedError
+
+    def recipe_vote_stats(self, recipe_id: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def recipe_voters(self, recipe_id: str) -> Set[str]:
+        raise NotImplementedError
+
+    def recipe_vote_counts(self) -> Dict[str, int]:
+        """Unique voters per recipe_id, for every recipe with votes."""
+        raise NotImplementedError
+
+    @property
+    def total_votes(self) -> int:
+        raise NotImplementedError
+
+    def iter_records(self) -> Iterator[Tuple[str, Dict[str, any]]]:
+        """Yield ``(build_id, record)`` for every build_id vote record."""
+        raise NotImplementedError
+
+    def export_data(self) -> Dict[str, any]:
+        """The whole tracker in ``vote_tracker.json`` layout, in insertion order."""
+        raise NotImplementedError
+
+    def import_data(self, data: Dict[str, any]) -> None:
+        """Replace the stored tracker with ``data`` (``vote_tracker.json`` layout)."""
+        raise NotImplementedError
+
+    def compact(self) -> int:
+        """Fold pending log entries into the main store. Returns the entries folded."""
+        return 0
+
+    def verify_index(self) -> List[str]:
+        """Human readable consistency problems (empty when consistent)."""
+        return []
+
+    # Derived state is persisted only at checkpoints (compaction, cleanup,
+    # import or an explicit rebuild), never per vote. Loading it folds in the
+    # votes accepted since the checkpoint, which both backends can list.
+    _aggregates: Optional[VoteAggregates] = None
+    _checkpoint_due = False
+
+    def _checkpoint_total(self) -> Optional[int]:
+        """``total_votes`` as of the last checkpoint (None if unknown)."""
+        raise NotImplementedError
+
+    def _votes_since_checkpoint(self) -> List[Vote]:
+        """Votes accepted after the last checkpoint, oldest first."""
+        raise NotImplementedError
+
+    def _fold(self, vote: Vote) -> None:
+        """Apply an accepted vote to the derived state already in memory."""
+        build_id, recipe_id, build_total, new_build, voted_at, previous = vote
+        if self._aggregates is not None:
+            self._aggregates.record_vote(build_id, recipe_id, build_total, new_build, parse_timestamp(voted_at))
+        if self._covotes is not None:
+            self._covotes.record_vote(recipe_id, previous)
+
+    def _write_checkpoint(self) -> None:
+        """Persist the derived state; it then matches the stored votes."""
+        self._write_aggregates(self.aggregates.to_dict())
+        atomic_write_json(VOTE_RECOMMENDATIONS_FILE, self.covotes.to_dict())
+        self._checkpoint_due = False
+
+    def _read_aggregates(self) -> Optional[Dict[str, any]]:
+        raise NotImplementedError
+
+    def _write_aggregates(self, data: Dict[str, any]) -> None:
+        raise NotImplementedError
+
+    def _stored_aggregates(self) -> Optional[VoteAggregates]:
+        """The checkpointed aggregates with the later votes folded in."""
+        try:
+            data = self._read_aggregates()
+            aggregates = VoteAggregates.from_dict(data) if data else None
+        except (StorageError, KeyError, TypeError, ValueError):
+            return None
+        if aggregates is not None and aggregates.total_votes == self._checkpoint_total():
+            for build_id, recipe_id, build_total, new_build, voted_at, _ in self._votes_since_checkpoint():
+                aggregates.record_vote(build_id, recipe_id, build_total, new_build, parse_timestamp(voted_at))
+        return aggregates
+
+    @property
+    def aggregates(self) -> VoteAggregates:
+        """Maintained statistics, recomputed if missing or out of date."""
+        if self._aggregates is None:
+            aggregates = self._stored_aggregates()
+            if aggregates is None or aggregates.total_votes != self.total_votes:
+                aggregates = VoteAggregates.rebuild(self.iter_records())
+                self._checkpoint_due = True
+            self._aggregates = aggregates
+        return self._aggregates
+
+    def rebuild_aggregates(self) -> List[str]:
+        """Recompute the aggregates from the records and replace the maintained ones.
+
+        Returns the differences found (empty when the maintained copy was right).
+        """
+        maintained = self._aggregates or self._stored_aggregates()
+        rebuilt = VoteAggregates.rebuild(self.iter_records())
+        problems = maintained.compare(rebuilt) if maintained else ["aggregates: nothing stored"]
+        self._aggregates = rebuilt
+        self._checkpoint_due = True
+        return problems
+
+    _covotes: Optional[CoVotes] = None
+
+    @property
+    def covotes(self) -> CoVotes:
+        """Co-vote counts and "also liked" lists, rebuilt if missing or out of date.
+
+        Both backends checkpoint them to ``vote_recommendations.json``, which
+        clients read directly; the lists there lag until the next checkpoint.
+        """
+        if self._covotes is None:
+            covotes = None
+            try:
+                data = read_json(VOTE_RECOMMENDATIONS_FILE, None)
+                covotes = CoVotes.from_dict(data) if data else None
+            except (StorageError, KeyError, TypeError, ValueError):
+                pass
+            if covotes is not None and covotes.total_votes == self._checkpoint_total():
+                for _, recipe_id, _, _, _, previous in self._votes_since_checkpoint():
+                    covotes.record_vote(recipe_id, previous)
+            if covotes is None or covotes.total_votes != self.total_votes:
+                covotes = CoVotes.rebuild(self.iter_records())
+                self._checkpoint_due = True
+            self._covotes = covotes
+        self._covotes.refresh()
+        return self._covotes
+
+    def rebuild_covotes(self) -> None:
+        """Recompute the co-vote counts and every list from the records."""
+        self._covotes = CoVotes.rebuild(self.iter_records())
+        self._checkpoint_due = True
+
+
+class VoteStore(VoteBackend):
+    """In-memory session over the vote tracker file.
+
+    The snapshot and the vote journal are read once when the session starts,
+    membership checks are answered from per-build_id sets and pending changes
+    are written once, when the session ends::
+
+        with VoteStore() as store:
+            if not store.has_voted(build_id, recipe_id):
+                store.record_vote(build_id, recipe_id, recipe_name)
+
+    Per-build_id vote sets and the reverse recipe_id -> build_ids index are
+    derived on first use (a duplicate check only builds the set of the
+    build_id it asks about) and kept up to date by every mutation.
+
+    New votes only append to the journal. The snapshot is rewritten (and the
+    journal truncated) when records are removed, on ``compact()``, or once
+    the journal exceeds ``JOURNAL_COMPACT_THRESHOLD`` entries; the vote
+    aggregates, co-votes and expiry buckets are checkpointed with it and, on
+    load, brought up to date from the journal.
+
+    Used as a context manager the session holds the tracker lock from load
+    to flush, so concurrent intake processes cannot lose each other's votes.
+    ``readonly=True`` takes a shared lock and never writes.
+    """
+
+    def __init__(self, readonly: bool = False) -> None:
+        self.readonly = readonly
+        self._locks = ExitStack()
+        self.data: Dict[str, Dict[str, any]] = {}
+        self.dirty = False
+        self._rewrite_snapshot = False
+        self._journal_size = 0
+        self._pending: List[Dict[str, str]] = []
+        self._voted: Dict[str, Set[str]] = {}
+        self._voters: Optional[Dict[str, Set[str]]] = None
+        self._total_votes = 0
+        self._build_count = 0
+        self._checkpoint_votes = 0
+        self._checkpoint_builds = 0
+        self._unfolded: List[Vote] = []
+        self._expiry: Optional[ExpiryIndex] = None
+
+    def __enter__(self) -> 'VoteStore':
+        with metrics.span('tracker.lock_wait'):
+            self._locks.enter_context(tracker_lock(shared=self.readonly))
+        try:
+            self.load()
+        except BaseException:
+            self._locks.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        with self._locks:
+            if exc_type is None:
+                with metrics.span('tracker.flush'):
+                    self.flush()
+
+    def load(self) -> None:
+        with metrics.span('tracker.load'):
+            self.data = load_vote_tracker()
+        metrics.count('tracker.build_ids', len(self.data))
+        self._aggregates = None
+        self._checkpoint_due = False
+        self._expiry = None
+        self._covotes = None
+        self.dirty = False
+        self._rewrite_snapshot = False
+        self._pending = []
+        with metrics.span('tracker.index'):
+            self._build_indexes()
+        self._checkpoint_votes, self._checkpoint_builds = self._total_votes, self._build_count
+        self._unfolded = []
+
+        with metrics.span('tracker.journal_replay'):
+            journal = load_vote_journal()
+            self._journal_size = len(journal)
+            for entry in journal:
+                self._accept(entry['build_id'], entry.get('recipe_id', ''), entry.get('timestamp'))
+        metrics.count('tracker.journal_entries', len(journal))
+
+    def _build_indexes(self) -> None:
+        """Reset the derived indexes; they are filled on first use."""
+        self._voted = {}
+        self._voters = None
+        self._total_votes = sum(record.get('total_votes', 0)
+                                for record in self.data.values() if isinstance(record, dict))
+        self._build_count = sum(1 for record in self.data.values() if _is_vote_record(record))
+
+    def _voted_set(self, build_id: str) -> Optional[Set[str]]:
+        """Recipes a build_id voted for, as a set cached per build_id."""
+        voted = self._voted.get(build_id)
+        if voted is None:
+            record = self.data.get(build_id)
+            if not isinstance(record, dict):
+                return None
+            voted = self._voted[build_id] = set(record.get('voted_recipes') or ())
+        return voted
+
+    def _voter_index(self) -> Dict[str, Set[str]]:
+        """The recipe_id -> build_ids index, built on first use."""
+        if self._voters is None:
+            self._voters = {}
+            for build_id, record in self.data.items():
+                if isinstance(record, dict):
+                    for recipe_id in record.get('voted_recipes') or ():
+                        self._voters.setdefault(recipe_id, set()).add(build_id)
+        return self._voters
+
+    def flush(self) -> None:
+        """Write pending changes: journal appends, or a full snapshot.
+
+        The aggregates are checkpointed with the snapshot only; a stale or
+        rebuilt copy makes the next write session rewrite both.
+        """
+        if self.readonly:
+            return
+        if self._checkpoint_due:
+            self._rewrite_snapshot = self.dirty = True
+        if not self.dirty:
+            return
+        if self._journal_size + len(self._pending) > JOURNAL_COMPACT_THRESHOLD:
+            self._rewrite_snapshot = True
+
+        if self._rewrite_snapshot:
+            # The snapshot already contains every journaled vote
+            save_vote_tracker(self.data)
+            self._write_checkpoint()
+            truncate_vote_journal()
+            self._journal_size = 0
+        elif self._pending:
+            append_vote_journal(self._pending)
+            self._journal_size += len(self._pending)
+
+        self._pending = []
+        self._rewrite_snapshot = False
+        self.dirty = False
+
+    def compact(self) -> int:
+        """Fold the journal into the snapshot. Returns the entries folded."""
+        folded = self._journal_size + len(self._pending)
+        if folded:
+            self._rewrite_snapshot = True
+            self.dirty = True
+            self.flush()
+        return folded
+
+    @property
+    def total_votes(self) -> int:
+        """Sum of ``total_votes`` over every build_id."""
+        return self._total_votes
+
+    def recipe_voters(self, recipe_id: str) -> Set[str]:
+        """Build_ids that voted for a recipe (do not modify the returned set)."""
+        return self._voter_index().get(recipe_id, set())
+
+    def recipe_vote_counts(self) -> Dict[str, int]:
+        return {recipe_id: len(voters) for recipe_id, voters in self._voter_index().items()}
+
+    def iter_records(self) -> Iterator[Tuple[str, Dict[str, any]]]:
+        for build_id, record in self.data.items():
+            if _is_vote_record(record):
+                yield build_id, record
+
+    def export_data(self) -> Dict[str, any]:
+        return self.data
+
+    def import_data(self, data: Dict[str, any]) -> None:
+        self.data = dict(data)
+        self._build_indexes()
+        self._pending = []
+        self._rewrite_snapshot = True
+        self.dirty = True
+        self._aggregates = VoteAggregates.rebuild(self.iter_records())
+        self._expiry = ExpiryIndex.rebuild(self.iter_records())
+        self._covotes = CoVotes.rebuild(self.iter_records())
+
+    def _checkpoint_total(self) -> Optional[int]:
+        return self._checkpoint_votes
+
+    def _votes_since_checkpoint(self) -> List[Vote]:
+        return self._unfolded
+
+    def _fold(self, vote: Vote) -> None:
+        super()._fold(vote)
+        build_id, _, _, new_build, voted_at, _ = vote
+        if new_build and self._expiry is not None:
+            self._expiry.add(build_id, voted_at)
+
+    def _write_checkpoint(self) -> None:
+        super()._write_checkpoint()
+        atomic_write_json(VOTE_EXPIRY_FILE, self.expiry.to_dict())
+        self._checkpoint_votes, self._checkpoint_builds = self._total_votes, self._build_count
+        self._unfolded = []
+
+    def _read_aggregates(self) -> Optional[Dict[str, any]]:
+        return read_json(VOTE_AGGREGATES_FILE, None)
+
+    @property
+    def expiry(self) -> ExpiryIndex:
+        """First-vote day buckets, rebuilt if missing or out of date.
+
+        Checkpointed with the snapshot; new build_ids in the journal are
+        added on load, so a new voter never rewrites ``vote_expiry.json``.
+        """
+        if self._expiry is None:
+            expiry = None
+            try:
+                data = read_json(VOTE_EXPIRY_FILE, None)
+                expiry = ExpiryIndex.from_dict(data) if data else None
+            except (StorageError, KeyError, TypeError, ValueError):
+                pass
+            if expiry is not None and len(expiry) == self._checkpoint_builds:
+                for build_id, _, _, new_build, voted_at, _ in self._unfolded:
+                    if new_build:
+                        expiry.add(build_id, voted_at)
+            if expiry is None or len(expiry) != self._build_count:
+                expiry = ExpiryIndex.rebuild(self.iter_records())
+                self._checkpoint_due = True
+            self._expiry = expiry
+        return self._expiry
+
+    def _write_aggregates(self, data: Dict[str, any]) -> None:
+        atomic_write_json(VOTE_AGGREGATES_FILE, data)
+
+    def has_voted(self, build_id: str, recipe_id: str) -> bool:
+        """Check if a build_id has already voted for a specific recipe."""
+        voted = self._voted_set(build_id)
+        return voted is not None and recipe_id in voted
+
+    def record_vote(self, build_id: str, recipe_id: str, recipe_name: str = '') -> None:
+        """Record that a build_id has voted for a specific recipe."""
+        now = datetime.now(timezone.utc).isoformat()
+        if self._accept(build_id, recipe_id, now):
+            self._pending.append({'build_id': build_id, 'recipe_id': recipe_id, 'timestamp': now})
+            self.dirty = True
+
+    def _accept(self, build_id: str, recipe_id: str, now: Optional[str]) -> bool:
+        """``_apply_vote``, remembering the vote until the next checkpoint."""
+        new_build = build_id not in self.data
+        previous = list(self._voted_set(build_id) or ())
+        if not self._apply_vote(build_id, recipe_id, now):
+            return False
+        record = self.data[build_id]
+        vote = (build_id, recipe_id, record['total_votes'], new_build, record['last_vote_at'], previous)
+        self._unfolded.append(vote)
+        self._fold(vote)
+        return True
+
+    def _apply_vote(self, build_id: str, recipe_id: str, now: Optional[str]) -> bool:
+        """Apply a vote to the in-memory state. Returns False if already known."""
+        now = now or datetime.now(timezone.utc).isoformat()
+        changed = False
+        if build_id not in self.data:
+            self.data[build_id] = {
+                'first_vote_at': now,
+                'voted_recipes': [],
+                'total_votes': 0
+            }
+            self._voted[build_id] = set()
+            self._build_count += 1
+            changed = True
+
+        voted = self._voted_set(build_id)
+        if recipe_id not in voted:
+            record = self.data[build_id]
+            voted.add(recipe_id)
+            if self._voters is not None:
+                self._voters.setdefault(recipe_id, set()).add(build_id)
+            record.setdefault('voted_recipes', []).append(recipe_id)
+            self._total_votes += len(voted) - record.get('total_votes', 0)
+            record['total_votes'] = len(voted)
+            record['last_vote_at'] = now
+            changed = True
+        return changed
+
+    def get_build_stats(self, build_id: str) -> Optional[Dict[str, any]]:
+        """Get statistics for a specific build_id."""
+        return self.data.get(build_id)
+
+    def cleanup(self, days_threshold: Optional[int] = None) -> int:
+        """Remove vote records older than the specified number of days.
+
+        Only the expiry index buckets that are due are visited, so this
+        returns immediately when nothing has expired.
+        """
+        if days_threshold is None:
+            days_threshold = cleanup_days_threshold()
+        cutoff = int(datetime.now(timezone.utc).timestamp()) - days_threshold * 24 * 60 * 60
+        aggregates = self.aggregates
+        expired = self.expiry.pop_expired(cutoff)
+        if not expired:
+            return 0
+
+        covotes = self.covotes
+        removed: Dict[str, int] = {}
+        recipe_decrements: Dict[str, int] = {}
+        for build_id in expired:
+            if not _is_vote_record(self.data.get(build_id)):
+                continue
+            voted = self._voted_set(build_id) or ()
+            covotes.remove_voter(voted)
+            for recipe_id in voted:
+                recipe_decrements[recipe_id] = recipe_decrements.get(recipe_id, 0) + 1
+            removed[build_id] = self.data[build_id].get('total_votes', 0)
+            self._remove(build_id)
+
+        if removed:
+            aggregates.remove_builds(removed, recipe_decrements, self.iter_records)
+            self._rewrite_snapshot = True
+            self.dirty = True
+        return len(removed)
+
+    def _remove(self, build_id: str) -> None:
+        voted = self._voted_set(build_id) or ()
+        record = self.data.pop(build_id)
+        self._voted.pop(build_id, None)
+        for recipe_id in voted if self._voters is not None else ():
+            voters = self._voters.get(recipe_id)
+            if voters is not None:
+                voters.discard(build_id)
+                if not voters:
+                    del self._voters[recipe_id]
+        self._total_votes -= record.get('total_votes', 0)
+        self._build_count -= _is_vote_record(record)
+
+    def recipe_vote_stats(self, recipe_id: str) -> Dict[str, int]:
+        """Get voting statistics for a specific recipe."""
+        return {
+            'unique_voters': len(self._voter_index().get(recipe_id, ())),
+            'total_votes': self._total_votes
+        }
+
+    def verify_index(self) -> List[str]:
+        """Compare the derived indexes against the build_id map.
+
+        Returns a list of human readable problems (empty when consistent).
+        """
+        problems = []
+        voter_index = self._voter_index()
+        expected_voters: Dict[str, Set[str]] = {}
+        expected_total = 0
+        for build_id, record in self.data.items():
+            if not isinstance(record, dict):
+                continue
+            voted = set(record.get('voted_recipes') or ())
+            cached = self._voted.get(build_id)
+            if cached is not None and cached != voted:
+                problems.append(f"build_id {build_id}: voted set out of sync")
+            for recipe_id in voted:
+                expected_voters.setdefault(recipe_id, set()).add(build_id)
+            expected_total += record.get('total_votes', 0)
+
+        for build_id in self._voted.keys() - self.data.keys():
+            problems.append(f"build_id {build_id}: indexed but missing from tracker")
+        for recipe_id in expected_voters.keys() | voter_index.keys():
+            if expected_voters.get(recipe_id, set()) != voter_index.get(recipe_id, set()):
+                problems.append(f"recipe {recipe_id}: voter index out of sync")
+        if expected_total != self._total_votes:
+            problems.append(f"total_votes: indexed {self._total_votes}, tracker {expected_total}")
+        return problems
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS installations (
+    build_id TEXT PRIMARY KEY,
+    first_vote_at TEXT,
+    first_vote_ts REAL,
+    last_vote_at TEXT,
+    total_votes INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS installations_first_vote_ts ON installations (first_vote_ts);
+CREATE TABLE IF NOT EXISTS votes (
+    build_id TEXT NOT NULL,
+    recipe_id TEXT NOT NULL,
+    voted_at TEXT NOT NULL,
+    UNIQUE (build_id, recipe_id)
+);
+CREATE INDEX IF NOT EXISTS votes_recipe_id ON votes (recipe_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_RECORD_KEYS = ('first_vote_at', 'voted_recipes', 'total_votes', 'last_vote_at')
+
+
+class SqliteVoteStore(VoteBackend):
+    """Vote tracker backed by a SQLite database in WAL mode.
+
+    ``votes`` holds one row per (build_id, recipe_id) under a unique index,
+    so duplicate checks are a single indexed lookup, and ``installations``
+    holds one row per build_id with its first-vote timestamp indexed for
+    range deletes. Tracker entries that are not vote records (``metadata``)
+    are kept verbatim in ``installations.extra`` so an export reproduces
+    ``vote_tracker.json``. The vote aggregates live in the ``meta`` table and
+    are checkpointed there (the co-votes to ``vote_recommendations.json``),
+    together with the last vote rowid they include,
+    on cleanup, import, rebuild, ``compact()`` or once more than
+    ``JOURNAL_COMPACT_THRESHOLD`` votes were added since the last checkpoint.
+
+    A write session runs in one ``BEGIN IMMEDIATE`` transaction, which
+    serializes concurrent writers the way the tracker lock does for the
+    JSON backend; readers are never blocked under WAL.
+    """
+
+    def __init__(self, readonly: bool = False, path: Optional[Path] = None) -> None:
+        self.readonly = readonly
+        self.path = Path(path) if path else VOTE_DB_FILE
+        self.conn: Optional['sqlite3.Connection'] = None
+
+    def __enter__(self) -> 'SqliteVoteStore':
+        import sqlite3  # only the SQLite backend pays for the import
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._aggregates = None
+        self._checkpoint_due = False
+        self._covotes = None
+        try:
+            with metrics.span('tracker.open'):
+                self.conn.execute('PRAGMA journal_mode=WAL')
+                self.conn.execute('PRAGMA synchronous=NORMAL')
+                self.conn.executescript(_SQLITE_SCHEMA)
+                self.conn.execute('BEGIN' if self.readonly else 'BEGIN IMMEDIATE')
+        except BaseException:
+            self.conn.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None and not self.readonly:
+                with metrics.span('tracker.flush'):
+                    self._flush_derived()
+                    self.conn.execute('COMMIT')
+            else:
+                self.conn.execute('ROLLBACK')
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def flush(self) -> None:
+        """Commit the open transaction and start the next one."""
+        if self.readonly:
+            return
+        self._flush_derived()
+        self.conn.execute('COMMIT')
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def _flush_derived(self) -> None:
+        checkpoint = self._checkpoint()
+        if (self._checkpoint_due or checkpoint is None
+                or self._count_since(checkpoint['rowid']) > JOURNAL_COMPACT_THRESHOLD):
+            self._write_checkpoint()
+
+    def compact(self) -> int:
+        """Checkpoint the aggregates. Returns the votes folded into them."""
+        checkpoint = self._checkpoint()
+        folded = self._count_since(checkpoint['rowid'] if checkpoint else 0)
+        if not self.readonly:
+            self._write_checkpoint()
+        return folded
+
+    def _checkpoint(self) -> Optional[Dict[str, int]]:
+        """``{'rowid', 'total_votes'}`` of the last checkpoint, if any."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'checkpoint'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _count_since(self, rowid: int) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM votes WHERE rowid > ?', (rowid,)).fetchone()[0]
+
+    def _checkpoint_total(self) -> Optional[int]:
+        checkpoint = self._checkpoint()
+        return checkpoint['total_votes'] if checkpoint else None
+
+    def _votes_since_checkpoint(self) -> List[Vote]:
+        checkpoint = self._checkpoint()
+        rows = self.conn.execute(
+            'SELECT rowid, build_id, recipe_id, voted_at FROM votes WHERE rowid > ? ORDER BY rowid',
+            (checkpoint['rowid'] if checkpoint else 0,)).fetchall()
+        votes = []
+        for rowid, build_id, recipe_id, voted_at in rows:
+            previous = [r for (r,) in self.conn.execute(
+                'SELECT recipe_id FROM votes WHERE build_id = ? AND rowid < ? ORDER BY rowid', (build_id, rowid))]
+            votes.append((build_id, recipe_id, len(previous) + 1, not previous, voted_at, previous))
+        return votes
+
+    def _write_checkpoint(self) -> None:
+        super()._write_checkpoint()
+        (rowid,) = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM votes').fetchone()
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('checkpoint', ?)",
+                          (json.dumps({'rowid': rowid, 'total_votes': self.total_votes}),))
+
+    def has_voted(self, build_id: str, recipe_id: str) -> bool:
+        row = self.conn.execute(
+            'SELECT 1 FROM votes WHERE build_id = ? AND recipe_id = ?',
+            (build_id, recipe_id)).fetchone()
+        return row is not None
+
+    def record_vote(self, build_id: str, recipe_id: str, recipe_name: str = '') -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        # Only the co-votes need the voter's earlier recipes
+        previous = [r for (r,) in self.conn.execute(
+            'SELECT recipe_id FROM votes WHERE build_id = ?', (build_id,))] if self._covotes is not None else []
+        inserted = self.conn.execute(
+            'INSERT OR IGNORE INTO votes (build_id, recipe_id, voted_at) VALUES (?, ?, ?)',
+            (build_id, recipe_id, now)).rowcount
+        if not inserted:
+            return
+        (total,) = self.conn.execute(
+            'INSERT INTO installations (build_id, first_vote_at, first_vote_ts, last_vote_at, total_votes)'
+            ' VALUES (?, ?, ?, ?, 1)'
+            ' ON CONFLICT (build_id) DO UPDATE SET'
+            ' total_votes = total_votes + 1, last_vote_at = excluded.last_vote_at'
+            ' RETURNING total_votes',
+            (build_id, now, parse_timestamp(now), now)).fetchone()
+        self._fold((build_id, recipe_id, total, total == 1, now, previous))
+
+    def _record(self, row) -> Dict[str, any]:
+        build_id, first_vote_at, last_vote_at, total_votes, extra = row
+        extra = json.loads(extra) if extra else {}
+        if first_vote_at is None:
+            return extra
+        record = {
+            'first_vote_at': first_vote_at,
+            'voted_recipes': [r for (r,) in self.conn.execute(
+                'SELECT recipe_id FROM votes WHERE build_id = ? ORDER BY rowid', (build_id,))],
+            'total_votes': total_votes,
+        }
+        if last_vote_at is not None:
+            record['last_vote_at'] = last_vote_at
+        record.update(extra)
+        return record
+
+    def get_build_stats(self, build_id: str) -> Optional[Dict[str, any]]:
+        row = self.conn.execute(
+            'SELECT build_id, first_vote_at, last_vote_at, total_votes, extra'
+            ' FROM installations WHERE build_id = ?', (build_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def cleanup(self, days_threshold: Optional[int] = None) -> int:
+        if days_threshold is None:
+            days_threshold = cleanup_days_threshold()
+        cutoff = datetime.now(timezone.utc).timestamp() - (days_threshold * 24 * 60 * 60)
+        aggregates = self.aggregates
+        removed = dict(self.conn.execute(
+            'SELECT build_id, total_votes FROM installations WHERE first_vote_ts < ?', (cutoff,)))
+        if not removed:
+            return 0
+        covotes = self.covotes
+        expired_votes: Dict[str, List[str]] = {}
+        for build_id, recipe_id in self.conn.execute(
+                'SELECT build_id, recipe_id FROM votes WHERE build_id IN'
+                ' (SELECT build_id FROM installations WHERE first_vote_ts < ?)', (cutoff,)):
+            expired_votes.setdefault(build_id, []).append(recipe_id)
+        recipe_decrements: Dict[str, int] = {}
+        for voted in expired_votes.values():
+            covotes.remove_voter(voted)
+            for recipe_id in voted:
+                recipe_decrements[recipe_id] = recipe_decrements.get(recipe_id, 0) + 1
+        self.conn.execute(
+            'DELETE FROM votes WHERE build_id IN'
+            ' (SELECT build_id FROM installations WHERE first_vote_ts < ?)', (cutoff,))
+        self.conn.execute('DELETE FROM installations WHERE first_vote_ts < ?', (cutoff,))
+        aggregates.remove_builds(removed, recipe_decrements, self.iter_records)
+        self._checkpoint_due = True
+        return len(removed)
+
+    def recipe_vote_stats(self, recipe_id: str) -> Dict[str, int]:
+        (unique_voters,) = self.conn.execute(
+            'SELECT COUNT(*) FROM votes WHERE recipe_id = ?', (recipe_id,)).fetchone()
+        return {'unique_voters': unique_voters, 'total_votes': self.total_votes}
+
+    def recipe_voters(self, recipe_id: str) -> Set[str]:
+        return {b for (b,) in self.conn.execute(
+            'SELECT build_id FROM votes WHERE recipe_id = ?', (recipe_id,))}
+
+    def recipe_vote_counts(self) -> Dict[str, int]:
+        return dict(self.conn.execute(
+            'SELECT recipe_id, COUNT(*) FROM votes GROUP BY recipe_id'))
+
+    @property
+    def total_votes(self) -> int:
+        return self.conn.execute(
+            'SELECT COALESCE(SUM(total_votes), 0) FROM installations').fetchone()[0]
+
+    def iter_records(self) -> Iterator[Tuple[str, Dict[str, any]]]:
+        rows = self.conn.execute(
+            'SELECT build_id, first_vote_at, last_vote_at, total_votes, extra'
+            ' FROM installations WHERE first_vote_at IS NOT NULL ORDER BY rowid').fetchall()
+        for row in rows:
+            yield row[0], self._record(row)
+
+    def export_data(self) -> Dict[str, any]:
+        rows = self.conn.execute(
+            'SELECT build_id, first_vote_at, last_vote_at, total_votes, extra'
+            ' FROM installations ORDER BY rowid').fetchall()
+        return {row[0]: self._record(row) for row in rows}
+
+    def import_data(self, data: Dict[str, any]) -> None:
+        self.conn.execute('DELETE FROM votes')
+        self.conn.execute('DELETE FROM installations')
+        for build_id, record in data.items():
+            if not _is_vote_record(record):
+                self.conn.execute(
+                    'INSERT INTO installations (build_id, extra) VALUES (?, ?)',
+                    (build_id, json.dumps(record, ensure_ascii=False)))
+                continue
+            extra = {k: v for k, v in record.items() if k not in _RECORD_KEYS}
+            self.conn.execute(
+                'INSERT INTO installations'
+                ' (build_id, first_vote_at, first_vote_ts, last_vote_at, total_votes, extra)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (build_id, record['first_vote_at'], parse_timestamp(record['first_vote_at']),
+                 record.get('last_vote_at'), record.get('total_votes', 0),
+                 json.dumps(extra, ensure_ascii=False) if extra else None))
+            voted_at = record.get('last_vote_at') or record['first_vote_at']
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO votes (build_id, recipe_id, voted_at) VALUES (?, ?, ?)',
+                ((build_id, recipe_id, voted_at) for recipe_id in record.get('voted_recipes') or ()))
+        self._aggregates = VoteAggregates.rebuild(self.iter_records())
+        self._checkpoint_due = True
+        self._covotes = CoVotes.rebuild(self.iter_records())
+
+    def _read_aggregates(self) -> Optional[Dict[str, any]]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'aggregates'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write_aggregates(self, data: Dict[str, any]) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates', ?)",
+                          (json.dumps(data, ensure_ascii=False),))
+
+    def verify_index(self) -> List[str]:
+        problems = []
+        rows = self.conn.execute(
+            'SELECT i.build_id, i.total_votes, COUNT(v.recipe_id) FROM installations i'
+            ' LEFT JOIN votes v ON v.build_id = i.build_id'
+            ' WHERE i.first_vote_at IS NOT NULL GROUP BY i.build_id'
+            ' HAVING i.total_votes != COUNT(v.recipe_id)')
+        for build_id, total, counted in rows:
+            problems.append(f"build_id {build_id}: total_votes {total}, {counted} vote rows")
+        rows = self.conn.execute(
+            'SELECT DISTINCT v.build_id FROM votes v'
+            ' LEFT JOIN installations i ON i.build_id = v.build_id WHERE i.build_id IS NULL')
+        for (build_id,) in rows:
+            problems.append(f"build_id {build_id}: votes without an installation row")
+        return problems
+
+
+VOTE_BACKENDS = {
+    'json': VoteStore,
+    'sqlite': SqliteVoteStore,
+}
+
+
+def vote_backend_name() -> str:
+    """Configured backend: ``MEALPREP_VOTE_BACKEND``, then ``vote_config.json``."""
+    name = os.environ.get(VOTE_BACKEND_ENV) or load_vote_config().get('storage_backend') or 'json'
+    name = name.strip().lower()
+    if name not in VOTE_BACKENDS:
+        raise ValueError(f"Unknown vote storage backend: {name!r} (expected one of {', '.join(VOTE_BACKENDS)})")
+    return name
+
+
+def open_vote_store(readonly: bool = False, backend: Optional[str] = None) -> VoteBackend:
+    """Create a session on the configured (or the named) vote backend."""
+    return VOTE_BACKENDS[backend or vote_backend_name()](readonly=readonly)
 
 
 def has_build_id_voted(build_id: str, recipe_id: str) -> bool:
     """Check if a build_id has already voted for a specific recipe."""
-    tracker = load_vote_tracker()
-    
-    # Check if build_id exists and has voted for this recipe
-    if build_id in tracker:
-        voted_recipes = tracker[build_id].get('voted_recipes', set())
-        return recipe_id in voted_recipes
-    
-    return False
+    with open_vote_store(readonly=True) as store:
+        return store.has_voted(build_id, recipe_id)
 
 
 def record_build_id_vote(build_id: str, recipe_id: str, recipe_name: str) -> None:
     """Record that a build_id has voted for a specific recipe."""
-    tracker = load_vote_tracker()
-    
-    if build_id not in tracker:
-        tracker[build_id] = {
-            'first_vote_at': datetime.now(timezone.utc).isoformat(),
-            'voted_recipes': set(),
-            'total_votes': 0
-        }
-    
-    # Convert set to list for JSON serialization
-    if isinstance(tracker[build_id].get('voted_recipes'), set):
-        tracker[build_id]['voted_recipes'] = list(tracker[build_id]['voted_recipes'])
-    
-    # Add recipe to voted list if not already there
-    voted_recipes = set(tracker[build_id].get('voted_recipes', []))
-    if recipe_id not in voted_recipes:
-        voted_recipes.add(recipe_id)
-        tracker[build_id]['voted_recipes'] = list(voted_recipes)
-        tracker[build_id]['total_votes'] = len(voted_recipes)
-        tracker[build_id]['last_vote_at'] = datetime.now(timezone.utc).isoformat()
-    
-    save_vote_tracker(tracker)
+    with open_vote_store() as store:
+        store.record_vote(build_id, recipe_id, recipe_name)
 
 
 def get_build_id_stats(build_id: str) -> Optional[Dict[str, any]]:
     """Get statistics for a specific build_id."""
-    tracker = load_vote_tracker()
-    return tracker.get(build_id)
+    with open_vote_store(readonly=True) as store:
+        return store.get_build_stats(build_id)
 
 
-def cleanup_old_votes(days_threshold: int = 90) -> int:
-    """Clean up vote records older than the specified number of days."""
-    tracker = load_vote_tracker()
-    cutoff_date = datetime.now(timezone.utc).timestamp() - (days_threshold * 24 * 60 * 60)
-    removed_count = 0
-    
-    for build_id in list(tracker.keys()):
-        build_data = tracker[build_id]
-        first_vote = build_data.get('first_vote_at')
-        
-        if first_vote:
-            try:
-                first_vote_timestamp = datetime.fromisoformat(first_vote.replace('Z', '+00:00')).timestamp()
-                if first_vote_timestamp < cutoff_date:
-                    del tracker[build_id]
-                    removed_count += 1
-            except Exception:
-                # If we can't parse the date, keep the record
-                pass
-    
-    if removed_count > 0:
-        save_vote_tracker(tracker)
-    
-    return removed_count
+def cleanup_old_votes(days_threshold: Optional[int] = None) -> int:
+    """Clean up vote records older than the specified number of days.
+
+    Defaults to ``cleanup_days_threshold`` from ``vote_config.json``.
+    """
+    with open_vote_store() as store:
+        return store.cleanup(days_threshold)
 
 
 def get_recipe_vote_stats(recipe_id: str) -> Dict[str, int]:
     """Get voting statistics for a specific recipe."""
-    tracker = load_vote_tracker()
-    unique_voters = 0
-    total_votes = 0
-    
-    for build_id, data in tracker.items():
-        voted_recipes = data.get('voted_recipes', [])
-        if recipe_id in voted_recipes:
-            unique_voters += 1
-        total_votes += data.get('total_votes', 0)
-    
-    return {
-        'unique_voters': unique_voters,
-        'total_votes': total_votes
-    }
+    with open_vote_store(readonly=True) as store:
+        return store.recipe_vote_stats(recipe_id)
 
 
 if __name__ == '__main__':